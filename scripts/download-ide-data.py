@@ -7,13 +7,35 @@ Converts ESRI JSON to GeoJSON format
 
 import json
 import os
+import sys
 import time
+import urllib.error
 import urllib.request
 import urllib.parse
 from typing import Dict, List, Any, Optional
 
+from ide_metrics import RunReport, report_from_args
+
 OUTPUT_DIR = "data/ide-chile"
 
+# Host of the services below; --base-url swaps it, e.g. for a local stand-in
+MOP_BASE_URL = "https://rest-sit.mop.gob.cl"
+BASE_URL = MOP_BASE_URL
+
+# Page by OBJECTID chunks (returnIdsOnly + objectIds) instead of resultOffset
+ID_PAGING = False
+
+# Records fetched per layer at most
+MAX_RECORDS = 10000
+
+# Transient failures (network errors, 5xx/429, ArcGIS error payloads with a
+# 5xx code) are retried this many times, waiting RETRY_BACKOFF * 2^n seconds
+FETCH_RETRIES = 3
+RETRY_BACKOFF = 1.0
+
+# Stage timings, replaced in main() by one honouring --profile/--no-trace-memory
+REPORT = RunReport("download", trace_memory=False)
+
 # Service definitions
 SERVICES = [
     # DGA - Water Resources
@@ -129,62 +151,172 @@ def esri_to_geojson(esri_data: Dict) -> Dict:
     }
 
 
-def query_layer(base_url: str, layer_id: int, max_records: int = 10000) -> Dict:
-    """Query all features from a layer with pagination"""
-    all_features = []
-    offset = 0
-    page_size = 1000
+def is_transient(error: Any) -> bool:
+    """Whether a failed request is worth retrying
+
+    Takes the raised exception or the "error" object of an ArcGIS response.
+    """
+    if isinstance(error, dict):
+        return error.get("code") in (None, 429) or error.get("code", 0) >= 500
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code == 429 or error.code >= 500
+    return isinstance(error, (OSError, ValueError))
 
-    while True:
-        params = {
-            "where": "1=1",
-            "outFields": "*",
-            "returnGeometry": "true",
-            "outSR": "4326",
-            "f": "json",
-            "resultOffset": str(offset),
-            "resultRecordCount": str(page_size),
-        }
 
-        url = f"{base_url}/{layer_id}/query?{urllib.parse.urlencode(params)}"
+def fetch_query(base_url: str, layer_id: int, params: Dict[str, str]) -> Dict:
+    """Fetch and decode one layer query response, retrying transient failures
 
+    Once the retries are used up the last exception is raised, or the last
+    ArcGIS error payload returned for the caller to report.
+    """
+    url = f"{base_url}/{layer_id}/query?{urllib.parse.urlencode(params)}"
+
+    for attempt in range(FETCH_RETRIES + 1):
+        try:
+            with REPORT.stage("fetch") as stage:
+                with urllib.request.urlopen(url, timeout=30) as response:
+                    raw = response.read()
+                stage.add(bytes=len(raw))
+
+            with REPORT.stage("decode") as stage:
+                data = json.loads(raw.decode())
+                stage.add(bytes=len(raw), features=len(data.get("features", [])))
+        except Exception as e:
+            if attempt == FETCH_RETRIES or not is_transient(e):
+                raise
+            error = str(e)
+        else:
+            if "error" not in data or attempt == FETCH_RETRIES or not is_transient(data["error"]):
+                return data
+            error = data["error"].get("message", "Unknown error")
+
+        delay = RETRY_BACKOFF * 2 ** attempt
+        print(f"    Retry {attempt + 1}/{FETCH_RETRIES} in {delay:.1f}s: {error}")
+        time.sleep(delay)
+
+
+def fetch_page(base_url: str, layer_id: int, offset: int, page_size: int) -> Dict:
+    """Fetch and decode one page of a layer query"""
+    return fetch_query(base_url, layer_id, {
+        "where": "1=1",
+        "outFields": "*",
+        "returnGeometry": "true",
+        "outSR": "4326",
+        "f": "json",
+        "resultOffset": str(offset),
+        "resultRecordCount": str(page_size),
+    })
+
+
+def fetch_object_ids(base_url: str, layer_id: int) -> List[int]:
+    """All OBJECTIDs of a layer, sorted"""
+    data = fetch_query(base_url, layer_id, {"where": "1=1", "returnIdsOnly": "true", "f": "json"})
+    if "error" in data:
+        raise RuntimeError(data["error"].get("message", "Unknown error"))
+    return sorted(data.get("objectIds") or [])
+
+
+def iter_layer_id_pages(base_url: str, layer_id: int, max_records: int = MAX_RECORDS,
+                        page_size: int = 1000, delay: float = 0.5):
+    """Yield ESRI JSON pages of a layer requested by OBJECTID chunks
+
+    Unlike offset paging this cannot skip or repeat records when the
+    server's row order is unstable between requests.
+    """
+    try:
+        object_ids = fetch_object_ids(base_url, layer_id)[:max_records]
+    except Exception as e:
+        print(f"    Error: {e}")
+        return
+
+    pending = object_ids
+    while pending:
+        chunk = pending[:page_size]
         try:
-            with urllib.request.urlopen(url, timeout=30) as response:
-                data = json.loads(response.read().decode())
+            data = fetch_query(base_url, layer_id, {
+                "objectIds": ",".join(str(i) for i in chunk),
+                "outFields": "*",
+                "returnGeometry": "true",
+                "outSR": "4326",
+                "f": "json",
+            })
+        except Exception as e:
+            print(f"    Error: {e}")
+            break
 
-            if "error" in data:
-                print(f"    API Error: {data['error'].get('message', 'Unknown error')}")
-                break
+        if "error" in data:
+            print(f"    API Error: {data['error'].get('message', 'Unknown error')}")
+            break
 
-            features = data.get("features", [])
-            if not features:
-                break
+        features = data.get("features", [])
+        if not features:
+            break
+        yield data
 
-            all_features.extend(features)
-            print(f"    Fetched {len(all_features)} features...")
+        # A server maxRecordCount below page_size truncates the chunk; re-request the rest
+        id_field = data.get("objectIdFieldName", "OBJECTID")
+        returned = {f.get("attributes", {}).get(id_field) for f in features}
+        if not returned.intersection(chunk):
+            break
+        pending = [i for i in chunk if i not in returned] + pending[page_size:]
+        if pending:
+            time.sleep(delay)  # Rate limiting
 
-            if len(features) < page_size or len(all_features) >= max_records:
-                break
 
-            offset += page_size
-            time.sleep(0.5)  # Rate limiting
+def iter_layer_pages(base_url: str, layer_id: int, max_records: int = MAX_RECORDS,
+                     page_size: int = 1000, delay: float = 0.5):
+    """Yield ESRI JSON pages of a layer, following offset pagination"""
+    if ID_PAGING:
+        yield from iter_layer_id_pages(base_url, layer_id, max_records, page_size, delay)
+        return
 
+    offset = 0
+    fetched = 0
+
+    while True:
+        size = min(page_size, max_records - fetched)
+        try:
+            data = fetch_page(base_url, layer_id, offset, size)
         except Exception as e:
             print(f"    Error: {e}")
             break
 
+        if "error" in data:
+            print(f"    API Error: {data['error'].get('message', 'Unknown error')}")
+            break
+
+        features = data.get("features", [])
+        if not features:
+            break
+
+        fetched += len(features)
+        yield data
+
+        # A server maxRecordCount below page_size shortens pages but sets exceededTransferLimit
+        if (len(features) < size and not data.get("exceededTransferLimit")) or fetched >= max_records:
+            break
+
+        offset += len(features)
+        time.sleep(delay)  # Rate limiting
+
+
+def query_layer(base_url: str, layer_id: int, max_records: int = MAX_RECORDS) -> Dict:
+    """Query all features from a layer with pagination"""
+    all_features = []
+    geometry_type = ""
+
+    for data in iter_layer_pages(base_url, layer_id, max_records):
+        all_features.extend(data["features"])
+        # Geometry type from the successful responses
+        geometry_type = data.get("geometryType", geometry_type)
+        print(f"    Fetched {len(all_features)} features...")
+
     # Return in ESRI format with all features
-    result = {
+    return {
         "features": all_features,
-        "geometryType": data.get("geometryType", "") if "data" in dir() else ""
+        "geometryType": geometry_type
     }
 
-    # Get geometry type from first successful response
-    if all_features and "data" in dir() and "geometryType" in data:
-        result["geometryType"] = data["geometryType"]
-
-    return result
-
 
 def download_service(service: Dict) -> int:
     """Download all layers from a service"""
@@ -196,16 +328,20 @@ def download_service(service: Dict) -> int:
         print(f"  Layer {layer_id}:")
 
         try:
-            esri_data = query_layer(service["url"], layer_id)
+            esri_data = query_layer(service["url"].replace(MOP_BASE_URL, BASE_URL), layer_id)
 
             if esri_data["features"]:
-                geojson = esri_to_geojson(esri_data)
+                with REPORT.stage("convert") as stage:
+                    geojson = esri_to_geojson(esri_data)
+                    stage.add(features=len(geojson["features"]))
 
                 filename = f"{service['id']}_layer{layer_id}.geojson"
                 filepath = os.path.join(OUTPUT_DIR, filename)
 
-                with open(filepath, "w") as f:
-                    json.dump(geojson, f)
+                with REPORT.stage("write") as stage:
+                    with open(filepath, "w") as f:
+                        json.dump(geojson, f)
+                    stage.add(bytes=os.path.getsize(filepath), features=len(geojson["features"]))
 
                 count = len(geojson["features"])
                 total_features += count
@@ -222,6 +358,12 @@ def download_service(service: Dict) -> int:
 
 
 def main():
+    global REPORT, BASE_URL, ID_PAGING
+    REPORT = report_from_args("download")
+    if "--base-url" in sys.argv:
+        BASE_URL = sys.argv[sys.argv.index("--base-url") + 1].rstrip("/")
+    ID_PAGING = "--id-paging" in sys.argv
+
     print("=" * 60)
     print("IDE Chile Data Downloader")
     print("=" * 60)
@@ -271,6 +413,13 @@ def main():
         print(f"{s['name'][:30]:<30} {s['features']:>10} {s['status']:<10}")
     print("-" * 52)
     print(f"{'TOTAL':<30} {total_all:>10}")
+
+    # Save per-stage timings for comparison between runs
+    REPORT.extra["totalFeatures"] = total_all
+    REPORT.print_summary()
+    report_path = REPORT.write(OUTPUT_DIR)
+    print(f"\nRun report saved to: {report_path}")
+
     print(f"\nData saved to: {OUTPUT_DIR}/")
 
 
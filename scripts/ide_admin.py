@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Administrative-area assignment for IDE Chile features
+
+Spatial join run by upload-to-turso.py after loading: the region, province
+and comuna boundary layers are indexed on a grid and every feature's
+centroid is assigned the code of the polygon containing it. The codes land
+in indexed columns, so "everything in this comuna" is an index lookup.
+
+Grid cells fully inside a polygon are found with a scanline fill at build
+time and answer lookups directly; only points in cells crossed by a border
+need an exact point-in-polygon test, against that row's edges only.
+
+Usage:
+    python3 ide_admin.py [--db path/to.db]    # re-run the join in place
+"""
+
+import json
+import math
+import sqlite3
+import sys
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_DB = "data/ide-chile/ide-chile-data.db"
+
+# (column, boundary layer prefix, candidate code attributes in order)
+ADMIN_LEVELS = [
+    ("region_code", "limites-regiones", ["CUT_REG", "COD_REGION", "COD_REGI", "CODREGION", "REGION"]),
+    ("province_code", "limites-provincias", ["CUT_PROV", "COD_PROV", "COD_PROVIN", "PROVINCIA"]),
+    ("comuna_code", "limites-comunas", ["CUT_COM", "COD_COMUNA", "CUT", "COMUNA"]),
+]
+
+CELL_SIZE = 0.05  # degrees, ~5 km
+
+INSIDE = 1
+BORDER = 2
+
+Edge = Tuple[float, float, float, float]
+
+
+def polygon_rings(geometry: Optional[Dict]) -> List[List[List[float]]]:
+    """All rings of a Polygon or MultiPolygon, evaluated together even-odd"""
+    if not geometry:
+        return []
+    if geometry.get("type") == "Polygon":
+        return geometry.get("coordinates", [])
+    if geometry.get("type") == "MultiPolygon":
+        return [ring for poly in geometry.get("coordinates", []) for ring in poly]
+    return []
+
+
+class PolygonIndex:
+    """Grid index answering which polygon contains a point"""
+
+    def __init__(self, polygons: List[Tuple[str, List[List[List[float]]]]], cell: float = CELL_SIZE):
+        self.cell = cell
+        self.codes: List[str] = []
+        self.row_edges: List[Dict[int, List[Edge]]] = []
+        self.cells: Dict[Tuple[int, int], List[Tuple[int, int]]] = {}
+
+        for code, rings in polygons:
+            self._add(code, rings)
+
+    def _add(self, code: str, rings: List[List[List[float]]]):
+        c = self.cell
+        idx = len(self.codes)
+        rows: Dict[int, List[Edge]] = {}
+        border = set()
+
+        for ring in rings:
+            for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+                if (x1, y1) == (x2, y2):
+                    continue
+                edge = (x1, y1, x2, y2)
+                r0, r1 = math.floor(min(y1, y2) / c), math.floor(max(y1, y2) / c)
+                c0, c1 = math.floor(min(x1, x2) / c), math.floor(max(x1, x2) / c)
+                for r in range(r0, r1 + 1):
+                    rows.setdefault(r, []).append(edge)
+                    for cx in range(c0, c1 + 1):
+                        border.add((cx, r))
+
+        if not rows:
+            return
+
+        self.codes.append(code)
+        self.row_edges.append(rows)
+
+        for cell in border:
+            self.cells.setdefault(cell, []).append((idx, BORDER))
+
+        # Scanline through each row's cell centers to mark interior cells
+        for r, edges in rows.items():
+            yc = (r + 0.5) * c
+            xs = sorted(
+                x1 + (yc - y1) * (x2 - x1) / (y2 - y1)
+                for x1, y1, x2, y2 in edges
+                if (y1 > yc) != (y2 > yc)
+            )
+            for x0, x1 in zip(xs[::2], xs[1::2]):
+                for cx in range(math.ceil(x0 / c - 0.5), math.floor(x1 / c - 0.5) + 1):
+                    if (cx, r) not in border:
+                        self.cells.setdefault((cx, r), []).append((idx, INSIDE))
+
+    def _contains(self, idx: int, x: float, y: float) -> bool:
+        """Even-odd ray cast against the edges crossing this row"""
+        inside = False
+        for x1, y1, x2, y2 in self.row_edges[idx].get(math.floor(y / self.cell), ()):
+            if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                inside = not inside
+        return inside
+
+    def lookup(self, x: Optional[float], y: Optional[float]) -> Optional[str]:
+        """Code of the polygon containing (x, y), or None"""
+        if x is None or y is None:
+            return None
+        cell = (math.floor(x / self.cell), math.floor(y / self.cell))
+        for idx, state in self.cells.get(cell, ()):
+            if state == INSIDE or self._contains(idx, x, y):
+                return self.codes[idx]
+        return None
+
+
+def admin_code(properties: Dict, fields: List[str], fallback: str) -> str:
+    """First present code attribute, else the boundary feature id"""
+    for field in fields:
+        value = properties.get(field)
+        if value not in (None, ""):
+            return str(value)
+    return fallback
+
+
+def ensure_admin_columns(conn: sqlite3.Connection):
+    """Add the admin code columns and indexes if the features table lacks them"""
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(features)")}
+    for column, _, _ in ADMIN_LEVELS:
+        if column not in existing:
+            conn.execute(f"ALTER TABLE features ADD COLUMN {column} TEXT")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_features_{column} ON features({column})")
+
+
+def assign_admin_areas(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Assign region/province/comuna codes to every feature, returns counts per level"""
+    ensure_admin_columns(conn)
+    cursor = conn.cursor()
+    counts = {}
+
+    features = cursor.execute(
+        "SELECT id, centroid_lon, centroid_lat FROM features"
+    ).fetchall()
+
+    for column, prefix, fields in ADMIN_LEVELS:
+        boundaries = cursor.execute(
+            "SELECT f.id, g.geometry, f.properties FROM features f "
+            "LEFT JOIN geometries g ON g.id = f.geometry_id WHERE f.layer_id LIKE ?", (f"{prefix}%",)
+        ).fetchall()
+        if not boundaries:
+            print(f"  No {prefix} layer loaded, skipping {column}")
+            continue
+
+        own_codes = {}
+        polygons = []
+        for fid, geometry, properties in boundaries:
+            code = admin_code(json.loads(properties or "{}"), fields, str(fid))
+            own_codes[fid] = code
+            polygons.append((code, polygon_rings(json.loads(geometry) if geometry else None)))
+
+        index = PolygonIndex(polygons)
+
+        updates = []
+        for fid, lon, lat in features:
+            # A boundary keeps its own code at its own level
+            code = own_codes.get(fid) or index.lookup(lon, lat)
+            if code is not None:
+                updates.append((code, fid))
+
+        cursor.executemany(f"UPDATE features SET {column} = ? WHERE id = ?", updates)
+        counts[column] = len(updates)
+
+    conn.commit()
+    return counts
+
+
+def main():
+    db_path = DEFAULT_DB
+    if "--db" in sys.argv:
+        db_path = sys.argv[sys.argv.index("--db") + 1]
+
+    conn = sqlite3.connect(db_path)
+    for column, count in assign_admin_areas(conn).items():
+        print(f"{column:<15} {count:>10} features")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Materialized aggregate tables for IDE Chile dashboards
+
+Built by upload-to-turso.py after the admin-area join so overview queries
+(features per region, canal length, protected-area surface per comuna,
+heatmaps) read a few rows instead of scanning features:
+
+    agg_admin   (layer_id, level, code) -> feature_count, length_km, area_km2
+                level is region/province/comuna; '' is the unassigned code
+    agg_grid    (layer_id, z, x, y)     -> feature_count per web mercator tile
+                at GRID_ZOOMS, by centroid
+    agg_layers  (layer_id)              -> fingerprint of the rows aggregated
+
+Lengths are geodesic (haversine) sums over line geometries, areas spherical
+polygon areas evaluated even-odd over all rings of a geometry, like
+ide_admin's point-in-polygon, so holes are subtracted even where the
+downloader split a multi-ring polygon into single-ring MultiPolygon parts.
+A feature counts in full towards the admin area holding its centroid;
+geometries are not clipped at borders.
+
+Refresh is per layer: a layer is only re-aggregated when its fingerprint
+(a hash of geometry, properties, admin codes and AGGREGATE_VERSION)
+changed. The loader builds into a separate file while the previous database
+stays in place, so unchanged layers copy their rows from it instead of being
+recomputed.
+
+Usage:
+    python3 ide_aggregates.py [--db path/to.db]            # refresh in place
+    python3 ide_aggregates.py --summary [--db path/to.db]  # dashboard queries
+"""
+
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from ide_admin import polygon_rings
+from ide_knn import haversine
+from ide_query import lonlat_to_tile
+
+DEFAULT_DB = "data/ide-chile/ide-chile-data.db"
+
+GRID_ZOOMS = (4, 6, 8, 10)
+EARTH_RADIUS = 6371008.8
+
+# Part of every layer fingerprint: bump when the measures change so layers
+# are not copied from a previous build computed the old way
+AGGREGATE_VERSION = 2
+
+ADMIN_LEVELS = ("region", "province", "comuna")
+
+AGGREGATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS agg_layers (
+    layer_id TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    refreshed_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS agg_admin (
+    layer_id TEXT NOT NULL,
+    level TEXT NOT NULL,
+    code TEXT NOT NULL,
+    feature_count INTEGER NOT NULL,
+    length_km REAL NOT NULL,
+    area_km2 REAL NOT NULL,
+    PRIMARY KEY (layer_id, level, code)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS agg_grid (
+    layer_id TEXT NOT NULL,
+    z INTEGER NOT NULL,
+    x INTEGER NOT NULL,
+    y INTEGER NOT NULL,
+    feature_count INTEGER NOT NULL,
+    PRIMARY KEY (layer_id, z, x, y)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_agg_admin_code ON agg_admin(level, code);
+CREATE INDEX IF NOT EXISTS idx_agg_grid_tile ON agg_grid(z, x, y);
+"""
+
+ADMIN_COLUMNS = "layer_id, level, code, feature_count, length_km, area_km2"
+GRID_COLUMNS = "layer_id, z, x, y, feature_count"
+
+
+def line_length_m(line: List[List[float]]) -> float:
+    return sum(haversine(a[0], a[1], b[0], b[1]) for a, b in zip(line, line[1:]))
+
+
+def ring_area_m2(ring: List[List[float]]) -> float:
+    """Unsigned area of a closed lon/lat ring on the sphere"""
+    total = 0.0
+    for a, b in zip(ring, ring[1:] + ring[:1]):
+        total += math.radians(b[0] - a[0]) * (2 + math.sin(math.radians(a[1])) + math.sin(math.radians(b[1])))
+    return abs(total) * EARTH_RADIUS ** 2 / 2
+
+
+def ring_contains(ring: List[List[float]], x: float, y: float) -> bool:
+    """Even-odd ray cast of a point against one ring"""
+    inside = False
+    for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+        if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+    return inside
+
+
+def polygon_area_m2(rings: List[List[List[float]]]) -> float:
+    """Even-odd area of a set of rings, whatever polygon they came in
+
+    A ring nested inside an odd number of the other rings is a hole and is
+    subtracted, one inside an even number (an island in a hole) is added.
+    """
+    rings = [r for r in rings if len(r) >= 3]
+    boxes = [(min(p[0] for p in r), min(p[1] for p in r), max(p[0] for p in r), max(p[1] for p in r))
+             for r in rings]
+
+    total = 0.0
+    for i, ring in enumerate(rings):
+        x, y = ring[0][0], ring[0][1]
+        depth = sum(
+            1 for j, (west, south, east, north) in enumerate(boxes)
+            if j != i and west <= x <= east and south <= y <= north and ring_contains(rings[j], x, y)
+        )
+        total += -ring_area_m2(ring) if depth % 2 else ring_area_m2(ring)
+    return max(total, 0.0)
+
+
+def geometry_measures(geometry: Optional[Dict]) -> Tuple[float, float]:
+    """(length_km, area_km2) of a GeoJSON geometry"""
+    if not geometry:
+        return (0.0, 0.0)
+
+    geom_type = geometry.get("type")
+    coords = geometry.get("coordinates") or []
+
+    if geom_type == "LineString":
+        return (line_length_m(coords) / 1000, 0.0)
+    if geom_type == "MultiLineString":
+        return (sum(line_length_m(line) for line in coords) / 1000, 0.0)
+    if geom_type in ("Polygon", "MultiPolygon"):
+        return (0.0, polygon_area_m2(polygon_rings(geometry)) / 1e6)
+    return (0.0, 0.0)
+
+
+def ensure_aggregate_tables(conn: sqlite3.Connection):
+    conn.executescript(AGGREGATE_SCHEMA)
+
+
+def layer_fingerprint(conn: sqlite3.Connection, layer_id: str) -> str:
+    """Hash of everything the aggregates of a layer depend on
+
+    Row ids are left out: they shift whenever an earlier layer changes size.
+    """
+    digest = hashlib.sha1(f"v{AGGREGATE_VERSION}\x1e".encode())
+    for row in conn.execute("""
+        SELECT g.geometry, f.properties, f.region_code, f.province_code, f.comuna_code
+        FROM features f LEFT JOIN geometries g ON g.id = f.geometry_id
+        WHERE f.layer_id = ? ORDER BY f.id
+    """, (layer_id,)):
+        digest.update("\x1f".join(v or "" for v in row).encode())
+        digest.update(b"\x1e")
+    return digest.hexdigest()
+
+
+def compute_layer(conn: sqlite3.Connection, layer_id: str):
+    """Aggregate one layer from the features table"""
+    admin: Dict[Tuple[str, str], List[float]] = {}
+    grid: Dict[Tuple[int, int, int], int] = {}
+
+    for geometry, region, province, comuna, lon, lat in conn.execute("""
+        SELECT g.geometry, f.region_code, f.province_code, f.comuna_code, f.centroid_lon, f.centroid_lat
+        FROM features f LEFT JOIN geometries g ON g.id = f.geometry_id
+        WHERE f.layer_id = ?
+    """, (layer_id,)):
+        length_km, area_km2 = geometry_measures(json.loads(geometry) if geometry else None)
+
+        for level, code in zip(ADMIN_LEVELS, (region, province, comuna)):
+            acc = admin.setdefault((level, code or ""), [0, 0.0, 0.0])
+            acc[0] += 1
+            acc[1] += length_km
+            acc[2] += area_km2
+
+        if lon is not None and lat is not None:
+            for z in GRID_ZOOMS:
+                key = (z,) + lonlat_to_tile(lon, lat, z)
+                grid[key] = grid.get(key, 0) + 1
+
+    conn.executemany(
+        f"INSERT INTO agg_admin ({ADMIN_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)",
+        [(layer_id, level, code, c, length, area) for (level, code), (c, length, area) in admin.items()],
+    )
+    conn.executemany(
+        f"INSERT INTO agg_grid ({GRID_COLUMNS}) VALUES (?, ?, ?, ?, ?)",
+        [(layer_id, z, x, y, c) for (z, x, y), c in grid.items()],
+    )
+
+
+def delete_layer(conn: sqlite3.Connection, layer_id: str, schema: str = "main"):
+    for table in ("agg_admin", "agg_grid", "agg_layers"):
+        conn.execute(f"DELETE FROM {schema}.{table} WHERE layer_id = ?", (layer_id,))
+
+
+def refresh_aggregates(conn: sqlite3.Connection, previous_db: Optional[str] = None) -> Dict[str, str]:
+    """Bring the aggregate tables up to date with the features table
+
+    Returns what happened per layer: unchanged, copied (from previous_db),
+    computed, or removed.
+    """
+    ensure_aggregate_tables(conn)
+    layers = [r[0] for r in conn.execute("SELECT id FROM layers ORDER BY id")]
+    stored = dict(conn.execute("SELECT layer_id, fingerprint FROM agg_layers"))
+
+    previous: Dict[str, str] = {}
+    if previous_db and os.path.exists(previous_db):
+        conn.execute("ATTACH DATABASE ? AS prev", (previous_db,))
+        has_aggregates = conn.execute(
+            "SELECT 1 FROM prev.sqlite_master WHERE name = 'agg_layers'"
+        ).fetchone()
+        if has_aggregates:
+            previous = dict(conn.execute("SELECT layer_id, fingerprint FROM prev.agg_layers"))
+
+    status: Dict[str, str] = {}
+    for layer_id in stored:
+        if layer_id not in layers:
+            delete_layer(conn, layer_id)
+            status[layer_id] = "removed"
+
+    for layer_id in layers:
+        fingerprint = layer_fingerprint(conn, layer_id)
+        if stored.get(layer_id) == fingerprint:
+            status[layer_id] = "unchanged"
+            continue
+
+        delete_layer(conn, layer_id)
+        if previous.get(layer_id) == fingerprint:
+            conn.execute(f"INSERT INTO agg_admin SELECT {ADMIN_COLUMNS} FROM prev.agg_admin WHERE layer_id = ?",
+                         (layer_id,))
+            conn.execute(f"INSERT INTO agg_grid SELECT {GRID_COLUMNS} FROM prev.agg_grid WHERE layer_id = ?",
+                         (layer_id,))
+            status[layer_id] = "copied"
+        else:
+            compute_layer(conn, layer_id)
+            status[layer_id] = "computed"
+
+        conn.execute("INSERT INTO agg_layers (layer_id, fingerprint) VALUES (?, ?)", (layer_id, fingerprint))
+        conn.commit()
+
+    conn.commit()
+    if previous_db and os.path.exists(previous_db):
+        conn.execute("DETACH DATABASE prev")
+    return status
+
+
+def features_per_region(conn: sqlite3.Connection, layer_id: Optional[str] = None) -> List[Tuple]:
+    """(layer_id, region_code, feature_count) rows"""
+    sql = "SELECT layer_id, code, feature_count FROM agg_admin WHERE level = 'region'"
+    params: Tuple = ()
+    if layer_id:
+        sql += " AND layer_id = ?"
+        params = (layer_id,)
+    return conn.execute(sql + " ORDER BY layer_id, code", params).fetchall()
+
+
+def total_length_km(conn: sqlite3.Connection, layer_prefix: str) -> float:
+    """Total line length of the layers whose id starts with layer_prefix"""
+    row = conn.execute("""
+        SELECT SUM(length_km) FROM agg_admin WHERE level = 'region' AND layer_id LIKE ? || '%'
+    """, (layer_prefix,)).fetchone()
+    return row[0] or 0.0
+
+
+def area_per_comuna(conn: sqlite3.Connection, layer_prefix: str) -> List[Tuple[str, float]]:
+    """(comuna_code, area_km2) of the layers whose id starts with layer_prefix"""
+    return conn.execute("""
+        SELECT code, SUM(area_km2) AS area FROM agg_admin
+        WHERE level = 'comuna' AND layer_id LIKE ? || '%'
+        GROUP BY code ORDER BY area DESC
+    """, (layer_prefix,)).fetchall()
+
+
+def density_grid(conn: sqlite3.Connection, z: int, layers: Optional[List[str]] = None) -> List[Tuple]:
+    """(x, y, feature_count) heatmap cells at zoom z, summed over layers"""
+    sql = "SELECT x, y, SUM(feature_count) FROM agg_grid WHERE z = ?"
+    params: List = [z]
+    if layers:
+        sql += f" AND layer_id IN ({', '.join('?' * len(layers))})"
+        params.extend(layers)
+    return conn.execute(sql + " GROUP BY x, y", params).fetchall()
+
+
+def print_summary(conn: sqlite3.Connection):
+    """Run the dashboard queries and show how long each took"""
+    queries = [
+        ("features per region", lambda: features_per_region(conn)),
+        ("canal length", lambda: total_length_km(conn, "canales-cnr")),
+        ("protected area per comuna", lambda: area_per_comuna(conn, "snaspe")),
+        (f"density grid z{GRID_ZOOMS[-1]}", lambda: density_grid(conn, GRID_ZOOMS[-1])),
+    ]
+
+    results = {}
+    print(f"{'Query':<30} {'Rows':>8} {'ms':>8}")
+    print("-" * 48)
+    for name, query in queries:
+        start = time.perf_counter()
+        result = query()
+        elapsed = (time.perf_counter() - start) * 1000
+        results[name] = result
+        rows = len(result) if isinstance(result, list) else 1
+        print(f"{name:<30} {rows:>8} {elapsed:>8.2f}")
+
+    print(f"\nCanal length: {results['canal length']:.1f} km")
+    top = results["protected area per comuna"][:5]
+    if top:
+        print("Largest protected area by comuna:")
+        for code, area in top:
+            print(f"  {code or '(unassigned)':<12} {area:>12.1f} km²")
+
+
+def main():
+    db_path = DEFAULT_DB
+    if "--db" in sys.argv:
+        db_path = sys.argv[sys.argv.index("--db") + 1]
+
+    conn = sqlite3.connect(db_path)
+    if "--summary" in sys.argv:
+        print_summary(conn)
+    else:
+        start = time.perf_counter()
+        status = refresh_aggregates(conn)
+        counts: Dict[str, int] = {}
+        for s in status.values():
+            counts[s] = counts.get(s, 0) + 1
+        print(f"Aggregates refreshed in {time.perf_counter() - start:.2f}s: "
+              + ", ".join(f"{n} {s}" for s, n in sorted(counts.items())))
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of the IDE Chile data scripts against a local MapServer
+
+Starts ide_mapserver.FakeMapServer in a background thread and runs the real
+download, conversion, database build and query code against it:
+
+    download      offset-paged fetch + decode of every service layer
+    download-ids  the same via returnIdsOnly/objectIds paging
+    convert       ESRI JSON to GeoJSON files
+    build         upload-to-turso.py load + finalize (indexes, aggregates, ...)
+    query         bbox viewports, tile streams, FTS search and k-NN
+
+Each run is appended to a JSON-lines history (data/ide-chile/bench/history.jsonl)
+and compared with the median of earlier runs of the same configuration, so
+regressions show up as the code changes. Sub-stage timings from the scripts'
+own RunReport stages (fetch, decode, insert, index, ...) are kept per run.
+Download workloads record the features received against those the server
+holds, so lost pages show up next to the timings.
+
+Usage:
+    python3 ide_bench.py [--features 3000] [--vertices 20] [--latency 0.0] [--error-rate 0.0 | --error-every 0]
+                         [--workloads download,download-ids,convert,build,query]
+                         [--recorded data/ide-chile] [--queries 200] [--threshold 0.15]
+                         [--history data/ide-chile/bench/history.jsonl] [--no-record] [--keep]
+"""
+
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Any, Optional
+
+from ide_mapserver import FakeMapServer, DEFAULT_FEATURES, DEFAULT_VERTICES
+from ide_metrics import RunReport
+from ide_pipeline import download, upload
+
+DEFAULT_HISTORY = "data/ide-chile/bench/history.jsonl"
+DEFAULT_QUERIES = 200
+DEFAULT_THRESHOLD = 0.15
+HISTORY_WINDOW = 5
+
+WORKLOADS = ["download", "download-ids", "convert", "build", "query"]
+
+SEARCH_TERMS = ["rio", "canal", "maule", "agua potable", "quebrada honda"]
+TILE_ZOOM = 8
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def latency_stats(samples: List[float]) -> Dict[str, Any]:
+    """p50/p95/max in ms for a list of durations in seconds"""
+    if not samples:
+        return {"queries": 0}
+    return {
+        "queries": len(samples),
+        "seconds": round(sum(samples), 4),
+        "p50_ms": round(percentile(samples, 0.5) * 1000, 3),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3),
+    }
+
+
+def service_layers() -> List[tuple]:
+    return [(service, layer) for service in download.SERVICES for layer in service.get("layers", [0])]
+
+
+def run_download(base_url: str, id_paging: bool = False) -> Dict[str, List[Dict]]:
+    """Fetch every layer from the fake server, returns ESRI pages per layer key"""
+    saved = download.ID_PAGING
+    download.ID_PAGING = id_paging
+    pages = {}
+    try:
+        for service, layer in service_layers():
+            url = service["url"].replace(download.MOP_BASE_URL, base_url)
+            pages[f"{service['id']}_layer{layer}"] = list(download.iter_layer_pages(url, layer, delay=0))
+    finally:
+        download.ID_PAGING = saved
+    return pages
+
+
+def run_convert(pages: Dict[str, List[Dict]], data_dir: str) -> int:
+    """Convert downloaded pages to the GeoJSON files upload-to-turso.py reads"""
+    total = 0
+    for layer_key, layer_pages in pages.items():
+        features = []
+        for page in layer_pages:
+            with download.REPORT.stage("convert") as stage:
+                converted = download.esri_to_geojson(page)["features"]
+                stage.add(features=len(converted))
+            features.extend(converted)
+        if not features:
+            continue
+
+        path = os.path.join(data_dir, f"{layer_key}.geojson")
+        with download.REPORT.stage("write") as stage:
+            with open(path, "w") as f:
+                json.dump({"type": "FeatureCollection", "features": features}, f)
+            stage.add(bytes=os.path.getsize(path), features=len(features))
+        total += len(features)
+    return total
+
+
+def run_build(data_dir: str) -> Dict[str, Any]:
+    """Build the local database from data_dir with upload-to-turso.py"""
+    saved = upload.DATA_DIR, upload.LOCAL_DB
+    upload.DATA_DIR = data_dir
+    upload.LOCAL_DB = os.path.join(data_dir, f"{upload.DB_NAME}.db")
+    try:
+        conn = upload.create_local_db()
+        total = upload.load_geojson_files(conn)
+        upload.finalize_db(conn, total)
+        upload.commit_local_db(conn)
+        return {"features": total, "dbBytes": os.path.getsize(upload.LOCAL_DB)}
+    finally:
+        upload.DATA_DIR, upload.LOCAL_DB = saved
+
+
+def run_queries(db_path: str, queries: int = DEFAULT_QUERIES) -> Dict[str, Any]:
+    """Time the read paths the API server uses"""
+    from ide_knn import KnnIndex
+    from ide_query import open_db, query_features, stream_geojson, lonlat_to_tile, tile_to_bbox
+    from ide_sfc import random_viewports
+
+    conn = open_db(db_path)
+    viewports = random_viewports(conn, count=queries)
+    results = {}
+
+    samples = []
+    for bbox in viewports:
+        start = time.perf_counter()
+        query_features(conn, bbox=bbox, limit=1000)
+        samples.append(time.perf_counter() - start)
+    results["bbox"] = latency_stats(samples)
+
+    samples = []
+    for west, south, east, north in viewports:
+        x, y = lonlat_to_tile((west + east) / 2, (south + north) / 2, TILE_ZOOM)
+        start = time.perf_counter()
+        for _ in stream_geojson(conn, bbox=tile_to_bbox(TILE_ZOOM, x, y), limit=5000):
+            pass
+        samples.append(time.perf_counter() - start)
+    results["tile"] = latency_stats(samples)
+
+    samples = []
+    for i in range(queries):
+        start = time.perf_counter()
+        query_features(conn, text=SEARCH_TERMS[i % len(SEARCH_TERMS)], limit=100)
+        samples.append(time.perf_counter() - start)
+    results["search"] = latency_stats(samples)
+
+    start = time.perf_counter()
+    index = KnnIndex.from_db(conn)
+    results["knn_index_seconds"] = round(time.perf_counter() - start, 4)
+    samples = []
+    for west, south, east, north in viewports:
+        start = time.perf_counter()
+        index.nearest((west + east) / 2, (south + north) / 2, 10)
+        samples.append(time.perf_counter() - start)
+    results["knn"] = latency_stats(samples)
+
+    conn.close()
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                             text=True, cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmark(server: FakeMapServer, workloads: List[str], workdir: str,
+                  queries: int = DEFAULT_QUERIES) -> Dict[str, Any]:
+    """Run the selected workloads, returns one history record"""
+    report = RunReport("bench", trace_memory=False)
+    download.REPORT = report
+    upload.REPORT = report
+    results: Dict[str, Dict[str, Any]] = {}
+
+    def timed(name: str, fn, *args):
+        print(f"\n--- {name} ---")
+        start = time.perf_counter()
+        value = fn(*args)
+        results[name] = {"seconds": round(time.perf_counter() - start, 4)}
+        return value
+
+    pages = None
+    expected = {key: min(count, download.MAX_RECORDS) for key, count in server.layer_counts().items()}
+    for name in ("download-ids", "download"):
+        if name in workloads or (name == "download" and pages is None and "convert" in workloads):
+            pages = timed(name, run_download, server.base_url, name == "download-ids")
+            received = {key: sum(len(p.get("features", [])) for p in layer) for key, layer in pages.items()}
+            features = sum(received.values())
+            results[name]["features"] = features
+            results[name]["expected_features"] = sum(expected.values())
+            results[name]["features_per_second"] = round(features / results[name]["seconds"], 1)
+
+            short = {key: received.get(key, 0) for key, count in expected.items() if received.get(key, 0) != count}
+            if short:
+                results[name]["incomplete_layers"] = {key: [got, expected[key]] for key, got in short.items()}
+                print(f"Received {features} of {sum(expected.values())} features, incomplete layers:")
+                for key, got in short.items():
+                    print(f"  {key}: {got} of {expected[key]}")
+
+    if "convert" in workloads:
+        features = timed("convert", run_convert, pages, workdir)
+        results["convert"]["features"] = features
+
+    db_path = os.path.join(workdir, f"{upload.DB_NAME}.db")
+    if "build" in workloads:
+        built = timed("build", run_build, workdir)
+        results["build"].update(built)
+        if built["features"]:
+            results["build"]["features_per_second"] = round(built["features"] / results["build"]["seconds"], 1)
+
+    if "query" in workloads:
+        if not os.path.exists(db_path):
+            print(f"\nSkipping query workload: no database at {db_path}")
+        else:
+            stats = timed("query", run_queries, db_path, queries)
+            results["query"].update(stats)
+
+    return {
+        "startedAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(report.started)),
+        "commit": git_commit(),
+        "config": {
+            "features": server.features,
+            "vertices": server.vertices,
+            "latency": server.latency,
+            "errorRate": server.error_rate,
+            "errorEvery": server.error_every,
+            "recorded": bool(server.recorded),
+        },
+        "requests": server.requests,
+        "injectedErrors": server.errors,
+        "workloads": results,
+        "stages": report.to_dict()["stages"],
+    }
+
+
+def load_history(path: str) -> List[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def append_history(path: str, record: Dict[str, Any]):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def workload_metrics(record: Dict[str, Any]) -> Dict[str, float]:
+    """Flat name -> seconds/ms metrics of a run, lower is better"""
+    metrics = {}
+    for name, result in record["workloads"].items():
+        metrics[f"{name}.seconds"] = result["seconds"]
+        for key, value in result.items():
+            if isinstance(value, dict) and "p95_ms" in value:
+                metrics[f"{name}.{key}.p95_ms"] = value["p95_ms"]
+    return metrics
+
+
+def compare_history(history: List[Dict[str, Any]], record: Dict[str, Any],
+                    threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+    """Print the run against the median of the last runs with the same config
+
+    Returns the metrics that got slower by more than threshold.
+    """
+    previous = [r for r in history if r.get("config") == record["config"]][-HISTORY_WINDOW:]
+    current = workload_metrics(record)
+
+    print(f"\n{'Metric':<28} {'Median':>10} {'This run':>10} {'Change':>9}")
+    print("-" * 60)
+    regressions = []
+    for name, value in current.items():
+        past = [workload_metrics(r)[name] for r in previous if name in workload_metrics(r)]
+        if not past:
+            print(f"{name:<28} {'-':>10} {value:>10.3f} {'new':>9}")
+            continue
+        median = statistics.median(past)
+        change = (value - median) / median if median else 0.0
+        flag = "  <-- slower" if change > threshold else ""
+        print(f"{name:<28} {median:>10.3f} {value:>10.3f} {change * 100:>+8.1f}%{flag}")
+        if flag:
+            regressions.append(name)
+
+    print(f"\nCompared against {len(previous)} earlier run(s) with the same configuration")
+    return regressions
+
+
+def main():
+    options: Dict[str, Any] = {"features": DEFAULT_FEATURES, "vertices": DEFAULT_VERTICES}
+    workloads = list(WORKLOADS)
+    history_path = DEFAULT_HISTORY
+    queries = DEFAULT_QUERIES
+    threshold = DEFAULT_THRESHOLD
+
+    args = sys.argv[1:]
+    for i, arg in enumerate(args):
+        if arg == "--features":
+            options["features"] = int(args[i + 1])
+        elif arg == "--vertices":
+            options["vertices"] = int(args[i + 1])
+        elif arg == "--latency":
+            options["latency"] = float(args[i + 1])
+        elif arg == "--error-rate":
+            options["error_rate"] = float(args[i + 1])
+        elif arg == "--error-every":
+            options["error_every"] = int(args[i + 1])
+        elif arg == "--recorded":
+            options["recorded"] = args[i + 1]
+        elif arg == "--workloads":
+            workloads = args[i + 1].split(",")
+        elif arg == "--history":
+            history_path = args[i + 1]
+        elif arg == "--queries":
+            queries = int(args[i + 1])
+        elif arg == "--threshold":
+            threshold = float(args[i + 1])
+
+    unknown = [w for w in workloads if w not in WORKLOADS]
+    if unknown:
+        print(f"Unknown workloads: {', '.join(unknown)} (choose from {', '.join(WORKLOADS)})")
+        sys.exit(1)
+
+    server = FakeMapServer(("127.0.0.1", 0), **options)
+    server.start_background()
+    workdir = tempfile.mkdtemp(prefix="ide-bench-")
+
+    print("=" * 60)
+    print("IDE Chile Data - Benchmark")
+    print("=" * 60)
+    print(f"Fake MapServer: {server.base_url}  Work dir: {workdir}")
+    print(f"Features/layer: {server.features}  Vertices: {server.vertices}  "
+          f"Latency: {server.latency}s  Error rate: {server.error_rate}")
+
+    try:
+        record = run_benchmark(server, workloads, workdir, queries)
+    finally:
+        server.shutdown()
+        server.server_close()
+        if "--keep" not in args:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print("\n" + "=" * 60)
+    print("Benchmark Results")
+    print("=" * 60)
+    print(f"Requests: {record['requests']}  Injected errors: {record['injectedErrors']}")
+    for name in ("download", "download-ids"):
+        result = record["workloads"].get(name)
+        if result:
+            print(f"{name}: {result['features']} of {result['expected_features']} features received")
+    regressions = compare_history(load_history(history_path), record, threshold)
+
+    if "--no-record" not in args:
+        append_history(history_path, record)
+        print(f"History updated: {history_path}")
+
+    if regressions:
+        print(f"\nRegressions over {threshold * 100:.0f}%: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
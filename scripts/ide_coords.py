@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Flat binary coordinate store for IDE Chile layers
+
+upload-to-turso.py writes one .coords file per layer so terrain and surface
+tooling can get raw vertex arrays without decoding nested GeoJSON. Readers
+memory-map the file and get zero-copy NumPy views.
+
+File layout (little-endian, every section 8-byte aligned):
+
+    header            64 bytes: magic, version, counts (see HEADER)
+    coords            float64[n_coords, 2]   lon, lat
+    feature_ids       int64[n_features]      features.id, ascending
+    geometry_offsets  int64[n_features + 1]  feature -> first part
+    part_offsets      int64[n_parts + 1]     part -> first ring
+    ring_offsets      int64[n_rings + 1]     ring -> first vertex
+    geometry_types    uint8[n_features]      index into GEOMETRY_TYPES
+
+Parts are the polygons/lines/points of a geometry; a LineString is one part
+with one ring, a Polygon one part with its rings, a MultiPoint one part per
+point. Features without geometry have zero parts. Positions that are
+missing, non-numeric or not finite (ESRI's [null, null] points, empty
+coordinate arrays) are dropped, so such a geometry keeps its parts and rings
+with zero vertices.
+
+Usage:
+    python3 ide_coords.py [--db path/to.db] [--out data/ide-chile/coords]
+"""
+
+import json
+import mmap
+import os
+import sqlite3
+import struct
+import sys
+from array import array
+from typing import Dict, List, Optional
+
+from ide_geometry import valid_position
+
+DEFAULT_DB = "data/ide-chile/ide-chile-data.db"
+DEFAULT_OUTPUT_DIR = "data/ide-chile/coords"
+
+MAGIC = b"IDECOORD"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQQQ")
+HEADER_SIZE = 64
+
+GEOMETRY_TYPES = ["None", "Point", "LineString", "Polygon", "MultiPoint", "MultiLineString", "MultiPolygon"]
+
+
+def geometry_parts(geometry: Optional[Dict]) -> List[List[List[List[float]]]]:
+    """Normalize a GeoJSON geometry to parts -> rings -> positions"""
+    if not geometry:
+        return []
+
+    geom_type = geometry.get("type")
+    coords = geometry.get("coordinates") or []
+
+    if geom_type == "Point":
+        return [[[coords]]]
+    if geom_type == "LineString":
+        return [[coords]]
+    if geom_type == "Polygon":
+        return [coords]
+    if geom_type == "MultiPoint":
+        return [[[c]] for c in coords]
+    if geom_type == "MultiLineString":
+        return [[line] for line in coords]
+    if geom_type == "MultiPolygon":
+        return coords
+    return []
+
+
+class CoordStoreWriter:
+    """Accumulates geometries into flat arrays and writes the store file"""
+
+    def __init__(self):
+        self.coords = array("d")
+        self.feature_ids = array("q")
+        self.geometry_offsets = array("q", [0])
+        self.part_offsets = array("q", [0])
+        self.ring_offsets = array("q", [0])
+        self.geometry_types = array("B")
+
+    def add(self, feature_id: int, geometry: Optional[Dict]):
+        self.feature_ids.append(feature_id)
+        geom_type = geometry.get("type") if geometry else "None"
+        self.geometry_types.append(GEOMETRY_TYPES.index(geom_type) if geom_type in GEOMETRY_TYPES else 0)
+
+        for part in geometry_parts(geometry):
+            for ring in part:
+                for position in ring:
+                    if valid_position(position):
+                        self.coords.append(position[0])
+                        self.coords.append(position[1])
+                self.ring_offsets.append(len(self.coords) // 2)
+            self.part_offsets.append(len(self.ring_offsets) - 1)
+        self.geometry_offsets.append(len(self.part_offsets) - 1)
+
+    def write(self, path: str) -> int:
+        """Write the store, returns the file size"""
+        sections = [self.coords, self.feature_ids, self.geometry_offsets,
+                    self.part_offsets, self.ring_offsets]
+        if sys.byteorder != "little":
+            for section in sections:
+                section.byteswap()
+
+        header = HEADER.pack(MAGIC, VERSION, 0, len(self.coords) // 2, len(self.feature_ids),
+                             len(self.part_offsets) - 1, len(self.ring_offsets) - 1)
+
+        with open(path, "wb") as f:
+            f.write(header.ljust(HEADER_SIZE, b"\0"))
+            for section in sections:
+                section.tofile(f)
+            self.geometry_types.tofile(f)
+
+        return os.path.getsize(path)
+
+
+def write_coord_stores(conn: sqlite3.Connection, output_dir: str = DEFAULT_OUTPUT_DIR) -> Dict[str, int]:
+    """Write one .coords file per layer, returns bytes written per layer"""
+    os.makedirs(output_dir, exist_ok=True)
+    written = {}
+
+    layers = [r[0] for r in conn.execute("SELECT id FROM layers ORDER BY id")]
+    for layer_id in layers:
+        writer = CoordStoreWriter()
+        for fid, geometry in conn.execute("""
+            SELECT f.id, g.geometry FROM features f LEFT JOIN geometries g ON g.id = f.geometry_id
+            WHERE f.layer_id = ? ORDER BY f.id
+        """, (layer_id,)):
+            writer.add(fid, json.loads(geometry) if geometry else None)
+        written[layer_id] = writer.write(os.path.join(output_dir, f"{layer_id}.coords"))
+
+    return written
+
+
+class CoordStore:
+    """Memory-mapped reader exposing the store sections as NumPy views"""
+
+    def __init__(self, path: str):
+        import numpy as np
+
+        self.path = path
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, n_coords, n_features, n_parts, n_rings = HEADER.unpack_from(self.mmap)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} coordinate store")
+
+        offset = HEADER_SIZE
+
+        def view(dtype: str, count: int):
+            nonlocal offset
+            arr = np.frombuffer(self.mmap, dtype=dtype, count=count, offset=offset)
+            offset += arr.nbytes
+            return arr
+
+        self.coords = view("<f8", n_coords * 2).reshape(n_coords, 2)
+        self.feature_ids = view("<i8", n_features)
+        self.geometry_offsets = view("<i8", n_features + 1)
+        self.part_offsets = view("<i8", n_parts + 1)
+        self.ring_offsets = view("<i8", n_rings + 1)
+        self.geometry_types = view("u1", n_features)
+
+    def __len__(self) -> int:
+        return len(self.feature_ids)
+
+    def index_of(self, feature_id: int) -> int:
+        """Position of a features.id in this store"""
+        import numpy as np
+
+        i = int(np.searchsorted(self.feature_ids, feature_id))
+        if i >= len(self.feature_ids) or self.feature_ids[i] != feature_id:
+            raise KeyError(feature_id)
+        return i
+
+    def feature_coords(self, i: int):
+        """All vertices of the i-th feature as an (n, 2) view"""
+        first_ring = self.part_offsets[self.geometry_offsets[i]]
+        last_ring = self.part_offsets[self.geometry_offsets[i + 1]]
+        return self.coords[self.ring_offsets[first_ring]:self.ring_offsets[last_ring]]
+
+    def feature_rings(self, i: int) -> list:
+        """Views of each ring (or line) of the i-th feature"""
+        first_ring = self.part_offsets[self.geometry_offsets[i]]
+        last_ring = self.part_offsets[self.geometry_offsets[i + 1]]
+        return [self.coords[self.ring_offsets[r]:self.ring_offsets[r + 1]]
+                for r in range(first_ring, last_ring)]
+
+    def close(self):
+        # Drop the views before closing, mmap refuses while buffers are exported
+        for name in ("coords", "feature_ids", "geometry_offsets", "part_offsets",
+                     "ring_offsets", "geometry_types"):
+            setattr(self, name, None)
+        self.mmap.close()
+
+
+def main():
+    db_path = DEFAULT_DB
+    output_dir = DEFAULT_OUTPUT_DIR
+
+    args = sys.argv[1:]
+    for i, arg in enumerate(args):
+        if arg == "--db":
+            db_path = args[i + 1]
+        elif arg == "--out":
+            output_dir = args[i + 1]
+
+    conn = sqlite3.connect(db_path)
+    written = write_coord_stores(conn, output_dir)
+    conn.close()
+
+    print(f"{'Layer':<35} {'Size':>12}")
+    print("-" * 48)
+    for layer_id, size in written.items():
+        print(f"{layer_id[:35]:<35} {size / 1024:>10.1f}KB")
+    print(f"\nCoordinate stores saved to: {output_dir}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Content-addressed geometry storage for IDE Chile features
+
+The same geometry shows up in several layers (infrastructure points listed
+by two services, admin rings repeated across levels). upload-to-turso.py
+stores every distinct geometry once in the geometries table, keyed by the
+SHA-1 of its normalized GeoJSON text, and features point at it through
+geometry_id. Normalization rounds coordinates to 7 decimals (~1 cm) and
+serializes compactly, so copies that only differ in float noise or
+whitespace share a row.
+
+A feature repeated within a layer (offset paging can return the same
+record twice) has the same geometry and properties; the loader skips it.
+
+Usage:
+    python3 ide_dedup.py [--db path/to.db]    # per-layer dedup report
+"""
+
+import hashlib
+import json
+import sqlite3
+import sys
+from typing import Dict, Any, Optional, Tuple
+
+DEFAULT_DB = "data/ide-chile/ide-chile-data.db"
+
+COORDINATE_DECIMALS = 7
+
+
+def _round_coords(coords):
+    if isinstance(coords, float):
+        return round(coords, COORDINATE_DECIMALS)
+    if isinstance(coords, list):
+        return [_round_coords(c) for c in coords]
+    return coords
+
+
+def normalize_geometry(geometry: Dict) -> str:
+    """Canonical text of a GeoJSON geometry, used both for hashing and storage"""
+    if geometry.get("type") == "GeometryCollection":
+        parts = ",".join(normalize_geometry(g) for g in geometry.get("geometries", []))
+        return f'{{"type":"GeometryCollection","geometries":[{parts}]}}'
+    return json.dumps(
+        {"type": geometry.get("type"), "coordinates": _round_coords(geometry.get("coordinates"))},
+        separators=(",", ":"),
+    )
+
+
+def store_geometry(cursor: sqlite3.Cursor, geometry: Optional[Dict]) -> Tuple[Optional[int], bool]:
+    """Get or create the geometries row, returns (geometry_id, created)"""
+    if not geometry:
+        return (None, False)
+
+    text = normalize_geometry(geometry)
+    digest = hashlib.sha1(text.encode()).digest()
+    cursor.execute("INSERT OR IGNORE INTO geometries (hash, geometry) VALUES (?, ?)", (digest, text))
+    if cursor.rowcount:
+        return (cursor.lastrowid, True)
+    return (cursor.execute("SELECT id FROM geometries WHERE hash = ?", (digest,)).fetchone()[0], False)
+
+
+def dedup_report(conn: sqlite3.Connection) -> Dict[str, Dict[str, Any]]:
+    """Per-layer geometry sharing
+
+    A geometry's bytes are charged to the layer of the first feature that
+    references it; every later reference, in any layer, is bytes saved.
+    """
+    rows = conn.execute("""
+        SELECT layer_id, COUNT(*), COUNT(DISTINCT geometry_id), SUM(NOT owner), SUM(size),
+               SUM(CASE WHEN owner THEN size ELSE 0 END)
+        FROM (
+            SELECT f.layer_id, f.geometry_id, LENGTH(g.geometry) AS size,
+                   f.id = MIN(f.id) OVER (PARTITION BY f.geometry_id) AS owner
+            FROM features f JOIN geometries g ON g.id = f.geometry_id
+        )
+        GROUP BY layer_id ORDER BY layer_id
+    """).fetchall()
+
+    report = {}
+    for layer_id, features, unique, shared, referenced, stored in rows:
+        report[layer_id] = {
+            "features": features,
+            "uniqueGeometries": unique,
+            "sharedFeatures": shared,
+            "referencedBytes": referenced,
+            "storedBytes": stored,
+            "bytesSaved": referenced - stored,
+            "dedupRatio": round(referenced / stored, 3) if stored else None,
+        }
+    return report
+
+
+def print_dedup_report(report: Dict[str, Dict[str, Any]]):
+    print(f"\n{'Layer':<35} {'Features':>9} {'Unique':>9} {'Shared':>9} {'Saved KB':>10} {'Ratio':>7}")
+    print("-" * 84)
+    for layer_id, r in report.items():
+        ratio = f"{r['dedupRatio']:.2f}" if r["dedupRatio"] else "-"
+        print(f"{layer_id[:35]:<35} {r['features']:>9} {r['uniqueGeometries']:>9} {r['sharedFeatures']:>9} "
+              f"{r['bytesSaved'] / 1024:>10.1f} {ratio:>7}")
+
+    referenced = sum(r["referencedBytes"] for r in report.values())
+    saved = sum(r["bytesSaved"] for r in report.values())
+    if referenced:
+        print(f"\nTotal: {saved / 1024:.1f}KB of {referenced / 1024:.1f}KB geometry text saved"
+              f" ({referenced / (referenced - saved):.2f}x)")
+
+
+def main():
+    db_path = DEFAULT_DB
+    if "--db" in sys.argv:
+        db_path = sys.argv[sys.argv.index("--db") + 1]
+
+    conn = sqlite3.connect(db_path)
+    print_dedup_report(dedup_report(conn))
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Shared GeoJSON geometry helpers for the IDE Chile scripts
+"""
+
+import math
+from typing import Dict
+
+
+def iter_positions(coords):
+    """Yield every [lon, lat] position of a nested GeoJSON coordinate array"""
+    if coords and isinstance(coords[0], (int, float)):
+        yield coords
+        return
+    for c in coords:
+        yield from iter_positions(c)
+
+
+def valid_position(position) -> bool:
+    """True for a [lon, lat, ...] position with two finite numbers"""
+    try:
+        return len(position) >= 2 and math.isfinite(position[0]) and math.isfinite(position[1])
+    except TypeError:
+        return False
+
+
+def get_bounds(geometry: Dict) -> tuple:
+    """Calculate (west, south, east, north) bounds of a GeoJSON geometry"""
+    if not geometry or not geometry.get("coordinates"):
+        return (None, None, None, None)
+
+    try:
+        positions = list(iter_positions(geometry["coordinates"]))
+        lons = [p[0] for p in positions]
+        lats = [p[1] for p in positions]
+        return (min(lons), min(lats), max(lons), max(lats))
+    except (IndexError, TypeError, ValueError):
+        return (None, None, None, None)
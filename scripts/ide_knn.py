@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+k-nearest-neighbour search over IDE Chile features
+
+Answers questions like "nearest hydrometric stations to this catchment" with
+a best-first traversal of an STR-packed R-tree over feature centroids.
+Candidates are ranked by WGS84 geodesic distance (Vincenty); tree nodes are
+pruned with a spherical lower bound that never overestimates it.
+
+Usage:
+    python3 ide_knn.py --layer red-hidrometrica_layer0 --point -72.10,-36.60 --k 5
+    python3 ide_knn.py --layer siall-descargas_layer2 --benchmark
+"""
+
+import heapq
+import math
+import random
+import sqlite3
+import sys
+import time
+from typing import List, Optional, Sequence, Tuple
+
+DEFAULT_DB = "data/ide-chile/ide-chile-data.db"
+
+# WGS84 ellipsoid
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+
+# Smallest radius of curvature on WGS84 (meridional, at the equator). A
+# great-circle distance on this sphere never exceeds the ellipsoidal one.
+LOWER_BOUND_RADIUS = WGS84_A * (1 - WGS84_F * (2 - WGS84_F))
+
+NODE_CAPACITY = 16
+
+Point = Tuple[float, float]
+Neighbour = Tuple[float, int]
+
+
+def haversine(lon1: float, lat1: float, lon2: float, lat2: float,
+              radius: float = 6371008.8) -> float:
+    """Great-circle distance in meters on a sphere"""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    h = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * radius * math.asin(min(1.0, math.sqrt(h)))
+
+
+def geodesic_distance(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
+    """Geodesic distance in meters on the WGS84 ellipsoid (Vincenty inverse)"""
+    if lon1 == lon2 and lat1 == lat2:
+        return 0.0
+
+    a, b, f = WGS84_A, WGS84_B, WGS84_F
+    L = math.radians(lon2 - lon1)
+    U1 = math.atan((1 - f) * math.tan(math.radians(lat1)))
+    U2 = math.atan((1 - f) * math.tan(math.radians(lat2)))
+    sinU1, cosU1 = math.sin(U1), math.cos(U1)
+    sinU2, cosU2 = math.sin(U2), math.cos(U2)
+
+    lam = L
+    for _ in range(200):
+        sin_lam, cos_lam = math.sin(lam), math.cos(lam)
+        sin_sigma = math.hypot(cosU2 * sin_lam, cosU1 * sinU2 - sinU1 * cosU2 * cos_lam)
+        if sin_sigma == 0:
+            return 0.0
+        cos_sigma = sinU1 * sinU2 + cosU1 * cosU2 * cos_lam
+        sigma = math.atan2(sin_sigma, cos_sigma)
+        sin_alpha = cosU1 * cosU2 * sin_lam / sin_sigma
+        cos2_alpha = 1 - sin_alpha ** 2
+        cos_2sm = cos_sigma - 2 * sinU1 * sinU2 / cos2_alpha if cos2_alpha else 0.0
+        C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+        lam_prev = lam
+        lam = L + (1 - C) * f * sin_alpha * (
+            sigma + C * sin_sigma * (cos_2sm + C * cos_sigma * (-1 + 2 * cos_2sm ** 2))
+        )
+        if abs(lam - lam_prev) < 1e-12:
+            break
+    else:
+        # Nearly antipodal points don't converge, fall back to the sphere
+        return haversine(lon1, lat1, lon2, lat2)
+
+    u2 = cos2_alpha * (a * a - b * b) / (b * b)
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    delta_sigma = B * sin_sigma * (cos_2sm + B / 4 * (
+        cos_sigma * (-1 + 2 * cos_2sm ** 2)
+        - B / 6 * cos_2sm * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sm ** 2)
+    ))
+    return b * A * (sigma - delta_sigma)
+
+
+def min_distance_to_box(lon: float, lat: float, box: Tuple[float, float, float, float]) -> float:
+    """Lower bound in meters from a point to any point of a lon/lat box"""
+    west, south, east, north = box
+
+    if west <= lon <= east:
+        # Closest point lies on the same meridian
+        if south <= lat <= north:
+            return 0.0
+        return LOWER_BOUND_RADIUS * math.radians(min(abs(lat - south), abs(lat - north)))
+
+    # Closest point lies on the nearer meridian edge
+    edge = west if (west - lon) % 360 < (lon - east) % 360 else east
+    dl = math.radians(edge - lon)
+    if abs(dl) >= math.pi / 2:
+        return min(haversine(lon, lat, x, y, LOWER_BOUND_RADIUS)
+                   for x in (west, east) for y in (south, north))
+
+    foot = math.degrees(math.atan(math.tan(math.radians(lat)) / math.cos(dl)))
+    return haversine(lon, lat, edge, min(max(foot, south), north), LOWER_BOUND_RADIUS)
+
+
+class _Node:
+    """R-tree node: children for inner nodes, (id, lon, lat) entries for leaves"""
+
+    __slots__ = ("box", "children", "entries")
+
+    def __init__(self, box, children=None, entries=None):
+        self.box = box
+        self.children = children
+        self.entries = entries
+
+
+def _box_of(boxes) -> Tuple[float, float, float, float]:
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+def _str_pack(items: list, key_x, key_y, capacity: int) -> List[list]:
+    """Sort-Tile-Recursive grouping of items into runs of at most capacity"""
+    if not items:
+        return []
+    leaves = math.ceil(len(items) / capacity)
+    slices = math.ceil(math.sqrt(leaves))
+    per_slice = slices * capacity
+
+    groups = []
+    items = sorted(items, key=key_x)
+    for i in range(0, len(items), per_slice):
+        column = sorted(items[i:i + per_slice], key=key_y)
+        groups.extend(column[j:j + capacity] for j in range(0, len(column), capacity))
+    return groups
+
+
+class KnnIndex:
+    """Static R-tree over feature centroids answering k-NN queries"""
+
+    def __init__(self, points: Sequence[Tuple[int, float, float]], capacity: int = NODE_CAPACITY):
+        self.points = list(points)
+        self.root: Optional[_Node] = None
+
+        nodes = [
+            _Node(_box_of([(p[1], p[2], p[1], p[2]) for p in group]), entries=group)
+            for group in _str_pack(self.points, lambda p: p[1], lambda p: p[2], capacity)
+        ]
+        while len(nodes) > 1:
+            nodes = [
+                _Node(_box_of([n.box for n in group]), children=group)
+                for group in _str_pack(nodes,
+                                       lambda n: n.box[0] + n.box[2],
+                                       lambda n: n.box[1] + n.box[3],
+                                       capacity)
+            ]
+        if nodes:
+            self.root = nodes[0]
+
+    @classmethod
+    def from_db(cls, conn: sqlite3.Connection, layers: Optional[List[str]] = None) -> "KnnIndex":
+        """Build an index over the centroids of the given layers (all if None)"""
+        sql = "SELECT id, centroid_lon, centroid_lat FROM features WHERE centroid_lon IS NOT NULL"
+        params: List[str] = []
+        if layers:
+            sql += f" AND layer_id IN ({', '.join('?' for _ in layers)})"
+            params.extend(layers)
+        return cls(conn.execute(sql, params).fetchall())
+
+    def nearest(self, lon: float, lat: float, k: int = 5,
+                max_distance: Optional[float] = None) -> List[Neighbour]:
+        """Return up to k (distance_m, feature_id) pairs, nearest first"""
+        if self.root is None or k <= 0:
+            return []
+
+        # Min-heap mixing nodes (lower bound) and entries (exact distance).
+        # An entry popped before any node with a smaller bound is final.
+        heap: list = [(min_distance_to_box(lon, lat, self.root.box), 0, 0, self.root)]
+        counter = 1
+        results: List[Neighbour] = []
+
+        while heap and len(results) < k:
+            dist, _, is_entry, item = heapq.heappop(heap)
+            if max_distance is not None and dist > max_distance:
+                break
+
+            if is_entry:
+                results.append((dist, item))
+            elif item.entries is not None:
+                for fid, plon, plat in item.entries:
+                    d = geodesic_distance(lon, lat, plon, plat)
+                    heapq.heappush(heap, (d, counter, 1, fid))
+                    counter += 1
+            else:
+                for child in item.children:
+                    heapq.heappush(heap, (min_distance_to_box(lon, lat, child.box), counter, 0, child))
+                    counter += 1
+
+        return results
+
+    def nearest_batch(self, points: Sequence[Point], k: int = 5,
+                      max_distance: Optional[float] = None) -> List[List[Neighbour]]:
+        """Answer many query points in one call, results in input order
+
+        Queries run in latitude order so consecutive searches walk the same
+        branches of the tree while they are still hot in the CPU caches.
+        """
+        order = sorted(range(len(points)), key=lambda i: (points[i][1], points[i][0]))
+        results: List[List[Neighbour]] = [[] for _ in points]
+        for i in order:
+            lon, lat = points[i]
+            results[i] = self.nearest(lon, lat, k, max_distance)
+        return results
+
+    def brute_force(self, lon: float, lat: float, k: int = 5) -> List[Neighbour]:
+        """Reference answer: geodesic distance to every point"""
+        dists = [(geodesic_distance(lon, lat, plon, plat), fid) for fid, plon, plat in self.points]
+        return heapq.nsmallest(k, dists)
+
+
+def benchmark_knn(index: KnnIndex, queries: int = 200, k: int = 5, seed: int = 42) -> dict:
+    """Time indexed k-NN against brute force on random points in the data extent"""
+    if not index.points:
+        # No extent to draw query points from
+        return {"points": 0, "queries": 0, "k": k, "indexed_ms_per_query": None,
+                "brute_ms_per_query": None, "speedup": None, "mismatches": 0}
+
+    rng = random.Random(seed)
+    lons = [p[1] for p in index.points]
+    lats = [p[2] for p in index.points]
+    points = [(rng.uniform(min(lons), max(lons)), rng.uniform(min(lats), max(lats)))
+              for _ in range(queries)]
+
+    start = time.perf_counter()
+    indexed = index.nearest_batch(points, k)
+    indexed_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    brute = [index.brute_force(lon, lat, k) for lon, lat in points]
+    brute_time = time.perf_counter() - start
+
+    mismatches = sum(
+        1 for a, b in zip(indexed, brute)
+        if [round(d, 6) for d, _ in a] != [round(d, 6) for d, _ in b]
+    )
+
+    return {
+        "points": len(index.points),
+        "queries": queries,
+        "k": k,
+        "indexed_ms_per_query": indexed_time * 1000 / queries,
+        "brute_ms_per_query": brute_time * 1000 / queries,
+        "speedup": brute_time / indexed_time if indexed_time else None,
+        "mismatches": mismatches,
+    }
+
+
+def main():
+    db_path = DEFAULT_DB
+    layers = None
+    point = None
+    k = 5
+
+    args = sys.argv[1:]
+    for i, arg in enumerate(args):
+        if arg == "--db":
+            db_path = args[i + 1]
+        elif arg == "--layer":
+            layers = args[i + 1].split(",")
+        elif arg == "--point":
+            point = tuple(float(v) for v in args[i + 1].split(","))
+        elif arg == "--k":
+            k = int(args[i + 1])
+
+    conn = sqlite3.connect(db_path)
+    start = time.perf_counter()
+    index = KnnIndex.from_db(conn, layers)
+    print(f"Indexed {len(index.points)} features in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    if point:
+        print(f"\n{'Distance (m)':>14}  {'Feature':>8}  {'Layer':<30}")
+        print("-" * 56)
+        for dist, fid in index.nearest(point[0], point[1], k):
+            layer = conn.execute("SELECT layer_id FROM features WHERE id = ?", (fid,)).fetchone()[0]
+            print(f"{dist:>14.1f}  {fid:>8}  {layer:<30}")
+
+    if "--benchmark" in args and not index.points:
+        print("\nNo features to benchmark")
+    elif "--benchmark" in args:
+        r = benchmark_knn(index, k=k)
+        print("\n" + "=" * 60)
+        print("k-NN Benchmark (indexed vs brute force)")
+        print("=" * 60)
+        print(f"Points: {r['points']}  Queries: {r['queries']}  k: {r['k']}")
+        print(f"Indexed:     {r['indexed_ms_per_query']:.3f} ms/query")
+        print(f"Brute force: {r['brute_ms_per_query']:.3f} ms/query")
+        print(f"Speedup:     {r['speedup']:.1f}x")
+        print(f"Mismatches:  {r['mismatches']}")
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the rest-sit.mop.gob.cl ArcGIS MapServer services
+
+Answers the same /arcgis/rest/services/.../MapServer/{layer}/query URLs as
+the SERVICES list in download-ide-data.py, so the downloader, the streaming
+pipeline and the benchmarks run offline (--base-url http://127.0.0.1:8788).
+
+Layers are either synthetic (deterministic per layer and OBJECTID, with a
+configurable feature count and vertices per geometry) or recorded GeoJSON
+files from a previous download (--recorded data/ide-chile). Synthetic
+limites-* layers tile Chile into nested regions, provinces and comunas with
+CUT_REG/CUT_PROV/CUT_COM codes so the admin join has real work to do.
+
+Query parameters supported:
+    resultOffset, resultRecordCount    offset paging (exceededTransferLimit)
+    returnIdsOnly=true, objectIds=1,2  ID paging
+    returnCountOnly=true               feature count
+Requests can be slowed down (--latency, --jitter) and made to fail at random
+(--error-rate) or on every Nth request (--error-every, N >= 2) with HTTP 500s
+or ArcGIS-style JSON errors (--error-mode).
+
+Usage:
+    python3 ide_mapserver.py [--port 8788] [--features 3000] [--vertices 20]
+                             [--max-record-count 1000] [--latency 0.05] [--jitter 0.02]
+                             [--error-rate 0.01 | --error-every 10] [--error-mode json|http|mixed]
+                             [--recorded data/ide-chile] [--seed 1]
+"""
+
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Any, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+DEFAULT_PORT = 8788
+DEFAULT_FEATURES = 3000
+DEFAULT_VERTICES = 20
+MAX_RECORD_COUNT = 1000
+
+# Rough extent of continental Chile
+WEST, SOUTH, EAST, NORTH = -76.0, -56.0, -66.0, -17.0
+
+QUERY_RE = re.compile(r"^(/arcgis/rest/services/.+/MapServer)/(\d+)/query$")
+
+POLYGON_SERVICES = {
+    "acuiferos-protegidos", "areas-restriccion", "escasez-hidrica", "declaracion-agotamiento",
+    "caudales-reserva", "turberas", "siall-areas", "snaspe",
+}
+POLYLINE_SERVICES = {"canales-cnr", "siall-colectores"}
+
+# Nested admin tiling: 16 region strips, 4 provinces each, 4 comunas each
+ADMIN_SPLITS = {"limites-regiones": 0, "limites-provincias": 1, "limites-comunas": 2}
+REGION_COUNT = 16
+
+NAMES = ["Río Biobío", "Estero La Laja", "Canal Ñuble", "Puente Maipo", "Agua Potable Rural",
+         "Quebrada Honda", "Laguna del Maule", "Valle de Elqui", "Peñalolén", "Chiloé"]
+
+
+def service_layers() -> Dict[Tuple[str, int], str]:
+    """Map (MapServer path, layer) to service id from download-ide-data.py"""
+    from ide_pipeline import download
+
+    layers = {}
+    for service in download.SERVICES:
+        path = urlparse(service["url"]).path
+        for layer in service.get("layers", [0]):
+            layers[(path, layer)] = service["id"]
+    return layers
+
+
+def esri_geometry_type(service_id: str) -> str:
+    if service_id.startswith("limites-") or service_id in POLYGON_SERVICES:
+        return "esriGeometryPolygon"
+    if service_id in POLYLINE_SERVICES:
+        return "esriGeometryPolyline"
+    return "esriGeometryPoint"
+
+
+def _edge(x1: float, y1: float, x2: float, y2: float, steps: int) -> List[List[float]]:
+    """Straight edge split into steps segments, end point excluded"""
+    return [[round(x1 + (x2 - x1) * i / steps, 7), round(y1 + (y2 - y1) * i / steps, 7)] for i in range(steps)]
+
+
+def admin_cells(level: int) -> List[Tuple[str, Tuple[float, float, float, float]]]:
+    """(code, bbox) of every region, province or comuna cell"""
+    cells = []
+    strip = (NORTH - SOUTH) / REGION_COUNT
+    for r in range(REGION_COUNT):
+        south = SOUTH + r * strip
+        region = f"{r + 1:02d}"
+        if level == 0:
+            cells.append((region, (WEST, south, EAST, south + strip)))
+            continue
+        for p in range(4):
+            # Provinces split the strip west to east, comunas split provinces south to north
+            pw = WEST + p * (EAST - WEST) / 4
+            province = f"{region}{p + 1}"
+            if level == 1:
+                cells.append((province, (pw, south, pw + (EAST - WEST) / 4, south + strip)))
+                continue
+            for c in range(4):
+                cs = south + c * strip / 4
+                cells.append((f"{province}{c + 1:02d}", (pw, cs, pw + (EAST - WEST) / 4, cs + strip / 4)))
+    return cells
+
+
+class SyntheticLayer:
+    """Deterministic features generated on demand from (seed, layer, OBJECTID)"""
+
+    def __init__(self, service_id: str, layer: int, count: int, vertices: int, seed: int):
+        self.service_id = service_id
+        self.geometry_type = esri_geometry_type(service_id)
+        self.vertices = max(vertices, 4)
+        self.seed = f"{seed}:{service_id}:{layer}"
+        self.cells = None
+        prefix = next((p for p in ADMIN_SPLITS if service_id.startswith(p)), None)
+        if prefix:
+            self.cells = admin_cells(ADMIN_SPLITS[prefix])
+            self.code_field = ["CUT_REG", "CUT_PROV", "CUT_COM"][ADMIN_SPLITS[prefix]]
+        self.object_ids = range(1, (len(self.cells) if self.cells else count) + 1)
+
+    def feature(self, object_id: int) -> Dict[str, Any]:
+        rng = random.Random(f"{self.seed}:{object_id}")
+        attributes = {"OBJECTID": object_id, "NOMBRE": f"{rng.choice(NAMES)} {object_id}",
+                      "CODIGO": rng.randint(1, 99999), "VALOR": round(rng.uniform(0, 1000), 3)}
+
+        if self.cells:
+            code, (w, s, e, n) = self.cells[object_id - 1]
+            attributes[self.code_field] = code
+            steps = max(self.vertices // 4, 1)
+            ring = _edge(w, s, e, s, steps) + _edge(e, s, e, n, steps) + _edge(e, n, w, n, steps) + _edge(w, n, w, s, steps)
+            return {"attributes": attributes, "geometry": {"rings": [ring + [ring[0]]]}}
+
+        x, y = rng.uniform(WEST + 1, EAST - 1), rng.uniform(SOUTH + 1, NORTH - 1)
+        if self.geometry_type == "esriGeometryPoint":
+            geometry = {"x": round(x, 7), "y": round(y, 7)}
+        elif self.geometry_type == "esriGeometryPolyline":
+            path = []
+            for _ in range(self.vertices):
+                path.append([round(x, 7), round(y, 7)])
+                x += rng.uniform(-0.001, 0.003)
+                y += rng.uniform(-0.002, 0.002)
+            geometry = {"paths": [path]}
+        else:
+            radius = rng.uniform(0.005, 0.05)
+            ring = []
+            for i in range(self.vertices):
+                angle = 2 * math.pi * i / self.vertices
+                r = radius * rng.uniform(0.6, 1.0)
+                ring.append([round(x + r * math.cos(angle), 7), round(y + r * math.sin(angle), 7)])
+            geometry = {"rings": [ring + [ring[0]]]}
+        return {"attributes": attributes, "geometry": geometry}
+
+
+def geojson_to_esri(geometry: Optional[Dict]) -> Tuple[Optional[str], Optional[Dict]]:
+    """(esri geometry type, esri geometry) for a recorded GeoJSON geometry"""
+    if not geometry:
+        return (None, None)
+    geom_type = geometry.get("type")
+    coords = geometry.get("coordinates", [])
+    if geom_type == "Point":
+        return ("esriGeometryPoint", {"x": coords[0], "y": coords[1]})
+    if geom_type == "MultiPoint":
+        return ("esriGeometryMultipoint", {"points": coords})
+    if geom_type == "LineString":
+        return ("esriGeometryPolyline", {"paths": [coords]})
+    if geom_type == "MultiLineString":
+        return ("esriGeometryPolyline", {"paths": coords})
+    if geom_type == "Polygon":
+        return ("esriGeometryPolygon", {"rings": coords})
+    if geom_type == "MultiPolygon":
+        return ("esriGeometryPolygon", {"rings": [ring for poly in coords for ring in poly]})
+    return (None, None)
+
+
+class RecordedLayer:
+    """Features of a downloaded GeoJSON file served back as ESRI JSON"""
+
+    def __init__(self, path: str):
+        with open(path) as f:
+            features = json.load(f).get("features", [])
+
+        self.geometry_type = "esriGeometryPoint"
+        self.features: Dict[int, Dict[str, Any]] = {}
+        for i, feature in enumerate(features):
+            geom_type, geometry = geojson_to_esri(feature.get("geometry"))
+            if geom_type:
+                self.geometry_type = geom_type
+            attributes = dict(feature.get("properties") or {})
+            attributes.setdefault("OBJECTID", i + 1)
+            self.features[attributes["OBJECTID"]] = {"attributes": attributes, "geometry": geometry}
+        self.object_ids = sorted(self.features)
+
+    def feature(self, object_id: int) -> Dict[str, Any]:
+        return self.features[object_id]
+
+
+class MapServerHandler(BaseHTTPRequestHandler):
+    """ArcGIS REST query endpoint"""
+
+    protocol_version = "HTTP/1.1"
+    server: "FakeMapServer"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status: int, payload: Any):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        server = self.server
+
+        number = server.count_request()
+        delay = server.latency + (server.rng_uniform(0, server.jitter) if server.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+        error = server.pick_error(number)
+        if error == "http":
+            self.send_json(500, {"error": "Injected failure"})
+            return
+        if error == "json":
+            # ArcGIS reports most errors with a 200 status
+            self.send_json(200, {"error": {"code": 500, "message": "Injected failure", "details": []}})
+            return
+
+        match = QUERY_RE.match(url.path)
+        layer = server.layer(match.group(1), int(match.group(2))) if match else None
+        if layer is None:
+            self.send_json(200, {"error": {"code": 400, "message": "Invalid URL", "details": []}})
+            return
+
+        self.send_json(200, self.query(layer, params))
+
+    def query(self, layer, params: Dict[str, str]) -> Dict[str, Any]:
+        if params.get("returnCountOnly") == "true":
+            return {"count": len(layer.object_ids)}
+        if params.get("returnIdsOnly") == "true":
+            return {"objectIdFieldName": "OBJECTID", "objectIds": list(layer.object_ids)}
+
+        max_records = self.server.max_record_count
+        if "objectIds" in params:
+            ids = [int(i) for i in params["objectIds"].split(",") if i.strip()]
+            known = set(layer.object_ids)
+            ids = [i for i in ids if i in known][:max_records]
+            exceeded = False
+        else:
+            offset = int(params.get("resultOffset", 0))
+            count = min(int(params.get("resultRecordCount", max_records)), max_records)
+            ids = list(layer.object_ids[offset:offset + count])
+            exceeded = offset + count < len(layer.object_ids)
+
+        features = [layer.feature(i) for i in ids]
+        if params.get("returnGeometry") == "false":
+            features = [{"attributes": f["attributes"]} for f in features]
+
+        response = {
+            "objectIdFieldName": "OBJECTID",
+            "geometryType": layer.geometry_type,
+            "spatialReference": {"wkid": 4326},
+            "features": features,
+        }
+        if exceeded:
+            response["exceededTransferLimit"] = True
+        return response
+
+
+class FakeMapServer(ThreadingHTTPServer):
+    """HTTP server holding the layer definitions and fault injection settings"""
+
+    daemon_threads = True
+
+    def __init__(self, address, features: int = DEFAULT_FEATURES, vertices: int = DEFAULT_VERTICES,
+                 max_record_count: int = MAX_RECORD_COUNT, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, error_mode: str = "json", recorded: Optional[str] = None,
+                 seed: int = 1, verbose: bool = False, error_every: int = 0):
+        super().__init__(address, MapServerHandler)
+        self.features = features
+        self.vertices = vertices
+        self.max_record_count = max_record_count
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_every = error_every
+        self.error_mode = error_mode
+        self.recorded = recorded
+        self.seed = seed
+        self.verbose = verbose
+
+        self.services = service_layers()
+        self.layers: Dict[Tuple[str, int], Any] = {}
+        self.lock = threading.Lock()
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def layer(self, path: str, layer: int):
+        """Layer for a MapServer path, created on first use"""
+        service_id = self.services.get((path, layer))
+        if service_id is None:
+            return None
+        with self.lock:
+            if (path, layer) not in self.layers:
+                recorded = self.recorded and os.path.join(self.recorded, f"{service_id}_layer{layer}.geojson")
+                if recorded and os.path.exists(recorded):
+                    self.layers[(path, layer)] = RecordedLayer(recorded)
+                else:
+                    self.layers[(path, layer)] = SyntheticLayer(
+                        service_id, layer, self.features, self.vertices, self.seed
+                    )
+            return self.layers[(path, layer)]
+
+    def layer_counts(self) -> Dict[str, int]:
+        """Features served per layer, keyed like the downloaded files ("<service>_layer<n>")"""
+        return {f"{service_id}_layer{layer}": len(self.layer(path, layer).object_ids)
+                for (path, layer), service_id in self.services.items()}
+
+    def count_request(self) -> int:
+        """Count a request, returns its 1-based number"""
+        with self.lock:
+            self.requests += 1
+            return self.requests
+
+    def rng_uniform(self, a: float, b: float) -> float:
+        with self.lock:
+            return self.rng.uniform(a, b)
+
+    def pick_error(self, number: int = 0) -> Optional[str]:
+        """Decide whether to fail request `number` and how
+
+        With error_every set, exactly every Nth request fails and mixed mode
+        alternates json and http; otherwise failures are drawn from the RNG.
+        """
+        with self.lock:
+            if self.error_every:
+                if number % self.error_every:
+                    return None
+                self.errors += 1
+                if self.error_mode == "mixed":
+                    return "json" if self.errors % 2 else "http"
+                return self.error_mode
+            if not self.error_rate or self.rng.random() >= self.error_rate:
+                return None
+            self.errors += 1
+            if self.error_mode == "mixed":
+                return self.rng.choice(["http", "json"])
+            return self.error_mode
+
+    def start_background(self) -> threading.Thread:
+        """Serve from a daemon thread, e.g. inside a benchmark"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+def main():
+    options: Dict[str, Any] = {}
+    port = DEFAULT_PORT
+
+    args = sys.argv[1:]
+    for i, arg in enumerate(args):
+        if arg == "--port":
+            port = int(args[i + 1])
+        elif arg == "--features":
+            options["features"] = int(args[i + 1])
+        elif arg == "--vertices":
+            options["vertices"] = int(args[i + 1])
+        elif arg == "--max-record-count":
+            options["max_record_count"] = int(args[i + 1])
+        elif arg == "--latency":
+            options["latency"] = float(args[i + 1])
+        elif arg == "--jitter":
+            options["jitter"] = float(args[i + 1])
+        elif arg == "--error-rate":
+            options["error_rate"] = float(args[i + 1])
+        elif arg == "--error-every":
+            options["error_every"] = int(args[i + 1])
+        elif arg == "--error-mode":
+            options["error_mode"] = args[i + 1]
+        elif arg == "--recorded":
+            options["recorded"] = args[i + 1]
+        elif arg == "--seed":
+            options["seed"] = int(args[i + 1])
+
+    server = FakeMapServer(("127.0.0.1", port), verbose="--verbose" in args, **options)
+    print(f"Fake MapServer on {server.base_url}/ ({len(server.services)} layers)")
+    print(f"Run: python3 download-ide-data.py --base-url {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nShutting down after {server.requests} requests ({server.errors} injected errors)")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
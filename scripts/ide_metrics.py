@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Per-stage instrumentation for the IDE Chile data scripts
+
+download-ide-data.py and upload-to-turso.py wrap their stages (fetch, decode,
+convert, write, parse, insert, index, upload) in RunReport.stage() and write
+a machine-readable JSON report next to download-summary.json. Each stage
+records wall time, bytes, features per second and peak traced memory.
+
+Usage:
+    python3 ide_metrics.py old-report.json new-report.json   # compare runs
+"""
+
+import cProfile
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional
+
+
+class StageStats:
+    """Accumulated measurements for one named stage"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.bytes = 0
+        self.features = 0
+        self.peak_memory = 0
+        self.lock = threading.Lock()
+
+    def add(self, bytes: int = 0, features: int = 0):
+        with self.lock:
+            self.bytes += bytes
+            self.features += features
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "seconds": round(self.seconds, 4),
+            "bytes": self.bytes,
+            "features": self.features,
+            "features_per_second": round(self.features / self.seconds, 1) if self.seconds else None,
+            "mb_per_second": round(self.bytes / self.seconds / 1e6, 3) if self.seconds else None,
+            "peak_memory_mb": round(self.peak_memory / (1024 * 1024), 2),
+        }
+
+
+class RunReport:
+    """Collects stage timings for a script run and writes them as JSON
+
+    With concurrent=True stages may overlap across threads; peak memory is
+    then only reported for the whole run, since tracemalloc has one peak.
+    """
+
+    def __init__(self, name: str, trace_memory: bool = True, concurrent: bool = False):
+        self.name = name
+        self.trace_memory = trace_memory
+        self.concurrent = concurrent
+        self.lock = threading.Lock()
+        self.stages: Dict[str, StageStats] = {}
+        self.started = time.time()
+        self.start_clock = time.perf_counter()
+        self.profiler: Optional[cProfile.Profile] = None
+        self.extra: Dict[str, Any] = {}
+
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageStats]:
+        """Time a block and attribute its peak memory to the named stage"""
+        with self.lock:
+            stats = self.stages.setdefault(name, StageStats(name))
+        per_stage_memory = self.trace_memory and not self.concurrent
+        if per_stage_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                stats.seconds += elapsed
+                stats.calls += 1
+                if per_stage_memory:
+                    peak = tracemalloc.get_traced_memory()[1] - base
+                    stats.peak_memory = max(stats.peak_memory, peak)
+
+    def start_profile(self):
+        """Start cProfile for the rest of the run"""
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def to_dict(self) -> Dict[str, Any]:
+        report = {
+            "script": self.name,
+            "startedAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.started)),
+            "totalSeconds": round(time.perf_counter() - self.start_clock, 4),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "traceMemory": self.trace_memory,
+            "stages": {name: s.to_dict() for name, s in self.stages.items()},
+            **self.extra,
+        }
+        if self.trace_memory and self.concurrent and tracemalloc.is_tracing():
+            report["peakMemoryMb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+        return report
+
+    def write(self, output_dir: str) -> str:
+        """Write <name>-report.json, keeping the previous run as .prev.json"""
+        path = os.path.join(output_dir, f"{self.name}-report.json")
+        if os.path.exists(path):
+            os.replace(path, path.replace(".json", ".prev.json"))
+
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+        if self.profiler:
+            self.profiler.disable()
+            self.profiler.dump_stats(os.path.join(output_dir, f"{self.name}.prof"))
+
+        return path
+
+    def print_summary(self):
+        print(f"\n{'Stage':<12} {'Seconds':>9} {'MB':>9} {'Features':>10} {'Feat/s':>10} {'Peak MB':>9}")
+        print("-" * 64)
+        for name, s in self.stages.items():
+            d = s.to_dict()
+            print(f"{name:<12} {d['seconds']:>9.2f} {s.bytes / 1e6:>9.2f} {s.features:>10} "
+                  f"{d['features_per_second'] or 0:>10.0f} {d['peak_memory_mb']:>9.2f}")
+
+
+def report_from_args(name: str, argv=None, concurrent: bool = False) -> RunReport:
+    """Build a RunReport honouring --no-trace-memory and --profile"""
+    argv = sys.argv if argv is None else argv
+    report = RunReport(name, trace_memory="--no-trace-memory" not in argv, concurrent=concurrent)
+    if "--profile" in argv:
+        report.start_profile()
+    return report
+
+
+def compare_reports(old: Dict[str, Any], new: Dict[str, Any]):
+    """Print per-stage deltas between two reports"""
+    print(f"{'Stage':<12} {'Old s':>9} {'New s':>9} {'Change':>9} {'Old feat/s':>11} {'New feat/s':>11}")
+    print("-" * 66)
+    for name in list(old["stages"]) + [n for n in new["stages"] if n not in old["stages"]]:
+        a = old["stages"].get(name, {})
+        b = new["stages"].get(name, {})
+        a_s, b_s = a.get("seconds"), b.get("seconds")
+        change = f"{(b_s - a_s) / a_s * 100:+.1f}%" if a_s and b_s is not None else "n/a"
+        print(f"{name:<12} {a_s if a_s is not None else '-':>9} {b_s if b_s is not None else '-':>9} "
+              f"{change:>9} {a.get('features_per_second') or '-':>11} {b.get('features_per_second') or '-':>11}")
+    print(f"\n{'Total':<12} {old['totalSeconds']:>9} {new['totalSeconds']:>9}")
+
+
+def main():
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+
+    with open(sys.argv[1]) as f:
+        old = json.load(f)
+    with open(sys.argv[2]) as f:
+        new = json.load(f)
+    compare_reports(old, new)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+GeoParquet export of the IDE Chile dataset
+
+Writes each layer of the local database as a columnar GeoParquet 1.1 file:
+typed attribute columns, WKB geometry, a bbox covering column whose
+row-group statistics let readers skip row groups outside a query window,
+and zstd compression. Rows keep the Hilbert order of the features table,
+so each row group covers a compact area. Positions that are missing or not
+finite are left out; a Point without a valid position is written as WKB
+POINT EMPTY (NaN coordinates).
+
+Requires pyarrow (pip install pyarrow).
+
+Usage:
+    python3 ide_parquet.py [--db path/to.db] [--out data/ide-chile/parquet]
+"""
+
+import json
+import math
+import os
+import sqlite3
+import struct
+import sys
+from typing import Dict, List, Any, Optional, Tuple
+
+from ide_geometry import get_bounds, valid_position
+
+DEFAULT_DB = "data/ide-chile/ide-chile-data.db"
+DEFAULT_OUTPUT_DIR = "data/ide-chile/parquet"
+
+ROW_GROUP_SIZE = 10000
+COMPRESSION = "zstd"
+
+WKB_TYPES = {
+    "Point": 1,
+    "LineString": 2,
+    "Polygon": 3,
+    "MultiPoint": 4,
+    "MultiLineString": 5,
+    "MultiPolygon": 6,
+}
+
+# Columns written for every layer; attributes with these names get a suffix
+RESERVED_COLUMNS = {"id", "geometry", "bbox", "region_code", "province_code", "comuna_code"}
+
+
+def require_pyarrow():
+    """Import pyarrow or exit with install instructions"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError:
+        print("❌ Error: pyarrow is required for GeoParquet export")
+        print("Install it with: pip install pyarrow")
+        sys.exit(1)
+
+
+def _wkb_points(coords: List[List[float]]) -> bytes:
+    coords = [c for c in coords if valid_position(c)]
+    return struct.pack("<I", len(coords)) + b"".join(struct.pack("<2d", c[0], c[1]) for c in coords)
+
+
+def _wkb_rings(rings: List[List[List[float]]]) -> bytes:
+    return struct.pack("<I", len(rings)) + b"".join(_wkb_points(r) for r in rings)
+
+
+def to_wkb(geometry: Optional[Dict]) -> Optional[bytes]:
+    """Encode a 2D GeoJSON geometry as little-endian WKB"""
+    if not geometry or geometry.get("type") not in WKB_TYPES:
+        return None
+
+    geom_type = geometry["type"]
+    coords = geometry.get("coordinates") or []
+    header = struct.pack("<BI", 1, WKB_TYPES[geom_type])
+
+    if geom_type == "Point":
+        if not valid_position(coords):
+            return header + struct.pack("<2d", math.nan, math.nan)
+        return header + struct.pack("<2d", coords[0], coords[1])
+    if geom_type == "LineString":
+        return header + _wkb_points(coords)
+    if geom_type == "Polygon":
+        return header + _wkb_rings(coords)
+
+    # Multi geometries are a count followed by complete WKB children
+    child_type = geom_type[len("Multi"):]
+    return header + struct.pack("<I", len(coords)) + b"".join(
+        to_wkb({"type": child_type, "coordinates": c}) for c in coords
+    )
+
+
+def infer_column_type(values: List[Any]) -> str:
+    """Pick int64/float64/bool/string for one attribute across a layer"""
+    kinds = {type(v) for v in values if v is not None}
+    if not kinds:
+        return "string"
+    if kinds == {bool}:
+        return "bool"
+    if kinds == {int}:
+        return "int64"
+    if kinds <= {int, float}:
+        return "float64"
+    return "string"
+
+
+def _coerce(value: Any, column_type: str) -> Any:
+    if value is None:
+        return None
+    if column_type == "string" and not isinstance(value, str):
+        return json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+    if column_type == "float64":
+        return float(value)
+    return value
+
+
+def layer_table(pa, rows: List[Tuple]) -> Tuple[Any, Dict[str, Any]]:
+    """Build an Arrow table and GeoParquet column metadata for one layer"""
+    ids, wkbs, boxes, regions, provinces, comunas, props = [], [], [], [], [], [], []
+    geometry_types = set()
+
+    for fid, geometry_text, properties_text, region, province, comuna in rows:
+        geometry = json.loads(geometry_text) if geometry_text else None
+        ids.append(fid)
+        wkbs.append(to_wkb(geometry))
+        west, south, east, north = get_bounds(geometry)
+        boxes.append(None if west is None else {"xmin": west, "ymin": south, "xmax": east, "ymax": north})
+        regions.append(region)
+        provinces.append(province)
+        comunas.append(comuna)
+        props.append(json.loads(properties_text or "{}"))
+        if geometry:
+            geometry_types.add(geometry.get("type"))
+
+    keys: List[str] = []
+    for p in props:
+        for k in p:
+            if k not in keys:
+                keys.append(k)
+
+    arrow_types = {"int64": pa.int64(), "float64": pa.float64(), "bool": pa.bool_(), "string": pa.string()}
+    bbox_type = pa.struct([(k, pa.float64()) for k in ("xmin", "ymin", "xmax", "ymax")])
+
+    columns = {
+        "id": pa.array(ids, pa.int64()),
+        "region_code": pa.array(regions, pa.string()),
+        "province_code": pa.array(provinces, pa.string()),
+        "comuna_code": pa.array(comunas, pa.string()),
+    }
+    for key in keys:
+        values = [p.get(key) for p in props]
+        column_type = infer_column_type(values)
+        name = f"{key}_attr" if key in RESERVED_COLUMNS else key
+        columns[name] = pa.array([_coerce(v, column_type) for v in values], arrow_types[column_type])
+    columns["bbox"] = pa.array(boxes, bbox_type)
+    columns["geometry"] = pa.array(wkbs, pa.binary())
+
+    valid = [b for b in boxes if b]
+    extent = [
+        min(b["xmin"] for b in valid), min(b["ymin"] for b in valid),
+        max(b["xmax"] for b in valid), max(b["ymax"] for b in valid),
+    ] if valid else None
+
+    geo_column = {
+        "encoding": "WKB",
+        "geometry_types": sorted(geometry_types),
+        "covering": {"bbox": {k: ["bbox", k] for k in ("xmin", "ymin", "xmax", "ymax")}},
+    }
+    if extent:
+        geo_column["bbox"] = extent
+
+    return pa.table(columns), geo_column
+
+
+def export_geoparquet(conn: sqlite3.Connection, output_dir: str = DEFAULT_OUTPUT_DIR,
+                      row_group_size: int = ROW_GROUP_SIZE) -> Dict[str, int]:
+    """Write one GeoParquet file per layer, returns bytes written per layer"""
+    pa = require_pyarrow()
+    import pyarrow.parquet as pq
+
+    os.makedirs(output_dir, exist_ok=True)
+    written = {}
+
+    layers = [r[0] for r in conn.execute("SELECT id FROM layers ORDER BY id")]
+    for layer_id in layers:
+        rows = conn.execute("""
+            SELECT f.id, g.geometry, f.properties, f.region_code, f.province_code, f.comuna_code
+            FROM features f LEFT JOIN geometries g ON g.id = f.geometry_id
+            WHERE f.layer_id = ? ORDER BY f.id
+        """, (layer_id,)).fetchall()
+        if not rows:
+            continue
+
+        table, geo_column = layer_table(pa, rows)
+        geo = {"version": "1.1.0", "primary_column": "geometry", "columns": {"geometry": geo_column}}
+        table = table.replace_schema_metadata({b"geo": json.dumps(geo).encode()})
+
+        path = os.path.join(output_dir, f"{layer_id}.parquet")
+        pq.write_table(table, path, compression=COMPRESSION,
+                       row_group_size=row_group_size, write_statistics=True)
+        written[layer_id] = os.path.getsize(path)
+
+    return written
+
+
+def read_layer(path: str, columns: Optional[List[str]] = None,
+               bbox: Optional[Tuple[float, float, float, float]] = None):
+    """Read selected columns of a layer, skipping row groups outside bbox"""
+    require_pyarrow()
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(path, format="parquet")
+    expr = None
+    if bbox:
+        west, south, east, north = bbox
+        expr = ((ds.field("bbox", "xmax") >= west) & (ds.field("bbox", "xmin") <= east)
+                & (ds.field("bbox", "ymax") >= south) & (ds.field("bbox", "ymin") <= north))
+    return dataset.to_table(columns=columns, filter=expr)
+
+
+def main():
+    db_path = DEFAULT_DB
+    output_dir = DEFAULT_OUTPUT_DIR
+
+    args = sys.argv[1:]
+    for i, arg in enumerate(args):
+        if arg == "--db":
+            db_path = args[i + 1]
+        elif arg == "--out":
+            output_dir = args[i + 1]
+
+    conn = sqlite3.connect(db_path)
+    written = export_geoparquet(conn, output_dir)
+    conn.close()
+
+    print(f"{'Layer':<35} {'Size':>12}")
+    print("-" * 48)
+    for layer_id, size in written.items():
+        print(f"{layer_id[:35]:<35} {size / 1024:>10.1f}KB")
+    print(f"\nGeoParquet files saved to: {output_dir}/")
+
+
+if __name__ == "__main__":
+    main()
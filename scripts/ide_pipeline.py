@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Streaming download-to-database pipeline for IDE Chile data
+
+Single-pass alternative to running download-ide-data.py then
+upload-to-turso.py. Fetched pages flow through ESRI-to-GeoJSON conversion
+straight into batched DB inserts, with bounded queues between the stages so
+network, CPU and disk work overlap:
+
+    fetch workers (N threads) -> pages queue -> converter -> features queue -> writer
+
+Pages are inserted as they arrive with --no-cluster. By default each layer is
+buffered until its last page so it can be Hilbert-sorted like the two-step
+build, which bounds memory by the largest layer instead of the dataset.
+GeoJSON files are an optional side output (--write-geojson).
+
+A layer whose fetch or conversion fails is reported and left out, like the
+two-step download skips it, while the other layers carry on. The database is
+built next to the last good one and only replaces it once finalized.
+
+Usage:
+    python3 ide_pipeline.py [--fetch-workers 4] [--queue-size 8] [--write-geojson]
+                            [--no-cluster] [--skip-upload] [--export-parquet]
+                            [--base-url http://127.0.0.1:8788] [--delay 0.5] [--id-paging]
+"""
+
+import importlib.util
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Dict, List, Any, Optional, Set, TextIO, Tuple
+
+from ide_metrics import report_from_args
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_FETCH_WORKERS = 4
+DEFAULT_QUEUE_SIZE = 8
+
+# Marks the last page of a layer in both queues
+END_OF_LAYER = None
+
+# Exceptions raised on a worker thread travel down the queues in place of a
+# page, so the writer can drop that layer instead of waiting forever
+
+
+def load_script(filename: str):
+    """Import one of the hyphenated sibling scripts as a module"""
+    path = os.path.join(SCRIPTS_DIR, filename)
+    spec = importlib.util.spec_from_file_location(filename[:-3].replace("-", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+download = load_script("download-ide-data.py")
+upload = load_script("upload-to-turso.py")
+
+MOP_BASE_URL = download.MOP_BASE_URL
+
+
+class GeoJSONSideWriter:
+    """Writes a layer's features to a .geojson file page by page"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file: Optional[TextIO] = None
+        self.count = 0
+
+    def write(self, features: List[Dict]):
+        if self.file is None:
+            self.file = open(self.path, "w")
+            self.file.write('{"type": "FeatureCollection", "features": [')
+        for feature in features:
+            self.file.write((", " if self.count else "") + json.dumps(feature))
+            self.count += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.write("]}")
+            self.file.close()
+
+
+def fetch_worker(tasks: "queue.Queue", pages: "queue.Queue", base_url: str, delay: float):
+    """Page through layers from the task queue, one END_OF_LAYER per layer"""
+    while True:
+        try:
+            service, layer = tasks.get_nowait()
+        except queue.Empty:
+            return
+
+        layer_key = f"{service['id']}_layer{layer}"
+        url = service["url"].replace(MOP_BASE_URL, base_url)
+        try:
+            for page in download.iter_layer_pages(url, layer, delay=delay):
+                pages.put((layer_key, page))
+        except Exception as e:
+            pages.put((layer_key, e))
+        finally:
+            pages.put((layer_key, END_OF_LAYER))
+
+
+def convert_worker(pages: "queue.Queue", features: "queue.Queue", layer_count: int, report):
+    """Convert ESRI pages to GeoJSON features, preserving per-layer order
+
+    Failures (its own or a fetch worker's) are forwarded to the writer in
+    place of the page.
+    """
+    finished = 0
+    while finished < layer_count:
+        layer_key, page = pages.get()
+        if page is END_OF_LAYER:
+            finished += 1
+            features.put((layer_key, END_OF_LAYER))
+            continue
+        if isinstance(page, Exception):
+            features.put((layer_key, page))
+            continue
+
+        try:
+            with report.stage("convert") as stage:
+                converted = download.esri_to_geojson(page)["features"]
+                stage.add(features=len(converted))
+        except Exception as e:
+            features.put((layer_key, e))
+            continue
+        features.put((layer_key, converted))
+
+
+def delete_layer_rows(conn, layer_key: str):
+    """Remove what was already inserted for a failed layer"""
+    conn.execute("""
+        DELETE FROM features_rtree WHERE id IN (SELECT id FROM features WHERE layer_id = ?)
+    """, (layer_key,))
+    conn.execute("DELETE FROM features WHERE layer_id = ?", (layer_key,))
+    conn.execute("""
+        DELETE FROM geometries WHERE id NOT IN
+            (SELECT geometry_id FROM features WHERE geometry_id IS NOT NULL)
+    """)
+    conn.commit()
+
+
+def insert_layer_row(conn, layer_key: str) -> int:
+    """Insert layer metadata from what was written for it, returns its count"""
+    count, west, south, east, north = conn.execute("""
+        SELECT COUNT(*), MIN(centroid_lon), MIN(centroid_lat), MAX(centroid_lon), MAX(centroid_lat)
+        FROM features WHERE layer_id = ?
+    """, (layer_key,)).fetchone()
+    if not count:
+        return 0
+
+    geom_type = conn.execute("""
+        SELECT geometry_type FROM features
+        WHERE layer_id = ? AND geometry_type IS NOT NULL ORDER BY id LIMIT 1
+    """, (layer_key,)).fetchone()
+
+    conn.execute("""
+        INSERT INTO layers (id, name, source_file, geometry_type, feature_count,
+                            bbox_west, bbox_south, bbox_east, bbox_north)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (layer_key, layer_key.replace("_", " ").replace("-", " ").title(),
+          f"{layer_key}.geojson", geom_type[0] if geom_type else None, count,
+          west, south, east, north))
+    conn.commit()
+    return count
+
+
+def run_pipeline(report, fetch_workers: int = DEFAULT_FETCH_WORKERS,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, cluster: bool = True,
+                 write_geojson: bool = False, base_url: str = MOP_BASE_URL,
+                 delay: float = 0.5) -> Dict[str, int]:
+    """Download every service layer straight into a fresh local database
+
+    Returns feature counts per loaded layer; failed layers are listed in
+    report.extra["failedLayers"].
+    """
+    download.REPORT = report
+    upload.REPORT = report
+
+    os.makedirs(upload.DATA_DIR, exist_ok=True)
+    conn = upload.create_local_db()
+
+    tasks: "queue.Queue" = queue.Queue()
+    for service in download.SERVICES:
+        for layer in service.get("layers", [0]):
+            tasks.put((service, layer))
+    layer_count = tasks.qsize()
+
+    pages: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    features: "queue.Queue" = queue.Queue(maxsize=queue_size)
+
+    threads = [
+        threading.Thread(target=fetch_worker, args=(tasks, pages, base_url, delay), daemon=True)
+        for _ in range(fetch_workers)
+    ]
+    threads.append(threading.Thread(
+        target=convert_worker, args=(pages, features, layer_count, report), daemon=True
+    ))
+    for t in threads:
+        t.start()
+
+    buffers: Dict[str, List[Dict]] = {}
+    side_outputs: Dict[str, GeoJSONSideWriter] = {}
+    seen: Dict[str, Set[Tuple[int, str]]] = {}
+    counts: Dict[str, int] = {}
+    failed: Dict[str, str] = {}
+    finished = 0
+
+    # The writer runs on this thread: SQLite wants a single writer anyway
+    while finished < layer_count:
+        layer_key, batch = features.get()
+        if isinstance(batch, Exception):
+            failed.setdefault(layer_key, f"{type(batch).__name__}: {batch}")
+            continue
+
+        if batch is not END_OF_LAYER:
+            if layer_key in failed:
+                continue
+            if write_geojson:
+                path = os.path.join(upload.DATA_DIR, f"{layer_key}.geojson")
+                side = side_outputs.setdefault(layer_key, GeoJSONSideWriter(path))
+                with report.stage("write") as stage:
+                    side.write(batch)
+                    stage.add(features=len(batch))
+
+            if cluster:
+                buffers.setdefault(layer_key, []).extend(batch)
+            else:
+                with report.stage("insert") as stage:
+                    upload.insert_features(conn, layer_key, batch, cluster=False,
+                                           seen=seen.setdefault(layer_key, set()))
+                    stage.add(features=len(batch))
+            continue
+
+        finished += 1
+        side = side_outputs.pop(layer_key, None)
+        if side:
+            side.close()
+
+        buffered = buffers.pop(layer_key, [])
+        seen.pop(layer_key, None)
+        if layer_key in failed:
+            delete_layer_rows(conn, layer_key)
+            if side:
+                os.remove(side.path)
+            print(f"  Error: {layer_key} skipped ({failed[layer_key]})")
+            continue
+
+        if buffered:
+            with report.stage("insert") as stage:
+                upload.insert_features(conn, layer_key, buffered, cluster=True)
+                stage.add(features=len(buffered))
+
+        count = insert_layer_row(conn, layer_key)
+        if count:
+            counts[layer_key] = count
+            print(f"  Loaded {count} features: {layer_key}")
+        else:
+            print(f"  No features: {layer_key}")
+
+    for t in threads:
+        t.join()
+
+    if failed:
+        report.extra["failedLayers"] = failed
+        print(f"\n{len(failed)} layers failed: {', '.join(sorted(failed))}")
+
+    total = sum(counts.values())
+    upload.finalize_db(conn, total)
+    upload.get_db_stats(conn)
+    upload.commit_local_db(conn)
+    return counts
+
+
+def two_step_seconds(data_dir: str) -> Optional[Dict[str, float]]:
+    """Seconds of the last download + upload run reports, if both exist
+
+    The Turso upload stage is left out so both sides measure download + build.
+    """
+    totals = {}
+    for name in ("download", "upload"):
+        path = os.path.join(data_dir, f"{name}-report.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            run = json.load(f)
+        totals[name] = run["totalSeconds"] - run["stages"].get("upload", {}).get("seconds", 0)
+    return totals
+
+
+def main():
+    fetch_workers = DEFAULT_FETCH_WORKERS
+    queue_size = DEFAULT_QUEUE_SIZE
+    base_url = MOP_BASE_URL
+    delay = 0.5
+
+    args = sys.argv[1:]
+    for i, arg in enumerate(args):
+        if arg == "--fetch-workers":
+            fetch_workers = int(args[i + 1])
+        elif arg == "--queue-size":
+            queue_size = int(args[i + 1])
+        elif arg == "--base-url":
+            base_url = args[i + 1].rstrip("/")
+        elif arg == "--delay":
+            delay = float(args[i + 1])
+
+    download.ID_PAGING = "--id-paging" in args
+
+    print("=" * 60)
+    print("IDE Chile Data - Streaming Pipeline")
+    print("=" * 60)
+    print(f"Fetch workers: {fetch_workers}  Queue size: {queue_size}")
+
+    report = report_from_args("pipeline", concurrent=True)
+    start = time.perf_counter()
+    counts = run_pipeline(report, fetch_workers, queue_size,
+                          cluster="--no-cluster" not in args,
+                          write_geojson="--write-geojson" in args,
+                          base_url=base_url, delay=delay)
+    elapsed = time.perf_counter() - start
+
+    if "--skip-upload" not in args:
+        with report.stage("upload") as stage:
+            upload.upload_to_turso()
+            stage.add(bytes=os.path.getsize(upload.LOCAL_DB))
+    else:
+        print("\nSkipping Turso upload (--skip-upload flag)")
+
+    report.extra["totalFeatures"] = sum(counts.values())
+    report.extra["layers"] = counts
+    report.extra["dbBytes"] = os.path.getsize(upload.LOCAL_DB)
+
+    # End-to-end comparison against the last two-step run
+    two_step = two_step_seconds(upload.DATA_DIR)
+    if two_step:
+        report.extra["twoStepSeconds"] = two_step
+        total = sum(two_step.values())
+        print(f"\nTwo-step flow (last reports): download {two_step['download']:.1f}s"
+              f" + upload {two_step['upload']:.1f}s = {total:.1f}s")
+        print(f"Pipeline (download + build): {elapsed:.1f}s ({total / elapsed:.2f}x)")
+
+    report.print_summary()
+    report_path = report.write(upload.DATA_DIR)
+    print(f"\nRun report saved to: {report_path}")
+    print(f"Local database saved to: {upload.LOCAL_DB}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Query library over the local IDE Chile database built by upload-to-turso.py
+
+Supports bbox, layer, admin-area and attribute queries with keyset pagination, and
+streams results as GeoJSON without re-parsing the stored geometry text.
+
+Usage:
+    python3 ide_query.py --bbox -73.2,-37.0,-72.9,-36.7 --layer canales-cnr_layer0
+    python3 ide_query.py --search "rio" --limit 20
+"""
+
+import json
+import math
+import sqlite3
+import sys
+from typing import Dict, List, Any, Iterator, Optional, Tuple
+
+from ide_search import to_match_query
+
+DEFAULT_DB = "data/ide-chile/ide-chile-data.db"
+
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 10000
+
+Bbox = Tuple[float, float, float, float]
+
+
+def open_db(db_path: str = DEFAULT_DB) -> sqlite3.Connection:
+    """Open the database read-only"""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+    return conn
+
+
+def has_table(conn: sqlite3.Connection, name: str) -> bool:
+    """Check whether a table or virtual table exists"""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = ? AND type = 'table'", (name,)
+    ).fetchone()
+    return row is not None
+
+
+def parse_bbox(value: str) -> Bbox:
+    """Parse 'west,south,east,north' into a bbox tuple"""
+    parts = [float(v) for v in value.split(",")]
+    if len(parts) != 4:
+        raise ValueError(f"bbox needs 4 numbers, got {len(parts)}")
+    west, south, east, north = parts
+    if west > east or south > north:
+        raise ValueError("bbox must be west,south,east,north")
+    return (west, south, east, north)
+
+
+def tile_to_bbox(z: int, x: int, y: int) -> Bbox:
+    """Convert a web mercator tile address to a lon/lat bbox"""
+    n = 2 ** z
+
+    def lat(ty: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n))))
+
+    return (x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y))
+
+
+def lonlat_to_tile(lon: float, lat: float, z: int) -> Tuple[int, int]:
+    """Web mercator tile containing a lon/lat point at zoom z"""
+    n = 2 ** z
+    lat = max(min(lat, 85.0511), -85.0511)
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return (min(max(x, 0), n - 1), min(max(y, 0), n - 1))
+
+
+def clamp_limit(limit: int) -> int:
+    """Page size within 1..MAX_LIMIT"""
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def attribute_values(value: Any) -> List[Any]:
+    """Values an attribute filter matches: query strings arrive as text, so
+    numeric ones also match the number SQLite's json_extract returns"""
+    if isinstance(value, str):
+        for parse in (int, float):
+            try:
+                return [value, parse(value)]
+            except ValueError:
+                pass
+    return [value, value]
+
+
+def list_layers(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    """List loaded layers with their metadata"""
+    rows = conn.execute("""
+        SELECT id, name, geometry_type, feature_count, bbox_west, bbox_south, bbox_east, bbox_north
+        FROM layers ORDER BY id
+    """).fetchall()
+    return [
+        {
+            "id": r[0],
+            "name": r[1],
+            "geometry_type": r[2],
+            "feature_count": r[3],
+            "bbox": [r[4], r[5], r[6], r[7]],
+        }
+        for r in rows
+    ]
+
+
+def build_query(conn: sqlite3.Connection, bbox: Optional[Bbox] = None,
+                layers: Optional[List[str]] = None, text: Optional[str] = None,
+                attributes: Optional[Dict[str, Any]] = None, region: Optional[str] = None,
+                province: Optional[str] = None, comuna: Optional[str] = None,
+                after: int = 0, limit: int = DEFAULT_LIMIT) -> Tuple[str, List[Any]]:
+    """Build the SQL for a feature query, ordered by id for keyset pagination
+
+    Text without any searchable token matches nothing.
+    """
+    joins = []
+    where = ["f.id > ?"]
+    params: List[Any] = [after]
+
+    if bbox:
+        west, south, east, north = bbox
+        if has_table(conn, "features_rtree"):
+            joins.append("JOIN features_rtree r ON r.id = f.id")
+            where.append("r.max_lon >= ? AND r.min_lon <= ? AND r.max_lat >= ? AND r.min_lat <= ?")
+        else:
+            # Older builds without the R*Tree only have centroids
+            where.append("f.centroid_lon BETWEEN ? AND ? AND f.centroid_lat BETWEEN ? AND ?")
+        params.extend([west, east, south, north])
+
+    if text:
+        match = to_match_query(text)
+        if match:
+            joins.append("JOIN features_fts ON features_fts.rowid = f.id")
+            where.append("features_fts MATCH ?")
+            params.append(match)
+        else:
+            where.append("0")
+
+    if layers:
+        where.append(f"f.layer_id IN ({', '.join('?' for _ in layers)})")
+        params.extend(layers)
+
+    for column, code in (("region_code", region), ("province_code", province),
+                         ("comuna_code", comuna)):
+        if code:
+            where.append(f"f.{column} = ?")
+            params.append(code)
+
+    for key, value in (attributes or {}).items():
+        where.append("json_extract(f.properties, ?) IN (?, ?)")
+        params.extend([f'$."{key}"', *attribute_values(value)])
+
+    sql = (
+        "SELECT f.id, f.layer_id, g.geometry, f.properties FROM features f "
+        + " ".join(joins + ["LEFT JOIN geometries g ON g.id = f.geometry_id"])
+        + " WHERE " + " AND ".join(where)
+        + " ORDER BY f.id LIMIT ?"
+    )
+    params.append(clamp_limit(limit))
+    return sql, params
+
+
+def query_features(conn: sqlite3.Connection, **query) -> List[Dict[str, Any]]:
+    """Run a feature query and return parsed GeoJSON features"""
+    sql, params = build_query(conn, **query)
+    return [
+        {
+            "type": "Feature",
+            "id": row[0],
+            "layer": row[1],
+            "geometry": json.loads(row[2]) if row[2] else None,
+            "properties": json.loads(row[3] or "{}"),
+        }
+        for row in conn.execute(sql, params)
+    ]
+
+
+def stream_geojson(conn: sqlite3.Connection, page: Optional[Dict[str, Any]] = None,
+                   **query) -> Iterator[bytes]:
+    """Stream a query as a GeoJSON FeatureCollection, chunk by chunk
+
+    The stored geometry and properties text is spliced in as-is. The last
+    chunk carries the cursor for the next page in "next" (null when done),
+    which is also stored in `page` once the stream is consumed. The query is
+    built before the first chunk, so invalid queries raise here rather than
+    midway through a response.
+    """
+    limit = clamp_limit(query.get("limit", DEFAULT_LIMIT))
+    query["limit"] = limit
+    sql, params = build_query(conn, **query)
+    return _stream_rows(conn.execute(sql, params), limit, page if page is not None else {})
+
+
+def _stream_rows(rows, limit: int, page: Dict[str, Any]) -> Iterator[bytes]:
+    yield b'{"type":"FeatureCollection","features":['
+
+    count = 0
+    last_id = None
+    for row in rows:
+        feature_id, layer_id, geometry, properties = row
+        prefix = "," if count else ""
+        yield (
+            f'{prefix}{{"type":"Feature","id":{feature_id},"layer":{json.dumps(layer_id)},'
+            f'"geometry":{geometry or "null"},"properties":{properties or "{}"}}}'
+        ).encode()
+        count += 1
+        last_id = feature_id
+
+    next_cursor = last_id if count == limit else None
+    page.update(numberReturned=count, next=next_cursor)
+    yield f'],"numberReturned":{count},"next":{json.dumps(next_cursor)}}}'.encode()
+
+
+def main():
+    db_path = DEFAULT_DB
+    query: Dict[str, Any] = {}
+
+    args = sys.argv[1:]
+    for i, arg in enumerate(args):
+        if arg == "--db":
+            db_path = args[i + 1]
+        elif arg == "--bbox":
+            query["bbox"] = parse_bbox(args[i + 1])
+        elif arg == "--layer":
+            query["layers"] = args[i + 1].split(",")
+        elif arg == "--search":
+            query["text"] = args[i + 1]
+        elif arg in ("--region", "--province", "--comuna"):
+            query[arg[2:]] = args[i + 1]
+        elif arg == "--limit":
+            query["limit"] = int(args[i + 1])
+        elif arg == "--after":
+            query["after"] = int(args[i + 1])
+
+    conn = open_db(db_path)
+    for chunk in stream_geojson(conn, **query):
+        sys.stdout.buffer.write(chunk)
+    sys.stdout.buffer.write(b"\n")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
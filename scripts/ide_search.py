@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Full text search over IDE Chile features
+
+Builds a lean FTS5 index holding only the text-valued attributes of each
+feature plus its layer name. Diacritics are folded so "nuble" finds "Ñuble"
+and "rio" finds "Río", and prefix indexes keep type-ahead queries cheap.
+
+Usage:
+    python3 ide_search.py "rio bio"            # run a search
+    python3 ide_search.py --benchmark          # search-latency benchmark
+    python3 ide_search.py --rebuild            # rebuild the index in place
+    python3 ide_search.py --db path/to.db ...  # use another database
+"""
+
+import re
+import sqlite3
+import statistics
+import sys
+import time
+from typing import Dict, List, Any, Optional
+
+DEFAULT_DB = "data/ide-chile/ide-chile-data.db"
+
+# Contentless index: rowid is features.id, the text lives only in the index
+FTS_SCHEMA = """
+DROP TABLE IF EXISTS features_fts;
+
+CREATE VIRTUAL TABLE features_fts USING fts5(
+    layer_name,
+    attributes,
+    content='',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3 4'
+);
+"""
+
+# Bulk rebuild: only string attribute values, keys and numbers are left out
+FTS_POPULATE = """
+INSERT INTO features_fts(rowid, layer_name, attributes)
+SELECT f.id, l.name, COALESCE(group_concat(p.value, ' '), '')
+FROM features f
+JOIN layers l ON l.id = f.layer_id
+LEFT JOIN json_each(f.properties) p ON p.type = 'text' AND trim(p.value) != ''
+GROUP BY f.id
+"""
+
+BENCHMARK_QUERIES = ["rio", "nuble", "bio", "canal", "puente", "santiago", "agua potable", "estero la"]
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def build_fts_index(conn: sqlite3.Connection) -> int:
+    """(Re)build the features_fts index in one bulk pass, returns indexed rows"""
+    cursor = conn.cursor()
+    cursor.executescript(FTS_SCHEMA)
+    cursor.execute(FTS_POPULATE)
+    indexed = cursor.rowcount
+    cursor.execute("INSERT INTO features_fts(features_fts) VALUES('optimize')")
+    conn.commit()
+    return indexed
+
+
+def to_match_query(text: str, prefix: bool = True) -> Optional[str]:
+    """Turn free user input into a safe FTS5 MATCH expression"""
+    tokens = TOKEN_RE.findall(text)
+    if not tokens:
+        return None
+
+    terms = [f'"{t}"' for t in tokens]
+    if prefix:
+        # Type-ahead: the last token is still being typed
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search_features(conn: sqlite3.Connection, text: str, layer_id: Optional[str] = None,
+                    limit: int = 50, prefix: bool = True) -> List[Dict[str, Any]]:
+    """Search features by attribute text, best matches first"""
+    match = to_match_query(text, prefix)
+    if match is None:
+        return []
+
+    sql = """
+        SELECT f.id, f.layer_id, f.geometry_type, f.centroid_lon, f.centroid_lat, f.properties
+        FROM features_fts
+        JOIN features f ON f.id = features_fts.rowid
+        WHERE features_fts MATCH ?
+    """
+    params: List[Any] = [match]
+    if layer_id:
+        sql += " AND f.layer_id = ?"
+        params.append(layer_id)
+    sql += " ORDER BY bm25(features_fts) LIMIT ?"
+    params.append(limit)
+
+    return [
+        {
+            "id": row[0],
+            "layer_id": row[1],
+            "geometry_type": row[2],
+            "centroid": [row[3], row[4]],
+            "properties": row[5],
+        }
+        for row in conn.execute(sql, params)
+    ]
+
+
+def _time_query(fn, repeat: int) -> List[float]:
+    """Run fn repeat times and return latencies in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def benchmark_search(conn: sqlite3.Connection, queries: List[str] = BENCHMARK_QUERIES,
+                     repeat: int = 20, limit: int = 50) -> List[Dict[str, Any]]:
+    """Measure FTS search latency against a LIKE scan over raw properties"""
+    results = []
+
+    for query in queries:
+        tokens = TOKEN_RE.findall(query)
+        match = to_match_query(query)
+        if match is None:
+            continue
+
+        hits = conn.execute(
+            "SELECT COUNT(*) FROM features_fts WHERE features_fts MATCH ?", (match,)
+        ).fetchone()[0]
+        fts = _time_query(lambda: search_features(conn, query, limit=limit), repeat)
+
+        # The old approach: substring scan of the serialized JSON, accent-sensitive
+        like_sql = "SELECT COUNT(*) FROM features WHERE " + " AND ".join(
+            "properties LIKE ?" for _ in tokens
+        )
+        like_params = [f"%{t}%" for t in tokens]
+        scan_hits = conn.execute(like_sql, like_params).fetchone()[0]
+        scan = _time_query(lambda: conn.execute(like_sql, like_params).fetchone(), repeat)
+
+        results.append({
+            "query": query,
+            "hits": hits,
+            "scan_hits": scan_hits,
+            "fts_p50_ms": statistics.median(fts),
+            "fts_p95_ms": sorted(fts)[int(0.95 * (len(fts) - 1))],
+            "scan_p50_ms": statistics.median(scan),
+        })
+
+    return results
+
+
+def get_fts_size(conn: sqlite3.Connection) -> Optional[int]:
+    """Bytes used by the FTS shadow tables, if dbstat is available"""
+    try:
+        row = conn.execute(
+            "SELECT SUM(pgsize) FROM dbstat WHERE name LIKE 'features_fts%'"
+        ).fetchone()
+        return row[0]
+    except sqlite3.OperationalError:
+        return None
+
+
+def main():
+    db_path = DEFAULT_DB
+    if "--db" in sys.argv:
+        db_path = sys.argv[sys.argv.index("--db") + 1]
+
+    conn = sqlite3.connect(db_path)
+
+    if "--rebuild" in sys.argv:
+        count = build_fts_index(conn)
+        print(f"Indexed {count} features")
+
+    if "--benchmark" in sys.argv:
+        print("=" * 60)
+        print("FTS Search Latency Benchmark")
+        print("=" * 60)
+        size = get_fts_size(conn)
+        if size is not None:
+            print(f"Index size: {size / (1024 * 1024):.2f} MB")
+        print(f"\n{'Query':<16} {'Hits':>7} {'FTS p50':>10} {'FTS p95':>10} {'Scan hits':>10} {'Scan p50':>10}")
+        print("-" * 68)
+        for r in benchmark_search(conn):
+            print(f"{r['query'][:16]:<16} {r['hits']:>7} {r['fts_p50_ms']:>8.2f}ms "
+                  f"{r['fts_p95_ms']:>8.2f}ms {r['scan_hits']:>10} {r['scan_p50_ms']:>8.2f}ms")
+    else:
+        args = [a for a in sys.argv[1:] if not a.startswith("--") and a != db_path]
+        if args:
+            for hit in search_features(conn, " ".join(args)):
+                print(f"{hit['layer_id']:<35} {hit['id']:>8}  {hit['properties'][:80]}")
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Local feature server over the IDE Chile database
+
+Serves the local .db over HTTP so development and load tests don't have to
+round-trip to rest-sit.mop.gob.cl. Responses are streamed GeoJSON.
+
+Endpoints:
+    GET /layers                                  layer metadata
+    GET /features?bbox=w,s,e,n&layer=a,b&q=text  paginated features (?after=<next>)
+        &attr.NOMBRE=value&comuna=8101&limit=1000
+    GET /tiles/{z}/{x}/{y}.geojson?layer=a,b     one web mercator tile (LRU cached), at most
+                                                 MAX_LIMIT features; a full tile sends its
+                                                 cursor in X-Next-Cursor, pass it as ?after=
+    GET /stats                                   tile cache statistics
+
+Usage:
+    python3 ide_server.py [--db path/to.db] [--port 8787] [--cache-tiles 512]
+"""
+
+import json
+import re
+import sys
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+from ide_query import DEFAULT_DB, DEFAULT_LIMIT, MAX_LIMIT, clamp_limit, open_db, list_layers, \
+    parse_bbox, stream_geojson, tile_to_bbox
+
+DEFAULT_PORT = 8787
+DEFAULT_CACHE_TILES = 512
+
+TILE_RE = re.compile(r"^/tiles/(\d+)/(\d+)/(\d+)(?:\.geojson)?$")
+
+
+def int_param(params: Dict[str, list], name: str, default: int) -> int:
+    """Integer query parameter, ValueError (a 400) when it is not one"""
+    value = params.get(name, [default])[0]
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer, got {value!r}")
+
+
+class TileCache:
+    """Thread-safe LRU cache of rendered GeoJSON tiles, as (body, next cursor)"""
+
+    def __init__(self, max_tiles: int = DEFAULT_CACHE_TILES):
+        self.max_tiles = max_tiles
+        self.tiles: "OrderedDict[Tuple, Tuple[bytes, Optional[int]]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple) -> Optional[Tuple[bytes, Optional[int]]]:
+        with self.lock:
+            tile = self.tiles.get(key)
+            if tile is None:
+                self.misses += 1
+                return None
+            self.tiles.move_to_end(key)
+            self.hits += 1
+            return tile
+
+    def put(self, key: Tuple, tile: Tuple[bytes, Optional[int]]):
+        with self.lock:
+            self.tiles[key] = tile
+            self.tiles.move_to_end(key)
+            while len(self.tiles) > self.max_tiles:
+                self.tiles.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "tiles": len(self.tiles),
+                "max_tiles": self.max_tiles,
+                "bytes": sum(len(body) for body, _ in self.tiles.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class FeatureHandler(BaseHTTPRequestHandler):
+    """Request handler, one read-only connection per server thread"""
+
+    protocol_version = "HTTP/1.1"
+    server: "FeatureServer"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status: int, payload: Any):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_stream(self, chunks):
+        """Send an iterator of byte chunks using chunked transfer encoding"""
+        self.streaming = True
+        self.send_response(200)
+        self.send_header("Content-Type", "application/geo+json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        for chunk in chunks:
+            if chunk:
+                self.wfile.write(f"{len(chunk):X}\r\n".encode() + chunk + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        self.streaming = False
+
+        try:
+            if url.path == "/layers":
+                self.send_json(200, list_layers(self.server.connection()))
+            elif url.path == "/features":
+                self.handle_features(params)
+            elif url.path == "/stats":
+                self.send_json(200, self.server.cache.stats())
+            elif TILE_RE.match(url.path):
+                z, x, y = (int(v) for v in TILE_RE.match(url.path).groups())
+                self.handle_tile(z, x, y, params)
+            else:
+                self.send_json(404, {"error": f"Unknown endpoint: {url.path}"})
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+        except Exception as e:
+            # sqlite3.Error and other bugs: a JSON 500 rather than a dropped connection
+            self.log_error("%s failed: %r", url.path, e)
+            if self.streaming:
+                # Headers are gone; end the response so the client sees it cut short
+                self.close_connection = True
+            else:
+                self.send_json(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def handle_features(self, params: Dict[str, list]):
+        query: Dict[str, Any] = {
+            "limit": clamp_limit(int_param(params, "limit", DEFAULT_LIMIT)),
+            "after": int_param(params, "after", 0),
+        }
+        if "bbox" in params:
+            query["bbox"] = parse_bbox(params["bbox"][0])
+        if "layer" in params:
+            query["layers"] = params["layer"][0].split(",")
+        if "q" in params:
+            query["text"] = params["q"][0]
+        for level in ("region", "province", "comuna"):
+            if level in params:
+                query[level] = params[level][0]
+
+        attributes = {k[5:]: v[0] for k, v in params.items() if k.startswith("attr.")}
+        if attributes:
+            query["attributes"] = attributes
+
+        self.send_stream(stream_geojson(self.server.connection(), **query))
+
+    def handle_tile(self, z: int, x: int, y: int, params: Dict[str, list]):
+        if not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            raise ValueError(f"Tile {z}/{x}/{y} out of range")
+
+        layers = params.get("layer", [""])[0]
+        after = int_param(params, "after", 0)
+        key = (z, x, y, layers, after)
+
+        tile = self.server.cache.get(key)
+        if tile is None:
+            query: Dict[str, Any] = {"bbox": tile_to_bbox(z, x, y), "limit": MAX_LIMIT, "after": after}
+            if layers:
+                query["layers"] = layers.split(",")
+            page: Dict[str, Any] = {}
+            body = b"".join(stream_geojson(self.server.connection(), page=page, **query))
+            tile = (body, page["next"])
+            self.server.cache.put(key, tile)
+
+        body, next_cursor = tile
+        self.send_response(200)
+        self.send_header("Content-Type", "application/geo+json")
+        self.send_header("Content-Length", str(len(body)))
+        if next_cursor is not None:
+            # Truncated at MAX_LIMIT: the rest of the tile is at ?after=<cursor>
+            self.send_header("X-Next-Cursor", str(next_cursor))
+            self.send_header("Access-Control-Expose-Headers", "X-Next-Cursor")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FeatureServer(ThreadingHTTPServer):
+    """HTTP server holding the tile cache and per-thread DB connections"""
+
+    daemon_threads = True
+
+    def __init__(self, address, db_path: str = DEFAULT_DB,
+                 cache_tiles: int = DEFAULT_CACHE_TILES, verbose: bool = False):
+        super().__init__(address, FeatureHandler)
+        self.db_path = db_path
+        self.cache = TileCache(cache_tiles)
+        self.verbose = verbose
+        self.local = threading.local()
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = open_db(self.db_path)
+            self.local.conn = conn
+        return conn
+
+
+def main():
+    db_path = DEFAULT_DB
+    port = DEFAULT_PORT
+    cache_tiles = DEFAULT_CACHE_TILES
+
+    args = sys.argv[1:]
+    for i, arg in enumerate(args):
+        if arg == "--db":
+            db_path = args[i + 1]
+        elif arg == "--port":
+            port = int(args[i + 1])
+        elif arg == "--cache-tiles":
+            cache_tiles = int(args[i + 1])
+
+    server = FeatureServer(("127.0.0.1", port), db_path, cache_tiles, verbose="--verbose" in args)
+    print(f"Serving {db_path} on http://127.0.0.1:{port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
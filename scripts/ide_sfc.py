@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Space-filling-curve keys for clustering IDE Chile features on disk
+
+upload-to-turso.py sorts each layer by the Hilbert key of the feature
+centroid before inserting, so features that are close on the map end up on
+the same DB pages. This module computes the keys and measures how many
+`features` leaf pages a bbox query touches.
+
+Usage:
+    python3 ide_sfc.py --compare before.db after.db   # page reads per bbox query
+"""
+
+import bisect
+import random
+import sqlite3
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from ide_query import build_query
+
+HILBERT_ORDER = 16  # 2^16 cells per axis, ~0.6 km at the equator
+
+
+def hilbert_key(lon: Optional[float], lat: Optional[float], order: int = HILBERT_ORDER) -> Optional[int]:
+    """Hilbert curve index of a lon/lat position on a 2^order grid"""
+    if lon is None or lat is None:
+        return None
+
+    side = 1 << order
+    x = min(int((lon + 180.0) / 360.0 * side), side - 1)
+    y = min(int((lat + 90.0) / 180.0 * side), side - 1)
+
+    d = 0
+    s = side >> 1
+    while s > 0:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        d += s * s * ((3 * rx) ^ ry)
+        # Rotate the quadrant so the curve stays continuous
+        if ry == 0:
+            if rx == 1:
+                x = side - 1 - x
+                y = side - 1 - y
+            x, y = y, x
+        s >>= 1
+    return d
+
+
+def leaf_page_map(conn: sqlite3.Connection) -> Tuple[List[int], List[int]]:
+    """Map row ranks of the features table to leaf page numbers via dbstat
+
+    Returns (cumulative cell counts, page numbers) for the leaf pages in
+    b-tree order, so bisecting a row's rank finds the page it lives on.
+    """
+    rows = conn.execute("""
+        SELECT pageno, ncell FROM dbstat
+        WHERE name = 'features' AND pagetype = 'leaf'
+        ORDER BY path
+    """).fetchall()
+
+    bounds, pages = [], []
+    total = 0
+    for pageno, ncell in rows:
+        total += ncell
+        bounds.append(total)
+        pages.append(pageno)
+    return bounds, pages
+
+
+def random_viewports(conn: sqlite3.Connection, count: int = 200, size: float = 0.25,
+                     seed: int = 7) -> List[Tuple[float, float, float, float]]:
+    """Random viewport-sized bboxes inside the extent of the loaded data"""
+    west, south, east, north = conn.execute("""
+        SELECT MIN(centroid_lon), MIN(centroid_lat), MAX(centroid_lon), MAX(centroid_lat)
+        FROM features
+    """).fetchone()
+
+    rng = random.Random(seed)
+    boxes = []
+    for _ in range(count):
+        x = rng.uniform(west, max(west, east - size))
+        y = rng.uniform(south, max(south, north - size))
+        boxes.append((x, y, x + size, y + size))
+    return boxes
+
+
+def measure_page_reads(conn: sqlite3.Connection, bboxes: List[Tuple[float, float, float, float]],
+                       layers: Optional[List[str]] = None) -> Dict[str, float]:
+    """Average distinct features leaf pages and rows per bbox query"""
+    ids = [r[0] for r in conn.execute("SELECT id FROM features ORDER BY id")]
+    bounds, pages = leaf_page_map(conn)
+
+    total_pages = 0
+    total_rows = 0
+    for bbox in bboxes:
+        sql, params = build_query(conn, bbox=bbox, layers=layers, limit=10 ** 9)
+        touched = set()
+        for row in conn.execute(sql, params):
+            rank = bisect.bisect_left(ids, row[0])
+            touched.add(pages[bisect.bisect_right(bounds, rank)])
+            total_rows += 1
+        total_pages += len(touched)
+
+    return {
+        "queries": len(bboxes),
+        "rows_per_query": total_rows / len(bboxes) if bboxes else 0,
+        "pages_per_query": total_pages / len(bboxes) if bboxes else 0,
+        "leaf_pages": len(pages),
+    }
+
+
+def main():
+    args = sys.argv[1:]
+    if "--compare" not in args:
+        print(__doc__)
+        return
+
+    i = args.index("--compare")
+    paths = args[i + 1:i + 3]
+
+    # Same viewports for both databases
+    with sqlite3.connect(paths[0]) as conn:
+        bboxes = random_viewports(conn)
+
+    print("=" * 60)
+    print("Page reads per bbox query")
+    print("=" * 60)
+    print(f"{'Database':<30} {'Rows/query':>12} {'Pages/query':>12}")
+    print("-" * 60)
+    for path in paths:
+        conn = sqlite3.connect(path)
+        r = measure_page_reads(conn, bboxes)
+        print(f"{path[-30:]:<30} {r['rows_per_query']:>12.1f} {r['pages_per_query']:>12.1f}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
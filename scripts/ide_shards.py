@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Per-region sharded builds of the IDE Chile database
+
+upload-to-turso.py --shard splits the national database into one DB per
+region plus a small national index DB, so a replica for a project in one
+region only carries that region:
+
+    shards/ide-chile-data-r<code>.db   full schema (features, geometries,
+                                       R*Tree, FTS, aggregates) for one region
+    shards/ide-chile-index.db          shards catalogue (bbox, counts,
+                                       fingerprint), feature_shards map,
+                                       layers and admin aggregates
+
+Features are assigned, not clipped: a feature goes to the shard of the
+region holding its centroid and to every other region one of its vertices
+falls in, keeping its national id so clients can drop cross-shard copies.
+Boundary layers only go to the region of their own code. Features outside
+every region land in the r00 shard.
+
+Shards are built in parallel worker processes, each reading the national DB
+through ATTACH. Shard files and published-manifest entries of regions that
+no longer exist are removed after each build. Each shard has a content fingerprint (from its aggregate
+fingerprints and its national feature ids), so publishing can skip shards
+that did not change; the index is only published alongside a consistent
+set of shards, since its feature_shards map points at those ids.
+
+Usage:
+    python3 ide_shards.py [--db path/to.db] [--out data/ide-chile/shards] [--workers 4]
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
+
+from ide_admin import ADMIN_LEVELS, PolygonIndex, admin_code, polygon_rings
+from ide_aggregates import ADMIN_COLUMNS, ensure_aggregate_tables, refresh_aggregates
+from ide_geometry import iter_positions
+from ide_search import build_fts_index
+
+DEFAULT_DB = "data/ide-chile/ide-chile-data.db"
+DEFAULT_OUTPUT_DIR = "data/ide-chile/shards"
+DEFAULT_WORKERS = min(os.cpu_count() or 1, 4)
+
+INDEX_NAME = "ide-chile-index"
+MANIFEST_NAME = "published.json"
+UNASSIGNED = "00"
+
+REGION_NAME_FIELDS = ["NOM_REG", "NOM_REGION", "NOMBRE", "REGION"]
+
+INDEX_SCHEMA = """
+CREATE TABLE shards (
+    region_code TEXT PRIMARY KEY,
+    region_name TEXT,
+    db_name TEXT NOT NULL,
+    file TEXT NOT NULL,
+    feature_count INTEGER,
+    bytes INTEGER,
+    fingerprint TEXT,
+    bbox_west REAL,
+    bbox_south REAL,
+    bbox_east REAL,
+    bbox_north REAL,
+    built_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Which shards hold each national feature id
+CREATE TABLE feature_shards (
+    feature_id INTEGER NOT NULL,
+    region_code TEXT NOT NULL,
+    PRIMARY KEY (feature_id, region_code)
+) WITHOUT ROWID;
+
+CREATE INDEX idx_feature_shards_region ON feature_shards(region_code);
+"""
+
+
+def shard_db_name(db_name: str, region_code: str) -> str:
+    """Turso-safe database name of a region shard"""
+    return f"{db_name}-r" + re.sub(r"[^a-z0-9]+", "-", region_code.lower()).strip("-")
+
+
+def copy_rows(conn: sqlite3.Connection, table: str, where: str, params: Tuple = ()):
+    """Copy rows from the attached national DB into the shard, matching columns by name"""
+    columns = ", ".join(row[1] for row in conn.execute(f"PRAGMA main.table_info({table})"))
+    conn.execute(f"INSERT INTO main.{table} ({columns}) SELECT {columns} FROM nat.{table} {where}", params)
+
+
+def region_boundaries(conn: sqlite3.Connection) -> List[Tuple[str, Optional[str], List]]:
+    """(code, name, rings) of every region polygon in the national DB"""
+    column, prefix, fields = ADMIN_LEVELS[0]
+    regions = []
+    for fid, geometry, properties in conn.execute("""
+        SELECT f.id, g.geometry, f.properties FROM features f
+        LEFT JOIN geometries g ON g.id = f.geometry_id WHERE f.layer_id LIKE ? || '%'
+    """, (prefix,)):
+        props = json.loads(properties or "{}")
+        code = admin_code(props, fields, str(fid))
+        name = admin_code(props, REGION_NAME_FIELDS, "") or None
+        regions.append((code, name, polygon_rings(json.loads(geometry) if geometry else None)))
+    return regions
+
+
+def shard_membership(conn: sqlite3.Connection, index: PolygonIndex) -> List[Tuple[int, str]]:
+    """(feature id, region code) rows, several per boundary-crossing feature"""
+    boundary_prefixes = tuple(prefix for _, prefix, _ in ADMIN_LEVELS)
+    rows = []
+    for fid, layer_id, region_code, geometry_type, geometry in conn.execute("""
+        SELECT f.id, f.layer_id, f.region_code, f.geometry_type, g.geometry FROM features f
+        LEFT JOIN geometries g ON g.id = f.geometry_id ORDER BY f.id
+    """):
+        codes = {region_code} if region_code else set()
+        if geometry and geometry_type != "Point" and not layer_id.startswith(boundary_prefixes):
+            for position in iter_positions(json.loads(geometry).get("coordinates", [])):
+                code = index.lookup(position[0], position[1])
+                if code:
+                    codes.add(code)
+        for code in sorted(codes or {UNASSIGNED}):
+            rows.append((fid, code))
+    return rows
+
+
+def shard_fingerprint(conn: sqlite3.Connection) -> str:
+    """Content hash of a shard, stable across rebuilds of identical data
+
+    Aggregate fingerprints leave out feature ids, so the ids are hashed too:
+    a rebuild that renumbers features changes the index's feature_shards map
+    and must republish the shard with it.
+    """
+    digest = hashlib.sha1()
+    for layer_id, fingerprint in conn.execute("SELECT layer_id, fingerprint FROM agg_layers ORDER BY layer_id"):
+        digest.update(f"{layer_id}:{fingerprint}\n".encode())
+    for (fid,) in conn.execute("SELECT id FROM features ORDER BY id"):
+        digest.update(f"{fid}\n".encode())
+    return digest.hexdigest()
+
+
+def build_shard(national_db: str, index_db: str, schema: str, region_code: str,
+                path: str) -> Dict[str, Any]:
+    """Build one region shard from the national DB (runs in a worker process)"""
+    start = time.perf_counter()
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    conn.executescript(schema)
+    conn.execute("ATTACH DATABASE ? AS nat", (national_db,))
+    conn.execute("ATTACH DATABASE ? AS idx", (index_db,))
+
+    # Ids stay the national ones, rows keep their Hilbert order
+    copy_rows(conn, "features", """
+        WHERE id IN (SELECT feature_id FROM idx.feature_shards WHERE region_code = ?) ORDER BY id
+    """, (region_code,))
+    copy_rows(conn, "geometries", "WHERE id IN (SELECT geometry_id FROM main.features)")
+    copy_rows(conn, "features_rtree", "WHERE id IN (SELECT id FROM main.features)")
+    copy_rows(conn, "layers", "WHERE id IN (SELECT DISTINCT layer_id FROM main.features)")
+    conn.execute("""
+        UPDATE layers SET
+            feature_count = (SELECT COUNT(*) FROM features f WHERE f.layer_id = layers.id),
+            bbox_west = (SELECT MIN(r.min_lon) FROM features_rtree r JOIN features f ON f.id = r.id
+                         WHERE f.layer_id = layers.id),
+            bbox_south = (SELECT MIN(r.min_lat) FROM features_rtree r JOIN features f ON f.id = r.id
+                          WHERE f.layer_id = layers.id),
+            bbox_east = (SELECT MAX(r.max_lon) FROM features_rtree r JOIN features f ON f.id = r.id
+                         WHERE f.layer_id = layers.id),
+            bbox_north = (SELECT MAX(r.max_lat) FROM features_rtree r JOIN features f ON f.id = r.id
+                          WHERE f.layer_id = layers.id)
+    """)
+    conn.commit()
+    conn.execute("DETACH DATABASE nat")
+    conn.execute("DETACH DATABASE idx")
+
+    build_fts_index(conn)
+    refresh_aggregates(conn)
+
+    count = conn.execute("SELECT COUNT(*) FROM features").fetchone()[0]
+    bbox = conn.execute("""
+        SELECT MIN(min_lon), MIN(min_lat), MAX(max_lon), MAX(max_lat) FROM features_rtree
+    """).fetchone()
+    fingerprint = shard_fingerprint(conn)
+    conn.close()
+    os.replace(tmp_path, path)
+
+    return {
+        "regionCode": region_code,
+        "file": os.path.basename(path),
+        "features": count,
+        "bytes": os.path.getsize(path),
+        "fingerprint": fingerprint,
+        "bbox": list(bbox),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def build_index_db(conn: sqlite3.Connection, path: str, membership: List[Tuple[int, str]]):
+    """National index DB with the feature -> shard map, layers and admin aggregates"""
+    if os.path.exists(path):
+        os.remove(path)
+
+    index = sqlite3.connect(path)
+    index.executescript(INDEX_SCHEMA)
+    index.executemany("INSERT INTO feature_shards (feature_id, region_code) VALUES (?, ?)", membership)
+
+    layers_sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'layers'").fetchone()[0]
+    index.execute(layers_sql)
+    rows = conn.execute("SELECT * FROM layers").fetchall()
+    if rows:
+        index.executemany(f"INSERT INTO layers VALUES ({', '.join('?' * len(rows[0]))})", rows)
+
+    ensure_aggregate_tables(index)
+    index.executemany(
+        f"INSERT INTO agg_admin ({ADMIN_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)",
+        conn.execute(f"SELECT {ADMIN_COLUMNS} FROM agg_admin").fetchall(),
+    )
+    index.commit()
+    index.close()
+
+
+def build_shards(national_db: str, output_dir: str, schema: str, db_name: str,
+                 workers: int = DEFAULT_WORKERS) -> List[Dict[str, Any]]:
+    """Build the per-region shards and the index DB, returns one entry per shard"""
+    os.makedirs(output_dir, exist_ok=True)
+
+    conn = sqlite3.connect(f"file:{national_db}?mode=ro", uri=True)
+    regions = region_boundaries(conn)
+    names = {code: name for code, name, _ in regions}
+    membership = shard_membership(conn, PolygonIndex([(code, rings) for code, _, rings in regions]))
+
+    index_path = os.path.join(output_dir, f"{INDEX_NAME}.db")
+    build_index_db(conn, index_path, membership)
+    conn.close()
+
+    codes = sorted({code for _, code in membership})
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(build_shard, national_db, index_path, schema, code,
+                        os.path.join(output_dir, f"{shard_db_name(db_name, code)}.db"))
+            for code in codes
+        ]
+        shards = [f.result() for f in futures]
+
+    index = sqlite3.connect(index_path)
+    for shard in shards:
+        code = shard["regionCode"]
+        shard["dbName"] = shard_db_name(db_name, code)
+        shard["regionName"] = names.get(code)
+        index.execute("""
+            INSERT INTO shards (region_code, region_name, db_name, file, feature_count, bytes, fingerprint,
+                                bbox_west, bbox_south, bbox_east, bbox_north)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (code, shard["regionName"], shard["dbName"], shard["file"], shard["features"],
+              shard["bytes"], shard["fingerprint"], *shard["bbox"]))
+    index.commit()
+    index.close()
+
+    prune_stale_shards(output_dir, db_name, shards)
+    return shards
+
+
+def prune_stale_shards(output_dir: str, db_name: str, shards: List[Dict[str, Any]]):
+    """Drop shard files and manifest entries of regions that are gone from this build"""
+    current = {s["file"] for s in shards}
+    prefix = shard_db_name(db_name, "")
+    for name in os.listdir(output_dir):
+        if name.startswith(prefix) and name.endswith(".db") and name not in current:
+            os.remove(os.path.join(output_dir, name))
+
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return
+    with open(manifest_path) as f:
+        published = json.load(f)
+    names = {s["dbName"] for s in shards}
+    kept = {k: v for k, v in published.items() if not k.startswith(prefix) or k in names}
+    if kept != published:
+        with open(manifest_path, "w") as f:
+            json.dump(kept, f, indent=2)
+
+
+def changed_shards(shards: List[Dict[str, Any]], manifest_path: str) -> List[Dict[str, Any]]:
+    """Shards whose fingerprint differs from the last published manifest"""
+    published = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            published = json.load(f)
+    return [s for s in shards if published.get(s["dbName"]) != s["fingerprint"]]
+
+
+def record_published(shards: List[Dict[str, Any]], manifest_path: str):
+    """Remember the fingerprints of successfully published shards"""
+    published = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            published = json.load(f)
+    for shard in shards:
+        published[shard["dbName"]] = shard["fingerprint"]
+    with open(manifest_path, "w") as f:
+        json.dump(published, f, indent=2)
+
+
+def print_shards(shards: List[Dict[str, Any]], national_bytes: int):
+    print(f"\n{'Shard':<32} {'Region':<20} {'Features':>9} {'MB':>8} {'Seconds':>8}")
+    print("-" * 81)
+    for s in shards:
+        print(f"{s['dbName'][:32]:<32} {(s['regionName'] or '-')[:20]:<20} {s['features']:>9} "
+              f"{s['bytes'] / (1024 * 1024):>8.2f} {s['seconds']:>8.2f}")
+    if shards:
+        largest = max(s["bytes"] for s in shards)
+        print(f"\nNational DB: {national_bytes / (1024 * 1024):.2f} MB, "
+              f"largest shard: {largest / (1024 * 1024):.2f} MB")
+
+
+def main():
+    # The schema lives in the hyphenated loader script
+    from ide_pipeline import upload
+
+    db_path = DEFAULT_DB
+    output_dir = DEFAULT_OUTPUT_DIR
+    workers = DEFAULT_WORKERS
+
+    args = sys.argv[1:]
+    for i, arg in enumerate(args):
+        if arg == "--db":
+            db_path = args[i + 1]
+        elif arg == "--out":
+            output_dir = args[i + 1]
+        elif arg == "--workers":
+            workers = int(args[i + 1])
+
+    start = time.perf_counter()
+    shards = build_shards(db_path, output_dir, upload.SCHEMA, upload.DB_NAME, workers)
+    print_shards(shards, os.path.getsize(db_path))
+    print(f"\nBuilt {len(shards)} shards with {workers} workers in {time.perf_counter() - start:.1f}s")
+    print(f"Shards saved to: {output_dir}/")
+
+
+if __name__ == "__main__":
+    main()
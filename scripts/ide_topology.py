@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Arc topology encoding of the IDE Chile administrative boundaries
+
+limites-regiones, limites-provincias and limites-comunas store every shared
+border once per neighbouring polygon and again at each administrative level.
+This encodes the three layers as one TopoJSON topology: coordinates are
+quantized to an integer grid, rings are cut at junctions (points whose
+neighbours differ between the rings passing through them) into arcs, each
+arc is stored once and delta-encoded, and polygons reference arcs by index
+(~i for the reversed arc). decode_topology() rebuilds GeoJSON geometries.
+
+Because neighbours share the same arc, simplifying arcs (--simplify, in
+degrees) keeps borders gap-free. Quantization is lossy: with the default
+1e6 steps per axis, vertices move by a few meters at most.
+
+Usage:
+    python3 ide_topology.py [--db path/to.db] [--out data/ide-chile/topology]
+                            [--quantization 1000000] [--simplify 0.001]
+"""
+
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import time
+from typing import Dict, List, Any, Optional, Tuple
+
+from ide_admin import ADMIN_LEVELS
+
+DEFAULT_DB = "data/ide-chile/ide-chile-data.db"
+DEFAULT_OUTPUT_DIR = "data/ide-chile/topology"
+
+QUANTIZATION = 1000000
+
+Point = Tuple[int, int]
+Ring = List[Point]
+
+
+def boundary_layers(conn: sqlite3.Connection) -> List[str]:
+    """Loaded layer ids of the region, province and comuna boundaries"""
+    layers = []
+    for _, prefix, _ in ADMIN_LEVELS:
+        layers.extend(r[0] for r in conn.execute(
+            "SELECT id FROM layers WHERE id LIKE ? || '%' ORDER BY id", (prefix,)
+        ))
+    return layers
+
+
+def geometry_polygons(geometry: Optional[Dict]) -> List[List[List[List[float]]]]:
+    if not geometry:
+        return []
+    if geometry.get("type") == "Polygon":
+        return [geometry.get("coordinates", [])]
+    if geometry.get("type") == "MultiPolygon":
+        return geometry.get("coordinates", [])
+    return []
+
+
+class Quantizer:
+    """Maps lon/lat to integer grid positions and back"""
+
+    def __init__(self, bounds: Tuple[float, float, float, float], steps: int = QUANTIZATION):
+        west, south, east, north = bounds
+        self.translate = (west, south)
+        self.scale = ((east - west) / (steps - 1) or 1.0, (north - south) / (steps - 1) or 1.0)
+
+    def quantize(self, position: List[float]) -> Point:
+        return (round((position[0] - self.translate[0]) / self.scale[0]),
+                round((position[1] - self.translate[1]) / self.scale[1]))
+
+    def quantize_ring(self, ring: List[List[float]]) -> Ring:
+        """Quantized ring without repeated points or the closing point"""
+        out: Ring = []
+        for position in ring:
+            p = self.quantize(position)
+            if not out or out[-1] != p:
+                out.append(p)
+        if len(out) > 1 and out[0] == out[-1]:
+            out.pop()
+        return out
+
+
+def find_junctions(rings: List[Ring]) -> set:
+    """Points where the rings passing through them have different neighbours"""
+    neighbours: Dict[Point, frozenset] = {}
+    junctions = set()
+    for ring in rings:
+        n = len(ring)
+        for i, p in enumerate(ring):
+            pair = frozenset((ring[i - 1], ring[(i + 1) % n]))
+            seen = neighbours.setdefault(p, pair)
+            if seen != pair:
+                junctions.add(p)
+    return junctions
+
+
+def cut_ring(ring: Ring, junctions: set) -> List[List[Point]]:
+    """Split a ring into arcs between junctions, each arc including both ends"""
+    cuts = [i for i, p in enumerate(ring) if p in junctions]
+    if not cuts:
+        # Closed arc: rotate to the smallest point so equal rings match
+        start = ring.index(min(ring))
+        rotated = ring[start:] + ring[:start]
+        return [rotated + rotated[:1]]
+
+    rotated = ring[cuts[0]:] + ring[:cuts[0]]
+    rotated.append(rotated[0])
+    arcs = []
+    begin = 0
+    for i in range(1, len(rotated)):
+        if rotated[i] in junctions:
+            arcs.append(rotated[begin:i + 1])
+            begin = i
+    return arcs
+
+
+def simplify_arc(arc: List[Point], tolerance: float) -> List[Point]:
+    """Douglas-Peucker in grid units, endpoints kept so neighbours still meet"""
+    if len(arc) < 3 or tolerance <= 0:
+        return arc
+
+    keep = [False] * len(arc)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(arc) - 1)]
+    while stack:
+        first, last = stack.pop()
+        (x1, y1), (x2, y2) = arc[first], arc[last]
+        dx, dy = x2 - x1, y2 - y1
+        length = (dx * dx + dy * dy) ** 0.5
+        best, index = 0.0, -1
+        for i in range(first + 1, last):
+            px, py = arc[i]
+            if length:
+                d = abs(dy * (px - x1) - dx * (py - y1)) / length
+            else:
+                d = ((px - x1) ** 2 + (py - y1) ** 2) ** 0.5
+            if d > best:
+                best, index = d, i
+        if best > tolerance:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+
+    simplified = [p for p, k in zip(arc, keep) if k]
+    # A closed arc must stay a ring
+    if simplified[0] == simplified[-1] and len(simplified) < 4:
+        return arc
+    return simplified
+
+
+def encode_topology(objects: Dict[str, List[Tuple[int, Dict]]], quantization: int = QUANTIZATION,
+                    simplify: float = 0.0) -> Dict[str, Any]:
+    """Encode {layer: [(feature id, geometry)]} as a delta-encoded TopoJSON topology"""
+    bounds = [float("inf"), float("inf"), float("-inf"), float("-inf")]
+    for features in objects.values():
+        for _, geometry in features:
+            for polygon in geometry_polygons(geometry):
+                for ring in polygon:
+                    for x, y, *_ in ring:
+                        bounds = [min(bounds[0], x), min(bounds[1], y), max(bounds[2], x), max(bounds[3], y)]
+    if bounds[0] == float("inf"):
+        bounds = [0.0, 0.0, 1.0, 1.0]
+    quantizer = Quantizer(tuple(bounds), quantization)
+
+    # Quantize everything first so shared borders compare exactly
+    quantized: Dict[str, List[Tuple[int, List[List[Ring]]]]] = {}
+    all_rings: List[Ring] = []
+    for layer_id, features in objects.items():
+        quantized[layer_id] = []
+        for fid, geometry in features:
+            polygons = []
+            for polygon in geometry_polygons(geometry):
+                rings = [r for r in (quantizer.quantize_ring(ring) for ring in polygon) if len(r) >= 3]
+                if rings:
+                    polygons.append(rings)
+                    all_rings.extend(rings)
+            quantized[layer_id].append((fid, polygons))
+
+    junctions = find_junctions(all_rings)
+    arcs: List[List[Point]] = []
+    arc_index: Dict[Tuple[Point, ...], int] = {}
+
+    def arc_ref(points: List[Point]) -> int:
+        key = tuple(points)
+        if key in arc_index:
+            return arc_index[key]
+        if key[::-1] in arc_index:
+            return ~arc_index[key[::-1]]
+        arc_index[key] = len(arcs)
+        arcs.append(points)
+        return len(arcs) - 1
+
+    topo_objects = {}
+    for layer_id, features in quantized.items():
+        geometries = []
+        for fid, polygons in features:
+            refs = [[[arc_ref(a) for a in cut_ring(ring, junctions)] for ring in rings] for rings in polygons]
+            if not refs:
+                geometries.append({"type": None, "id": fid})
+            elif len(refs) == 1:
+                geometries.append({"type": "Polygon", "id": fid, "arcs": refs[0]})
+            else:
+                geometries.append({"type": "MultiPolygon", "id": fid, "arcs": refs})
+        topo_objects[layer_id] = {"type": "GeometryCollection", "geometries": geometries}
+
+    tolerance = simplify / min(quantizer.scale) if simplify else 0.0
+    encoded = []
+    for arc in arcs:
+        arc = simplify_arc(arc, tolerance)
+        x0, y0 = arc[0]
+        delta = [[x0, y0]]
+        for x, y in arc[1:]:
+            delta.append([x - x0, y - y0])
+            x0, y0 = x, y
+        encoded.append(delta)
+
+    return {
+        "type": "Topology",
+        "transform": {"scale": list(quantizer.scale), "translate": list(quantizer.translate)},
+        "objects": topo_objects,
+        "arcs": encoded,
+    }
+
+
+def decode_arcs(topology: Dict[str, Any]) -> List[List[List[float]]]:
+    """Absolute lon/lat positions of every arc"""
+    (sx, sy), (tx, ty) = topology["transform"]["scale"], topology["transform"]["translate"]
+    decoded = []
+    for arc in topology["arcs"]:
+        x = y = 0
+        positions = []
+        for dx, dy in arc:
+            x += dx
+            y += dy
+            positions.append([x * sx + tx, y * sy + ty])
+        decoded.append(positions)
+    return decoded
+
+
+def _ring(refs: List[int], arcs: List[List[List[float]]]) -> List[List[float]]:
+    ring: List[List[float]] = []
+    for ref in refs:
+        points = arcs[ref] if ref >= 0 else arcs[~ref][::-1]
+        ring.extend(points[1:] if ring else points)
+    return ring
+
+
+def decode_topology(topology: Dict[str, Any]) -> Dict[str, List[Tuple[int, Optional[Dict]]]]:
+    """Rebuild {layer: [(feature id, GeoJSON geometry)]} from a topology"""
+    arcs = decode_arcs(topology)
+    layers = {}
+    for layer_id, collection in topology["objects"].items():
+        features = []
+        for g in collection["geometries"]:
+            if g["type"] == "Polygon":
+                geometry = {"type": "Polygon", "coordinates": [_ring(r, arcs) for r in g["arcs"]]}
+            elif g["type"] == "MultiPolygon":
+                geometry = {"type": "MultiPolygon",
+                            "coordinates": [[_ring(r, arcs) for r in poly] for poly in g["arcs"]]}
+            else:
+                geometry = None
+            features.append((g["id"], geometry))
+        layers[layer_id] = features
+    return layers
+
+
+def topology_report(conn: sqlite3.Connection, topology: Dict[str, Any], layers: List[str],
+                    encode_seconds: float) -> Dict[str, Any]:
+    """Sizes before and after, and timings, for the boundary layers"""
+    placeholders = ", ".join("?" * len(layers))
+    source_bytes, source_vertices = 0, 0
+    for (geometry,) in conn.execute(
+        f"SELECT g.geometry FROM features f JOIN geometries g ON g.id = f.geometry_id "
+        f"WHERE f.layer_id IN ({placeholders})", layers
+    ):
+        if geometry:
+            source_bytes += len(geometry)
+            source_vertices += sum(len(r) for p in geometry_polygons(json.loads(geometry)) for r in p)
+
+    encoded = json.dumps(topology, separators=(",", ":")).encode()
+
+    start = time.perf_counter()
+    decode_topology(topology)
+    decode_seconds = time.perf_counter() - start
+
+    return {
+        "layers": layers,
+        "sourceBytes": source_bytes,
+        "sourceVertices": source_vertices,
+        "arcs": len(topology["arcs"]),
+        "arcVertices": sum(len(a) for a in topology["arcs"]),
+        "topologyBytes": len(encoded),
+        "topologyGzipBytes": len(gzip.compress(encoded)),
+        "compressionRatio": round(source_bytes / len(encoded), 2) if encoded else None,
+        "encodeSeconds": round(encode_seconds, 4),
+        "decodeSeconds": round(decode_seconds, 4),
+    }
+
+
+def main():
+    db_path = DEFAULT_DB
+    output_dir = DEFAULT_OUTPUT_DIR
+    quantization = QUANTIZATION
+    simplify = 0.0
+
+    args = sys.argv[1:]
+    for i, arg in enumerate(args):
+        if arg == "--db":
+            db_path = args[i + 1]
+        elif arg == "--out":
+            output_dir = args[i + 1]
+        elif arg == "--quantization":
+            quantization = int(float(args[i + 1]))
+        elif arg == "--simplify":
+            simplify = float(args[i + 1])
+
+    conn = sqlite3.connect(db_path)
+    layers = boundary_layers(conn)
+    if not layers:
+        print("❌ Error: no limites-* boundary layers in the database")
+        sys.exit(1)
+
+    objects = {}
+    for layer_id in layers:
+        objects[layer_id] = [
+            (fid, json.loads(geometry) if geometry else None)
+            for fid, geometry in conn.execute("""
+                SELECT f.id, g.geometry FROM features f LEFT JOIN geometries g ON g.id = f.geometry_id
+                WHERE f.layer_id = ? ORDER BY f.id
+            """, (layer_id,))
+        ]
+
+    start = time.perf_counter()
+    topology = encode_topology(objects, quantization, simplify)
+    encode_seconds = time.perf_counter() - start
+
+    report = topology_report(conn, topology, layers, encode_seconds)
+    conn.close()
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, "limites.topojson")
+    with open(path, "w") as f:
+        json.dump(topology, f, separators=(",", ":"))
+    with open(os.path.join(output_dir, "topology-report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Boundary layers: {', '.join(layers)}")
+    print(f"Source:   {report['sourceBytes'] / 1024:>10.1f}KB  {report['sourceVertices']:>9} vertices")
+    print(f"Topology: {report['topologyBytes'] / 1024:>10.1f}KB  {report['arcVertices']:>9} vertices"
+          f" in {report['arcs']} arcs ({report['topologyGzipBytes'] / 1024:.1f}KB gzipped)")
+    print(f"Compression ratio: {report['compressionRatio']}x")
+    print(f"Encode: {report['encodeSeconds'] * 1000:.1f}ms  Decode: {report['decodeSeconds'] * 1000:.1f}ms")
+    print(f"\nTopology saved to: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""download-ide-data.py paging and retries against the fake MapServer"""
+
+import pytest
+
+from ide_bench import run_download
+from ide_mapserver import FakeMapServer
+from ide_pipeline import download
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    monkeypatch.setattr(download, "RETRY_BACKOFF", 0)
+    servers = []
+
+    def start(**options):
+        server = FakeMapServer(("127.0.0.1", 0), **options)
+        server.start_background()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def received(pages):
+    return {key: sum(len(p["features"]) for p in layer) for key, layer in pages.items()}
+
+
+@pytest.mark.parametrize("id_paging", [False, True])
+def test_every_feature_arrives_below_max_record_count(serve, id_paging):
+    # maxRecordCount under the downloader's page size forces truncated pages
+    server = serve(features=120, vertices=4, max_record_count=50)
+
+    pages = run_download(server.base_url, id_paging)
+
+    assert received(pages) == server.layer_counts()
+    for layer in pages.values():
+        ids = [f["attributes"]["OBJECTID"] for p in layer for f in p["features"]]
+        assert len(ids) == len(set(ids))
+
+
+@pytest.mark.parametrize("id_paging", [False, True])
+@pytest.mark.parametrize("error_mode", ["http", "json", "mixed"])
+def test_transient_errors_are_retried(serve, capsys, id_paging, error_mode):
+    clean = serve(features=120, vertices=4, max_record_count=50)
+    run_download(clean.base_url, id_paging)
+    server = serve(features=120, vertices=4, max_record_count=50, error_every=5, error_mode=error_mode)
+    capsys.readouterr()
+
+    pages = run_download(server.base_url, id_paging)
+
+    # Every 5th request fails once and its retry succeeds
+    assert server.errors == server.requests // 5 > 0
+    assert server.requests == clean.requests + server.errors
+    assert capsys.readouterr().out.count("Retry 1/") == server.errors
+    assert received(pages) == server.layer_counts()
+
+
+@pytest.mark.parametrize("id_paging", [False, True])
+def test_max_records_caps_a_layer(serve, monkeypatch, id_paging):
+    server = serve(features=120, vertices=4, max_record_count=50)
+    monkeypatch.setattr(download, "ID_PAGING", id_paging)
+    service = download.SERVICES[0]
+    url = service["url"].replace(download.MOP_BASE_URL, server.base_url)
+
+    pages = list(download.iter_layer_pages(url, service["layers"][0], max_records=70, delay=0))
+
+    assert sum(len(p["features"]) for p in pages) == 70
@@ -0,0 +1,89 @@
+"""Polygon lookups: interiors, shared borders and holes"""
+
+import random
+import sqlite3
+
+import pytest
+
+from ide_admin import PolygonIndex, assign_admin_areas
+from ide_pipeline import upload
+
+
+def square(west, south, east, north):
+    return [[west, south], [east, south], [east, north], [west, north], [west, south]]
+
+
+WEST = [square(-72, -34, -71, -33), square(-71.75, -33.75, -71.25, -33.25)]  # with a hole
+EAST = [square(-71, -34, -70, -33)]
+ENCLAVE = [square(-71.75, -33.75, -71.25, -33.25)]
+
+
+def even_odd(rings, x, y):
+    inside = False
+    for ring in rings:
+        for (x1, y1), (x2, y2) in zip(ring, ring[1:]):
+            if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                inside = not inside
+    return inside
+
+
+@pytest.fixture(scope="module")
+def index():
+    return PolygonIndex([("05", WEST), ("13", EAST)])
+
+
+def test_point_inside_known_polygon(index):
+    assert index.lookup(-70.5, -33.5) == "13"
+    assert index.lookup(-71.9, -33.1) == "05"
+    assert index.lookup(-60.0, -33.5) is None
+    assert index.lookup(None, -33.5) is None
+
+
+def test_hole_is_outside(index):
+    assert index.lookup(-71.5, -33.5) is None
+    with_enclave = PolygonIndex([("05", WEST), ("13", EAST), ("99", ENCLAVE)])
+    assert with_enclave.lookup(-71.5, -33.5) == "99"
+    assert with_enclave.lookup(-71.8, -33.5) == "05"
+
+
+@pytest.mark.parametrize("point", [
+    (-71.0, -33.5),    # shared edge
+    (-71.0, -34.0),    # shared corner
+    (-71.75, -33.5),   # hole edge
+    (-71.25, -33.25),  # hole corner
+    (-72.0, -33.5),    # outer edge
+])
+def test_border_points_get_at_most_one_code(index, point):
+    expected = [code for code, rings in (("05", WEST), ("13", EAST)) if even_odd(rings, *point)]
+    assert len(expected) <= 1
+    assert index.lookup(*point) == (expected[0] if expected else None)
+
+
+def test_matches_exact_test_everywhere(index):
+    # Includes points snapped to grid lines, where interior cells start
+    rng = random.Random(5)
+    points = [(rng.uniform(-72.2, -69.8), rng.uniform(-34.2, -32.8)) for _ in range(2000)]
+    points += [(round(x / 0.05) * 0.05, y) for x, y in points[:500]]
+    for x, y in points:
+        expected = "05" if even_odd(WEST, x, y) else "13" if even_odd(EAST, x, y) else None
+        assert index.lookup(x, y) == expected
+
+
+def test_assign_admin_areas():
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(upload.SCHEMA)
+    upload.insert_features(conn, "limites-regiones_layer0", [
+        {"type": "Feature", "geometry": {"type": "Polygon", "coordinates": rings}, "properties": {"CUT_REG": code}}
+        for code, rings in (("05", WEST), ("13", EAST))
+    ])
+    upload.insert_features(conn, "rios_layer0", [
+        {"type": "Feature", "geometry": {"type": "Point", "coordinates": [x, -33.5]}, "properties": {"NOMBRE": name}}
+        for name, x in (("Aconcagua", -71.9), ("Laguna", -71.5), ("Mapocho", -70.5))
+    ])
+
+    assert assign_admin_areas(conn)["region_code"] == 4
+    rows = dict(conn.execute("""
+        SELECT json_extract(properties, '$.NOMBRE'), region_code FROM features WHERE layer_id = 'rios_layer0'
+    """))
+    assert rows == {"Aconcagua": "05", "Laguna": None, "Mapocho": "13"}
+    conn.close()
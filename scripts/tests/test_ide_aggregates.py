@@ -0,0 +1,31 @@
+"""Polygon areas with holes, in both shapes the downloader produces"""
+
+import pytest
+
+from ide_aggregates import geometry_measures, ring_area_m2
+
+OUTER = [[-71, -34], [-70, -34], [-70, -33], [-71, -33], [-71, -34]]
+HOLE = [[-70.75, -33.75], [-70.25, -33.75], [-70.25, -33.25], [-70.75, -33.25], [-70.75, -33.75]]
+ISLAND = [[-70.6, -33.6], [-70.4, -33.6], [-70.4, -33.4], [-70.6, -33.4], [-70.6, -33.6]]
+OTHER = [[-72, -34], [-71.5, -34], [-71.5, -33.5], [-72, -33.5], [-72, -34]]
+
+
+def area(geometry):
+    return geometry_measures(geometry)[1] * 1e6
+
+
+def test_polygon_hole_is_subtracted():
+    expected = ring_area_m2(OUTER) - ring_area_m2(HOLE)
+    assert area({"type": "Polygon", "coordinates": [OUTER, HOLE]}) == pytest.approx(expected)
+
+
+def test_single_ring_multipolygon_parts_are_even_odd():
+    # ESRI multi-ring polygons come out of the downloader as one ring per part
+    geometry = {"type": "MultiPolygon", "coordinates": [[OUTER], [HOLE], [ISLAND], [OTHER]]}
+    expected = ring_area_m2(OUTER) - ring_area_m2(HOLE) + ring_area_m2(ISLAND) + ring_area_m2(OTHER)
+    assert area(geometry) == pytest.approx(expected)
+
+
+def test_disjoint_polygons_add_up():
+    geometry = {"type": "MultiPolygon", "coordinates": [[OUTER], [OTHER]]}
+    assert area(geometry) == pytest.approx(ring_area_m2(OUTER) + ring_area_m2(OTHER))
@@ -0,0 +1,49 @@
+"""CoordStoreWriter round trips through CoordStore, including degenerate geometries"""
+
+import numpy as np
+
+from ide_coords import CoordStore, CoordStoreWriter
+
+
+def write_store(tmp_path, geometries):
+    writer = CoordStoreWriter()
+    for fid, geometry in enumerate(geometries, start=1):
+        writer.add(fid, geometry)
+    path = tmp_path / "layer.coords"
+    writer.write(str(path))
+    return CoordStore(str(path))
+
+
+def test_round_trip(tmp_path):
+    square = [[-70, -33], [-69, -33], [-69, -32], [-70, -33]]
+    store = write_store(tmp_path, [
+        {"type": "Point", "coordinates": [-70.5, -33.4]},
+        {"type": "Polygon", "coordinates": [square]},
+        None,
+    ])
+
+    assert len(store) == 3
+    assert store.feature_coords(0).tolist() == [[-70.5, -33.4]]
+    assert store.feature_rings(1)[0].tolist() == square
+    assert len(store.feature_coords(2)) == 0
+    store.close()
+
+
+def test_empty_and_non_finite_geometries_are_zero_length(tmp_path):
+    store = write_store(tmp_path, [
+        {"type": "Point", "coordinates": [None, None]},
+        {"type": "Point", "coordinates": []},
+        {"type": "Point", "coordinates": [float("nan"), -33.0]},
+        {"type": "LineString", "coordinates": [[-70, -33], [None, None], [-69, float("inf")], [-69, -32]]},
+        {"type": "MultiPoint", "coordinates": [[], [-70, -33]]},
+        {"type": "Point", "coordinates": [-71, -34]},
+    ])
+
+    assert len(store) == 6
+    for i in range(3):
+        assert len(store.feature_coords(i)) == 0
+    assert store.feature_coords(3).tolist() == [[-70, -33], [-69, -32]]
+    assert [len(r) for r in store.feature_rings(4)] == [0, 1]
+    assert store.feature_coords(5).tolist() == [[-71, -34]]
+    assert np.isfinite(store.coords).all()
+    store.close()
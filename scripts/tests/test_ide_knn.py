@@ -0,0 +1,62 @@
+"""k-NN search against a brute-force Vincenty ranking"""
+
+import random
+
+import pytest
+
+from ide_knn import KnnIndex, benchmark_knn, geodesic_distance, min_distance_to_box
+
+
+def dms(degrees, minutes, seconds, sign=1):
+    return sign * (degrees + minutes / 60 + seconds / 3600)
+
+
+@pytest.fixture(scope="module")
+def points():
+    rng = random.Random(7)
+    return [(i, rng.uniform(-76, -66), rng.uniform(-56, -17)) for i in range(600)]
+
+
+def ranking(points, lon, lat):
+    return sorted((geodesic_distance(lon, lat, plon, plat), fid) for fid, plon, plat in points)
+
+
+def test_vincenty_reference_distance():
+    # Flinders Peak to Buninyong, Vincenty (1975)
+    distance = geodesic_distance(dms(144, 25, 29.52440), dms(37, 57, 3.72030, -1),
+                                 dms(143, 55, 35.38390), dms(37, 39, 10.15610, -1))
+    assert distance == pytest.approx(54972.271, abs=1e-3)
+
+
+@pytest.mark.parametrize("k", [1, 5, 40])
+def test_nearest_matches_brute_force(points, k):
+    index = KnnIndex(points)
+    rng = random.Random(k)
+    queries = [(rng.uniform(-80, -60), rng.uniform(-60, -15)) for _ in range(50)]
+    for (lon, lat), found in zip(queries, index.nearest_batch(queries, k)):
+        expected = ranking(points, lon, lat)[:k]
+        assert [fid for _, fid in found] == [fid for _, fid in expected]
+        assert [d for d, _ in found] == pytest.approx([d for d, _ in expected])
+
+
+def test_max_distance_cuts_results(points):
+    index = KnnIndex(points)
+    expected = [r for r in ranking(points, -70.6, -33.4) if r[0] <= 150_000]
+    assert index.nearest(-70.6, -33.4, k=len(points), max_distance=150_000) == expected
+
+
+def test_box_bound_never_overestimates(points):
+    rng = random.Random(3)
+    for _ in range(200):
+        west, east = sorted(rng.uniform(-76, -66) for _ in range(2))
+        south, north = sorted(rng.uniform(-56, -17) for _ in range(2))
+        lon, lat = rng.uniform(-90, -50), rng.uniform(-70, 0)
+        inside = [(rng.uniform(west, east), rng.uniform(south, north)) for _ in range(20)]
+        bound = min_distance_to_box(lon, lat, (west, south, east, north))
+        assert all(bound <= geodesic_distance(lon, lat, x, y) for x, y in inside)
+
+
+def test_empty_index():
+    index = KnnIndex([])
+    assert index.nearest(-70.6, -33.4) == []
+    assert benchmark_knn(index)["queries"] == 0
@@ -0,0 +1,107 @@
+"""Stage timings and the JSON run report"""
+
+import json
+import tracemalloc
+
+import pytest
+
+import ide_metrics
+from ide_metrics import RunReport, report_from_args
+
+STAGE_KEYS = {"calls", "seconds", "bytes", "features", "features_per_second", "mb_per_second", "peak_memory_mb"}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """perf_counter that only moves when the test advances it"""
+    now = [100.0]
+    monkeypatch.setattr(ide_metrics.time, "perf_counter", lambda: now[0])
+
+    def advance(seconds):
+        now[0] += seconds
+    return advance
+
+
+@pytest.fixture
+def tracing():
+    was_tracing = tracemalloc.is_tracing()
+    yield
+    if not was_tracing:
+        tracemalloc.stop()
+
+
+def test_stage_timings_accumulate(clock):
+    report = RunReport("upload", trace_memory=False)
+    with report.stage("insert") as stage:
+        clock(1.5)
+        stage.add(bytes=2_000_000, features=100)
+    with report.stage("insert") as stage:
+        clock(0.5)
+        stage.add(features=300)
+    with pytest.raises(RuntimeError):
+        with report.stage("index"):
+            clock(0.25)
+            raise RuntimeError("interrupted")
+
+    stages = report.to_dict()["stages"]
+    assert list(stages) == ["insert", "index"]
+    assert stages["insert"] == {
+        "calls": 2, "seconds": 2.0, "bytes": 2_000_000, "features": 400,
+        "features_per_second": 200.0, "mb_per_second": 1.0, "peak_memory_mb": 0.0,
+    }
+    assert stages["index"]["calls"] == 1
+    assert stages["index"]["seconds"] == 0.25
+    assert stages["index"]["features_per_second"] == 0.0
+    assert report.to_dict()["totalSeconds"] == 2.25
+
+
+def test_report_json_shape(tmp_path):
+    report = RunReport("download", trace_memory=False)
+    with report.stage("fetch") as stage:
+        stage.add(bytes=10, features=1)
+    report.extra["layers"] = 3
+
+    path = report.write(str(tmp_path))
+    assert path == str(tmp_path / "download-report.json")
+    with open(path) as f:
+        data = json.load(f)
+
+    assert set(data) == {"script", "startedAt", "totalSeconds", "python", "platform", "traceMemory",
+                         "stages", "layers"}
+    assert data["script"] == "download"
+    assert data["traceMemory"] is False
+    assert data["layers"] == 3
+    assert set(data["stages"]["fetch"]) == STAGE_KEYS
+
+    report.write(str(tmp_path))
+    assert (tmp_path / "download-report.prev.json").exists()
+
+
+def test_peak_memory_per_stage(tracing):
+    report = RunReport("upload")
+    with report.stage("parse"):
+        buffer = bytearray(8 * 1024 * 1024)
+    del buffer
+    with report.stage("insert"):
+        pass
+
+    stages = report.to_dict()["stages"]
+    assert stages["parse"]["peak_memory_mb"] >= 7.5
+    assert stages["insert"]["peak_memory_mb"] < 1
+
+
+def test_concurrent_report_has_run_peak_only(tracing):
+    report = RunReport("download", concurrent=True)
+    with report.stage("fetch"):
+        pass
+    data = report.to_dict()
+    assert "peakMemoryMb" in data
+    assert data["stages"]["fetch"]["peak_memory_mb"] == 0.0
+
+
+def test_report_from_args(tmp_path):
+    report = report_from_args("upload", ["upload-to-turso.py", "--no-trace-memory", "--profile"])
+    assert report.trace_memory is False
+    assert report.profiler is not None
+    report.write(str(tmp_path))
+    assert (tmp_path / "upload.prof").exists()
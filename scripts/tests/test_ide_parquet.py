@@ -0,0 +1,22 @@
+"""WKB encoding of degenerate geometries"""
+
+import math
+import struct
+
+from ide_parquet import to_wkb
+
+
+def test_point():
+    assert to_wkb({"type": "Point", "coordinates": [-70.5, -33.4]}) == struct.pack("<BI2d", 1, 1, -70.5, -33.4)
+
+
+def test_points_without_position_are_point_empty():
+    for coords in ([None, None], [], None, [float("nan"), -33.0]):
+        order, wkb_type, x, y = struct.unpack("<BI2d", to_wkb({"type": "Point", "coordinates": coords}))
+        assert (order, wkb_type) == (1, 1)
+        assert math.isnan(x) and math.isnan(y)
+
+
+def test_invalid_vertices_are_left_out():
+    wkb = to_wkb({"type": "LineString", "coordinates": [[-70, -33], [None, None], [-69, -32]]})
+    assert wkb == struct.pack("<BII4d", 1, 2, 2, -70, -33, -69, -32)
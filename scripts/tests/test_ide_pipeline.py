@@ -0,0 +1,93 @@
+"""Streaming pipeline against the fake MapServer with a failing layer"""
+
+import os
+import sqlite3
+
+import pytest
+
+from ide_mapserver import FakeMapServer
+from ide_metrics import RunReport
+from ide_pipeline import download, run_pipeline, upload
+
+FAILING = "puentes_layer0"
+
+
+@pytest.fixture
+def server():
+    server = FakeMapServer(("127.0.0.1", 0), features=30, vertices=4, max_record_count=20)
+    server.start_background()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(upload, "LOCAL_DB", str(tmp_path / "ide.db"))
+    # run_pipeline swaps the scripts' reports, put them back afterwards
+    monkeypatch.setattr(upload, "REPORT", upload.REPORT)
+    monkeypatch.setattr(download, "REPORT", download.REPORT)
+    return tmp_path
+
+
+@pytest.fixture
+def failing_layer(monkeypatch):
+    """The FAILING layer raises after its first page"""
+    iter_layer_pages = download.iter_layer_pages
+    service = next(s for s in download.SERVICES if FAILING.startswith(s["id"] + "_"))
+    path = service["url"].replace(download.MOP_BASE_URL, "")
+
+    def failing(url, layer, **kwargs):
+        for i, page in enumerate(iter_layer_pages(url, layer, **kwargs)):
+            if url.endswith(path) and i == 1:
+                raise ConnectionResetError("connection reset")
+            yield page
+
+    monkeypatch.setattr(download, "iter_layer_pages", failing)
+
+
+def layer_counts(db_path):
+    conn = sqlite3.connect(db_path)
+    counts = dict(conn.execute("SELECT layer_id, COUNT(*) FROM features GROUP BY layer_id"))
+    orphans = conn.execute("""
+        SELECT COUNT(*) FROM geometries WHERE id NOT IN (SELECT geometry_id FROM features)
+    """).fetchone()[0]
+    rtree = conn.execute("SELECT COUNT(*) FROM features_rtree").fetchone()[0]
+    conn.close()
+    return counts, orphans, rtree
+
+
+@pytest.mark.parametrize("cluster", [True, False])
+def test_failed_layer_is_skipped(server, data_dir, failing_layer, cluster):
+    report = RunReport("pipeline", trace_memory=False, concurrent=True)
+
+    counts = run_pipeline(report, fetch_workers=3, cluster=cluster, base_url=server.base_url, delay=0)
+
+    expected = {key: n for key, n in server.layer_counts().items() if key != FAILING}
+    assert counts == expected
+    assert list(report.extra["failedLayers"]) == [FAILING]
+
+    stored, orphans, rtree = layer_counts(upload.LOCAL_DB)
+    assert stored == expected
+    assert orphans == 0
+    assert rtree == sum(expected.values())
+    assert not os.path.exists(upload.build_db_path())
+
+
+def test_aborted_build_keeps_previous_database(server, data_dir, monkeypatch):
+    report = RunReport("pipeline", trace_memory=False, concurrent=True)
+    run_pipeline(report, base_url=server.base_url, delay=0)
+    with open(upload.LOCAL_DB, "rb") as f:
+        good = f.read()
+
+    def broken(conn, total):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(upload, "finalize_db", broken)
+    with pytest.raises(RuntimeError):
+        run_pipeline(report, base_url=server.base_url, delay=0)
+
+    with open(upload.LOCAL_DB, "rb") as f:
+        assert f.read() == good
+    assert layer_counts(upload.LOCAL_DB)[0] == server.layer_counts()
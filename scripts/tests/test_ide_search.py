@@ -0,0 +1,64 @@
+"""Accent folding and type-ahead prefixes in the features FTS index"""
+
+import json
+import sqlite3
+
+import pytest
+
+from ide_pipeline import insert_layer_row, upload
+from ide_search import build_fts_index, search_features, to_match_query
+
+NAMES = ["Río Ñuble", "Río Biobío", "Estero La Quebrada", "Canal San Carlos"]
+
+
+@pytest.fixture(scope="module")
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(upload.SCHEMA)
+    for layer_id in ("rios_layer0", "canales_layer0"):
+        upload.insert_features(conn, layer_id, [
+            {"type": "Feature", "geometry": {"type": "Point", "coordinates": [-72 + i * 0.1, -36.6]},
+             "properties": {"NOMBRE": name, "CODIGO": 8100 + i}}
+            for i, name in enumerate(NAMES)
+        ])
+        insert_layer_row(conn, layer_id)
+    assert build_fts_index(conn) == 2 * len(NAMES)
+    yield conn
+    conn.close()
+
+
+def names(conn, text, **options):
+    return sorted({json.loads(f["properties"])["NOMBRE"] for f in search_features(conn, text, **options)})
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("nuble", ["Río Ñuble"]),
+    ("ÑUBLE", ["Río Ñuble"]),
+    ("rio", ["Río Biobío", "Río Ñuble"]),
+    ("biobio", ["Río Biobío"]),
+])
+def test_accents_and_case_are_folded(conn, text, expected):
+    # Whole words only: as a prefix "rio" would also match the "rios" layer name
+    assert names(conn, text, prefix=False) == expected
+
+
+def test_last_token_is_a_prefix(conn):
+    assert names(conn, "bio") == ["Río Biobío"]
+    assert names(conn, "estero que") == ["Estero La Quebrada"]
+    assert names(conn, "bio", prefix=False) == []
+    assert names(conn, "que estero") == []
+
+
+def test_only_text_attributes_are_indexed(conn):
+    assert names(conn, "8100", prefix=False) == []
+
+
+def test_layer_filter(conn):
+    results = search_features(conn, "rio", layer_id="canales_layer0")
+    assert {f["layer_id"] for f in results} == {"canales_layer0"}
+    assert len(results) == 2
+
+
+def test_match_query_quotes_tokens():
+    assert to_match_query('río "AND" nu') == '"río" "AND" "nu"*'
+    assert to_match_query("!!!") is None
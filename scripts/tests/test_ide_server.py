@@ -0,0 +1,108 @@
+"""Feature server parameter handling and truncated tiles"""
+
+import json
+import sqlite3
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import ide_query
+import ide_server
+from ide_pipeline import insert_layer_row, upload
+from ide_search import build_fts_index
+from ide_server import FeatureServer
+
+FEATURES = 12
+
+
+@pytest.fixture(scope="module")
+def base_url(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("db") / "ide.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(upload.SCHEMA)
+    upload.insert_features(conn, "rios_layer0", [
+        {"type": "Feature", "geometry": {"type": "Point", "coordinates": [-70.5 + i * 0.01, -33.4]},
+         "properties": {"NOMBRE": f"Rio {i}", "CODIGO": 8100 + i, "TEXTO": f"{i:04d}"}}
+        for i in range(FEATURES)
+    ])
+    insert_layer_row(conn, "rios_layer0")
+    build_fts_index(conn)
+    conn.commit()
+    conn.close()
+
+    server = FeatureServer(("127.0.0.1", 0), path)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def get(url):
+    try:
+        with urllib.request.urlopen(url) as response:
+            return response.status, dict(response.headers), json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, dict(e.headers), json.loads(e.read())
+
+
+def test_limit_is_clamped(base_url):
+    for limit in ("-5", "0"):
+        status, _, body = get(f"{base_url}/features?limit={limit}")
+        assert status == 200
+        assert body["numberReturned"] == 1
+
+
+@pytest.mark.parametrize("query", ["limit=abc", "after=1.5"])
+def test_non_integer_parameters_are_400(base_url, query):
+    status, _, body = get(f"{base_url}/features?{query}")
+    assert status == 400
+    assert "must be an integer" in body["error"]
+
+
+def test_text_without_tokens_matches_nothing(base_url):
+    status, _, body = get(f"{base_url}/features?q=%21%21%21")
+    assert status == 200
+    assert body["features"] == []
+
+    _, _, body = get(f"{base_url}/features?q=rio")
+    assert body["numberReturned"] == FEATURES
+
+
+def test_full_tile_signals_truncation(base_url, monkeypatch):
+    monkeypatch.setattr(ide_query, "MAX_LIMIT", 5)
+    monkeypatch.setattr(ide_server, "MAX_LIMIT", 5)
+
+    ids, after = [], 0
+    while True:
+        _, headers, body = get(f"{base_url}/tiles/0/0/0.geojson?after={after}")
+        ids.extend(f["id"] for f in body["features"])
+        if "X-Next-Cursor" not in headers:
+            break
+        after = int(headers["X-Next-Cursor"])
+        assert body["next"] == after
+
+    assert len(ids) == len(set(ids)) == FEATURES
+
+
+def test_numeric_attribute_filter(base_url):
+    status, _, body = get(f"{base_url}/features?attr.CODIGO=8103")
+    assert status == 200
+    assert [f["properties"]["CODIGO"] for f in body["features"]] == [8103]
+
+    _, _, body = get(f"{base_url}/features?attr.NOMBRE=Rio%203")
+    assert [f["properties"]["NOMBRE"] for f in body["features"]] == ["Rio 3"]
+
+    _, _, body = get(f"{base_url}/features?attr.TEXTO=0011")
+    assert [f["properties"]["TEXTO"] for f in body["features"]] == ["0011"]
+
+
+def test_database_errors_are_json_500(base_url, monkeypatch):
+    def broken(conn, **query):
+        raise sqlite3.OperationalError("database disk image is malformed")
+
+    monkeypatch.setattr(ide_server, "stream_geojson", broken)
+    status, _, body = get(f"{base_url}/features")
+    assert status == 500
+    assert "OperationalError" in body["error"]
@@ -0,0 +1,53 @@
+"""Hilbert keys: a continuous ordering of grid cells"""
+
+import pytest
+
+from ide_sfc import HILBERT_ORDER, hilbert_key
+
+ORDER = 4
+SIDE = 1 << ORDER
+
+
+def cell_center(x, y, side=SIDE):
+    return (x + 0.5) / side * 360 - 180, (y + 0.5) / side * 180 - 90
+
+
+@pytest.fixture(scope="module")
+def cells():
+    """Grid cell of every key at ORDER, in curve order"""
+    keyed = {hilbert_key(*cell_center(x, y), order=ORDER): (x, y) for x in range(SIDE) for y in range(SIDE)}
+    assert sorted(keyed) == list(range(SIDE * SIDE))
+    return [keyed[key] for key in range(SIDE * SIDE)]
+
+
+def test_curve_starts_and_ends_on_the_south_edge(cells):
+    assert cells[0] == (0, 0)
+    assert cells[-1] == (SIDE - 1, 0)
+
+
+def test_consecutive_keys_are_neighbouring_cells(cells):
+    for (x1, y1), (x2, y2) in zip(cells, cells[1:]):
+        assert abs(x1 - x2) + abs(y1 - y2) == 1
+
+
+def test_quadrants_are_contiguous_key_ranges(cells):
+    # Each quarter of the curve fills one quadrant of the grid before moving on
+    half = SIDE // 2
+    for quarter in range(4):
+        run = cells[quarter * half * half:(quarter + 1) * half * half]
+        assert len({(x // half, y // half) for x, y in run}) == 1
+
+
+def test_nearby_positions_get_nearby_keys():
+    santiago = hilbert_key(-70.65, -33.45)
+    maipu = hilbert_key(-70.67, -33.46)  # ~2 km away
+    valparaiso = hilbert_key(-71.62, -33.05)  # ~100 km away
+    assert santiago != maipu
+    assert abs(santiago - maipu) < abs(santiago - valparaiso)
+
+
+def test_edges_and_missing_positions():
+    assert hilbert_key(None, -33.4) is None
+    assert hilbert_key(-70.6, None) is None
+    assert 0 <= hilbert_key(180.0, 90.0) < 1 << (2 * HILBERT_ORDER)
+    assert hilbert_key(-180.0, -90.0) == 0
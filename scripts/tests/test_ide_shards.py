@@ -0,0 +1,104 @@
+"""Per-region shards against the index DB, and pruning of removed regions"""
+
+import json
+import os
+import sqlite3
+
+import pytest
+
+from ide_admin import assign_admin_areas
+from ide_aggregates import refresh_aggregates
+from ide_pipeline import insert_layer_row, upload
+from ide_search import build_fts_index
+from ide_shards import INDEX_NAME, MANIFEST_NAME, build_shards, shard_db_name
+
+DB_NAME = "ide-test"
+
+
+def square(west, south, east, north):
+    return {"type": "Polygon", "coordinates": [[[west, south], [east, south], [east, north],
+                                                [west, north], [west, south]]]}
+
+
+def feature(geometry, **properties):
+    return {"type": "Feature", "geometry": geometry, "properties": properties}
+
+
+@pytest.fixture
+def national_db(tmp_path):
+    path = str(tmp_path / "national.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(upload.SCHEMA)
+    layers = {
+        "limites-regiones_layer0": [
+            feature(square(-72, -34, -71, -33), CUT_REG="05"),
+            feature(square(-71, -34, -70, -33), CUT_REG="13"),
+        ],
+        "rios_layer0": [
+            feature({"type": "Point", "coordinates": [-71.5, -33.5]}, NOMBRE="Costa"),
+            feature({"type": "Point", "coordinates": [-70.5, -33.5]}, NOMBRE="Santiago"),
+            feature({"type": "Point", "coordinates": [-60.0, -20.0]}, NOMBRE="Fuera"),
+            feature({"type": "LineString", "coordinates": [[-71.6, -33.6], [-70.2, -33.6]]}, NOMBRE="Maipo"),
+        ],
+    }
+    for layer_id, features in layers.items():
+        upload.insert_features(conn, layer_id, features)
+        insert_layer_row(conn, layer_id)
+    assign_admin_areas(conn)
+    build_fts_index(conn)
+    refresh_aggregates(conn)
+    # Shards copy columns by name, not by position
+    conn.execute("ALTER TABLE features ADD COLUMN extra TEXT")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def feature_ids(path, sql, params=()):
+    conn = sqlite3.connect(path)
+    try:
+        return {row[0] for row in conn.execute(sql, params)}
+    finally:
+        conn.close()
+
+
+def test_shards_match_index(national_db, tmp_path):
+    out = str(tmp_path / "shards")
+    shards = build_shards(national_db, out, upload.SCHEMA, DB_NAME, workers=1)
+    index_path = os.path.join(out, f"{INDEX_NAME}.db")
+
+    assert {s["regionCode"] for s in shards} == {"00", "05", "13"}
+    assert feature_ids(index_path, "SELECT file FROM shards") == {s["file"] for s in shards}
+    assert sorted(f for f in os.listdir(out) if f != f"{INDEX_NAME}.db") == sorted(s["file"] for s in shards)
+
+    river = "SELECT id FROM features WHERE layer_id = 'rios_layer0' AND properties LIKE ?"
+    maipo = feature_ids(national_db, river, ("%Maipo%",))
+    for shard in shards:
+        code = shard["regionCode"]
+        held = feature_ids(os.path.join(out, shard["file"]), "SELECT id FROM features")
+        assert held == feature_ids(index_path, "SELECT feature_id FROM feature_shards WHERE region_code = ?",
+                                   (code,))
+        assert shard["features"] == len(held)
+        if code != "00":
+            assert maipo <= held
+    assert feature_ids(national_db, river, ("%Fuera%",)) == \
+        feature_ids(os.path.join(out, f"{shard_db_name(DB_NAME, '00')}.db"), "SELECT id FROM features")
+
+
+def test_removed_regions_are_pruned(national_db, tmp_path):
+    out = tmp_path / "shards"
+    out.mkdir()
+    stale = shard_db_name(DB_NAME, "99")
+    (out / f"{stale}.db").write_bytes(b"")
+    (out / "other.db").write_bytes(b"")
+    (out / MANIFEST_NAME).write_text(json.dumps({
+        stale: "old", shard_db_name(DB_NAME, "13"): "old", "another-db": "kept",
+    }))
+
+    build_shards(national_db, str(out), upload.SCHEMA, DB_NAME, workers=1)
+
+    assert not (out / f"{stale}.db").exists()
+    assert (out / "other.db").exists()
+    assert json.loads((out / MANIFEST_NAME).read_text()) == {
+        shard_db_name(DB_NAME, "13"): "old", "another-db": "kept",
+    }
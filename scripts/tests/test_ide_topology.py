@@ -0,0 +1,82 @@
+"""TopoJSON encode/decode round trip of adjacent and holed polygons"""
+
+import pytest
+
+from ide_topology import decode_arcs, decode_topology, encode_topology
+
+# Two unit squares sharing the x=1 border, and a square with a hole
+WEST = [[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]
+EAST = [[1, 0], [2, 0], [2, 1], [1, 1], [1, 0]]
+OUTER = [[0, 2], [2, 2], [2, 4], [0, 4], [0, 2]]
+HOLE = [[0.5, 2.5], [0.5, 3.5], [1.5, 3.5], [1.5, 2.5], [0.5, 2.5]]
+
+OBJECTS = {
+    "limites-regiones_layer0": [
+        (1, {"type": "Polygon", "coordinates": [WEST]}),
+        (2, {"type": "Polygon", "coordinates": [EAST]}),
+        (3, {"type": "Polygon", "coordinates": [OUTER, HOLE]}),
+    ],
+    # The same region again one level down, as the boundary layers repeat borders
+    "limites-provincias_layer0": [
+        (4, {"type": "MultiPolygon", "coordinates": [[WEST], [EAST]]}),
+    ],
+}
+
+
+def canonical(ring):
+    """Ring without its closing point, rotated to start at its smallest vertex"""
+    points = [(round(x, 6), round(y, 6)) for x, y in ring]
+    if points[0] == points[-1]:
+        points = points[:-1]
+    start = points.index(min(points))
+    return points[start:] + points[:start]
+
+
+def polygons(geometry):
+    coords = geometry["coordinates"]
+    return [coords] if geometry["type"] == "Polygon" else coords
+
+
+def arc_ids(geometry):
+    refs = geometry["arcs"] if geometry["type"] == "MultiPolygon" else [geometry["arcs"]]
+    return {ref if ref >= 0 else ~ref for polygon in refs for ring in polygon for ref in ring}
+
+
+@pytest.fixture(scope="module")
+def topology():
+    # 201 steps over [0, 2] x [0, 4] keeps every test vertex on the grid
+    return encode_topology(OBJECTS, quantization=201)
+
+
+def test_decode_returns_every_ring(topology):
+    decoded = decode_topology(topology)
+
+    assert decoded.keys() == OBJECTS.keys()
+    for layer_id, features in OBJECTS.items():
+        assert [fid for fid, _ in decoded[layer_id]] == [fid for fid, _ in features]
+        for (_, original), (_, geometry) in zip(features, decoded[layer_id]):
+            assert geometry["type"] == original["type"]
+            assert [[canonical(r) for r in p] for p in polygons(geometry)] == \
+                   [[canonical(r) for r in p] for p in polygons(original)]
+
+
+def test_shared_border_is_one_arc(topology):
+    west, east, holed = (g for g in topology["objects"]["limites-regiones_layer0"]["geometries"])
+
+    shared = arc_ids(west) & arc_ids(east)
+    assert len(shared) == 1
+    border = decode_arcs(topology)[shared.pop()]
+    assert sorted((round(x, 6), round(y, 6)) for x, y in border) == [(1, 0), (1, 1)]
+
+    # No other arc repeats the border, and the hole has its own closed arc
+    assert not arc_ids(holed) & (arc_ids(west) | arc_ids(east))
+    assert len(arc_ids(holed)) == 2
+
+
+def test_repeated_levels_reuse_arcs(topology):
+    regions = topology["objects"]["limites-regiones_layer0"]["geometries"]
+    [province] = topology["objects"]["limites-provincias_layer0"]["geometries"]
+
+    assert arc_ids(province) == arc_ids(regions[0]) | arc_ids(regions[1])
+    # Border, west rest, east rest; outer ring and hole of the third polygon
+    assert len(topology["arcs"]) == 3 + 2
@@ -0,0 +1,97 @@
+"""tts_audio: pitch-preserving stretch, slide fitting and streamed concatenation"""
+
+import wave
+
+import numpy as np
+import pytest
+
+from tts_audio import (CHUNK_FRAMES, StreamConcatenator, fit_to_duration, process_from_args, read_pcm,
+                       time_stretch, write_pcm)
+from tts_engine import SAMPLE_RATE
+
+
+def tone(seconds, frequency=220.0, amplitude=10000):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype("<i2")
+
+
+def dominant_frequency(samples):
+    # Middle half only, away from the fade-in/out of the first and last frames
+    middle = samples[len(samples) // 4:3 * len(samples) // 4].astype(np.float64)
+    spectrum = np.abs(np.fft.rfft(middle * np.hanning(len(middle)), n=8 * SAMPLE_RATE))
+    return np.argmax(spectrum) * SAMPLE_RATE / (8 * SAMPLE_RATE)
+
+
+@pytest.mark.parametrize("rate", [0.9, 1.2, 1.5])
+def test_stretch_keeps_pitch(rate):
+    samples = tone(2.0)
+    stretched = time_stretch(samples, rate)
+    assert stretched.dtype == np.dtype("<i2")
+    assert len(stretched) == int(len(samples) / rate)
+    assert dominant_frequency(stretched) == pytest.approx(220.0, abs=1.0)
+
+
+@pytest.mark.parametrize("rate", [0, -1.2])
+def test_stretch_rejects_non_positive_rate(rate):
+    with pytest.raises(ValueError):
+        time_stretch(tone(0.1), rate)
+
+
+def test_fit_pads_short_speech_to_target():
+    fitted, rate = fit_to_duration(tone(1.0), 2.0)
+    assert rate == 0.9
+    assert len(fitted) == 2 * SAMPLE_RATE
+    assert not fitted[int(SAMPLE_RATE / 0.9):].any()
+
+    unpadded, _ = fit_to_duration(tone(1.0), 2.0, pad=False)
+    assert len(unpadded) == int(SAMPLE_RATE / 0.9)
+
+
+def test_fit_keeps_long_speech_whole():
+    fitted, rate = fit_to_duration(tone(3.0), 1.0)
+    assert rate == 1.5
+    assert len(fitted) == 2 * SAMPLE_RATE
+
+
+def test_fit_leaves_close_speech_untouched():
+    samples = tone(1.0)
+    fitted, rate = fit_to_duration(samples, 1.01)
+    assert rate == 1.0
+    assert np.array_equal(fitted[:len(samples)], samples)
+
+
+def test_concatenator_counts_frames_with_gaps(tmp_path):
+    slide = tmp_path / "slide.wav"
+    write_pcm(str(slide), tone(0.1))
+    long_slide = tone(3.0)
+    assert len(long_slide) > CHUNK_FRAMES
+
+    path = str(tmp_path / "full.wav")
+    with StreamConcatenator(path) as out:
+        out.append(long_slide)
+        out.append_silence(0.5)
+        out.append_file(str(slide))
+        out.append_silence(0.25)
+        out.append(tone(0.05))
+        expected = len(long_slide) + SAMPLE_RATE // 2 + 2400 + SAMPLE_RATE // 4 + 1200
+        assert out.frames == expected
+        assert out.seconds == pytest.approx(expected / SAMPLE_RATE)
+
+    with wave.open(path, "rb") as wav_file:
+        assert wav_file.getnframes() == expected
+    samples = read_pcm(path)
+    gap = samples[len(long_slide):len(long_slide) + SAMPLE_RATE // 2]
+    assert len(gap) == SAMPLE_RATE // 2 and not gap.any()
+    assert np.array_equal(samples[:len(long_slide)], long_slide)
+
+
+@pytest.mark.parametrize("argv", [
+    ["--speed", "0"],
+    ["--speed", "-1.2"],
+    ["--fit", "--min-rate", "0"],
+    ["--fit", "--max-rate", "-1"],
+    ["--fit", "--min-rate", "1.4", "--max-rate", "1.2"],
+])
+def test_non_positive_rates_are_rejected(argv):
+    with pytest.raises(ValueError):
+        process_from_args({}, ["tts_audio.py", "script.json", *argv])
@@ -0,0 +1,122 @@
+"""tts_engine against MockClient: concurrency, retries and the slide cache"""
+
+import json
+import os
+import threading
+
+import pytest
+
+import tts_engine
+from tts_engine import MockClient, generate_script, run_from_args, slide_cache_key
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(tts_engine, "BACKOFF_BASE", 0.001)
+    monkeypatch.setattr(tts_engine, "BACKOFF_MAX", 0.01)
+
+
+def make_script(output_dir, texts):
+    return {
+        "title": "Test", "model": "test-model", "voice": "Test", "language": "English",
+        "outputDir": str(output_dir), "stylePrefix": "Calmly.",
+        "slides": [{"id": f"{i:02d}_slide", "title": f"Slide {i}", "text": text}
+                   for i, text in enumerate(texts)],
+    }
+
+
+class InFlightClient(MockClient):
+    """MockClient recording the most requests it served at once"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.counter_lock = threading.Lock()
+
+    def _start_request(self, contents):
+        with self.counter_lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return super()._start_request(contents)
+        finally:
+            with self.counter_lock:
+                self.in_flight -= 1
+
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_concurrency_is_bounded(tmp_path, stream):
+    script = make_script(tmp_path, [f"Slide number {i}." for i in range(6)])
+    client = InFlightClient(latency=0.05)
+
+    results = generate_script(script, client, concurrency=3, stream=stream)
+
+    assert [r["status"] for r in results] == ["generated"] * 6
+    assert client.max_in_flight == 3
+    assert all(os.path.getsize(r["path"]) > 44 for r in results)
+
+
+def test_retries_recover_from_injected_failures(tmp_path):
+    script = make_script(tmp_path, [f"Slide number {i}." for i in range(8)])
+    client = MockClient(failure_rate=0.5, seed=1)
+
+    results = generate_script(script, client, concurrency=2, retries=10)
+
+    assert all(r["status"] == "generated" for r in results)
+    assert any(r["attempts"] > 1 for r in results)
+    assert client.calls == sum(r["attempts"] for r in results)
+
+
+def test_exhausted_retries_fail_without_cache_entry(tmp_path):
+    script = make_script(tmp_path, ["Never spoken."])
+
+    [result] = generate_script(script, MockClient(failure_rate=1.0), retries=2)
+
+    assert result["status"] == "failed"
+    assert result["attempts"] == 3
+    assert not os.path.exists(result["path"])
+    assert os.listdir(tmp_path / tts_engine.CACHE_DIRNAME) == []
+
+
+def test_cache_hits_and_misses(tmp_path):
+    script = make_script(tmp_path, ["First slide.", "Second slide."])
+    client = MockClient()
+
+    first = generate_script(script, client)
+    assert [r["status"] for r in first] == ["generated", "generated"]
+
+    second = generate_script(script, client)
+    assert [r["status"] for r in second] == ["cached", "cached"]
+    assert client.calls == 2
+
+    script["slides"][1]["text"] = "Second slide, reworded."
+    third = generate_script(script, client)
+    assert [r["status"] for r in third] == ["cached", "generated"]
+
+    forced = generate_script(script, client, force=True)
+    assert [r["status"] for r in forced] == ["generated", "generated"]
+
+
+def test_mock_cache_entries_never_answer_real_requests(tmp_path):
+    script = make_script(tmp_path, ["Same text."])
+    slide = script["slides"][0]
+
+    assert slide_cache_key(script, slide, "mock") != slide_cache_key(script, slide)
+
+    [result] = generate_script(script, MockClient())
+    assert result["key"] == slide_cache_key(script, slide, "mock")[:12]
+    assert not os.path.exists(tmp_path / tts_engine.CACHE_DIRNAME / f"{slide_cache_key(script, slide)}.wav")
+
+
+def test_mock_run_writes_to_separate_output(tmp_path):
+    script_path = tmp_path / "script.json"
+    output_dir = tmp_path / "audio"
+    script_path.write_text(json.dumps(make_script(output_dir, ["Hello there."])))
+
+    script, results = run_from_args(str(script_path), None, ["prog", "--mock"])
+
+    assert script["outputDir"] == f"{output_dir}-mock"
+    assert results[0]["status"] == "generated"
+    assert os.path.exists(f"{output_dir}-mock/00_slide.wav")
+    assert not output_dir.exists()
@@ -0,0 +1,51 @@
+"""upload-to-turso.py geometry sharing and in-layer repeats"""
+
+import sqlite3
+
+import pytest
+
+from ide_pipeline import upload
+
+SHAPE = {"type": "Polygon", "coordinates": [[[-70.6, -33.4], [-70.5, -33.4], [-70.5, -33.3], [-70.6, -33.4]]]}
+
+
+def feature(name, geometry=SHAPE):
+    return {"type": "Feature", "geometry": geometry, "properties": {"NOMBRE": name}}
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(upload.SCHEMA)
+    yield conn
+    conn.close()
+
+
+def layer_rows(conn, layer_id):
+    return conn.execute("""
+        SELECT g.geometry FROM features f JOIN geometries g ON g.id = f.geometry_id
+        WHERE f.layer_id = ? ORDER BY f.id
+    """, (layer_id,)).fetchall()
+
+
+def test_layers_share_geometry_and_repeats_are_skipped(conn):
+    repeated = [feature("A"), feature("A"), feature("B")]
+    assert upload.insert_features(conn, "layer_a", repeated) == 1
+    assert upload.insert_features(conn, "layer_b", [feature("A")]) == 0
+
+    assert conn.execute("SELECT COUNT(*) FROM geometries").fetchone()[0] == 1
+    assert len(layer_rows(conn, "layer_a")) == 2
+    assert layer_rows(conn, "layer_b") == layer_rows(conn, "layer_a")[:1]
+
+
+def test_repeats_across_batches_need_shared_seen(conn):
+    seen = set()
+    assert upload.insert_features(conn, "layer_a", [feature("A")], cluster=False, seen=seen) == 0
+    assert upload.insert_features(conn, "layer_a", [feature("A")], cluster=False, seen=seen) == 1
+    assert len(layer_rows(conn, "layer_a")) == 1
+
+
+def test_coordinates_are_rounded_to_seven_decimals(conn):
+    point = {"type": "Point", "coordinates": [-70.123456789, -33.987654321]}
+    upload.insert_features(conn, "layer_a", [feature("A", point)])
+    assert layer_rows(conn, "layer_a") == [('{"type":"Point","coordinates":[-70.1234568,-33.9876543]}',)]
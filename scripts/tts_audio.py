@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+In-process audio post-processing for the generated presentation slides
+
+Works directly on the 24 kHz, 16-bit mono PCM written by tts_engine.pcm_to_wav,
+replacing the ffmpeg atempo pass and the hand-run ffmpeg concat:
+
+- time_stretch: pitch-preserving WSOLA (waveform similarity overlap-add).
+  Each output frame is the input frame near its nominal position that best
+  continues the previous one, found by cross-correlation, so speech speeds
+  up without the chipmunk pitch shift of plain resampling.
+- fit_to_duration: stretches a slide towards its script `duration`, within
+  a rate range, then pads with silence so slides line up with the visuals.
+- StreamConcatenator: appends slides and gaps to one open WAV in chunks
+  through memoryviews, so the full presentation is never held in memory.
+
+Usage:
+    python3 tts_audio.py tts-scripts/presentation.json [--fit | --speed 1.2] [--gap 0.5]
+                         [--min-rate 0.9] [--max-rate 1.5] [--output full_presentation.wav] [--mock]
+"""
+
+import os
+import sys
+import wave
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from tts_engine import SAMPLE_RATE, SAMPLE_WIDTH, CHANNELS, script_for_args
+
+FRAME_MS = 30
+SEARCH_MS = 10
+
+DEFAULT_GAP = 0.5
+DEFAULT_MIN_RATE = 0.9
+DEFAULT_MAX_RATE = 1.5
+# Slides within this fraction of their target are left untouched
+FIT_TOLERANCE = 0.02
+
+CHUNK_FRAMES = 1 << 16
+
+PROCESSED_DIRNAME = "processed"
+DEFAULT_OUTPUT = "full_presentation.wav"
+
+
+def read_pcm(path: str) -> np.ndarray:
+    """Samples of a 16-bit mono WAV as int16"""
+    with wave.open(path, "rb") as wav_file:
+        if wav_file.getsampwidth() != SAMPLE_WIDTH or wav_file.getnchannels() != CHANNELS:
+            raise ValueError(f"{path}: expected 16-bit mono PCM")
+        if wav_file.getframerate() != SAMPLE_RATE:
+            raise ValueError(f"{path}: expected {SAMPLE_RATE} Hz, got {wav_file.getframerate()}")
+        return np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype="<i2")
+
+
+def write_pcm(path: str, samples: np.ndarray, sample_rate: int = SAMPLE_RATE):
+    with StreamConcatenator(path, sample_rate) as out:
+        out.append(samples)
+
+
+def to_pcm16(samples: np.ndarray) -> np.ndarray:
+    """Float samples in int16 range back to little-endian int16, clipped"""
+    return np.clip(np.rint(samples), -32768, 32767).astype("<i2")
+
+
+def time_stretch(samples: np.ndarray, rate: float, sample_rate: int = SAMPLE_RATE,
+                 frame_ms: float = FRAME_MS, search_ms: float = SEARCH_MS) -> np.ndarray:
+    """Change tempo by `rate` (1.2 = 20% faster) keeping the pitch, WSOLA style"""
+    if rate <= 0:
+        raise ValueError(f"rate must be positive, got {rate}")
+    if abs(rate - 1.0) < 1e-6 or len(samples) == 0:
+        return samples.astype("<i2", copy=False)
+
+    frame = int(sample_rate * frame_ms / 1000) // 2 * 2
+    hop = frame // 2
+    tolerance = int(sample_rate * search_ms / 1000)
+    # Periodic Hann windows at 50% overlap sum to one
+    window = 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(frame) / frame)
+
+    pad = tolerance + frame
+    x = np.concatenate([np.zeros(pad), samples.astype(np.float64), np.zeros(pad + frame)])
+
+    out_length = int(len(samples) / rate)
+    frames = out_length // hop + 1
+    y = np.zeros(frames * hop + frame)
+    weight = np.zeros_like(y)
+
+    previous = pad
+    for k in range(frames):
+        nominal = pad + int(round(k * hop * rate))
+        if k == 0:
+            position = nominal
+        else:
+            # Candidate frames around the nominal position, scored against the
+            # natural continuation of the previous frame
+            template = x[previous + hop:previous + hop + frame]
+            region = x[nominal - tolerance:nominal + tolerance + frame]
+            scores = sliding_window_view(region, frame) @ template
+            position = nominal - tolerance + int(np.argmax(scores))
+
+        start = k * hop
+        y[start:start + frame] += x[position:position + frame] * window
+        weight[start:start + frame] += window
+        previous = position
+
+    y = y[:out_length]
+    weight = weight[:out_length]
+    np.divide(y, weight, out=y, where=weight > 1e-3)
+    return to_pcm16(y)
+
+
+def fit_rate(frames: int, target_seconds: float, sample_rate: int = SAMPLE_RATE,
+             min_rate: float = DEFAULT_MIN_RATE, max_rate: float = DEFAULT_MAX_RATE) -> float:
+    """Tempo change bringing `frames` closest to the target length within the rate range"""
+    if not target_seconds or not frames:
+        return 1.0
+    rate = frames / (target_seconds * sample_rate)
+    if abs(rate - 1.0) <= FIT_TOLERANCE:
+        return 1.0
+    return min(max(rate, min_rate), max_rate)
+
+
+def fit_to_duration(samples: np.ndarray, target_seconds: float, sample_rate: int = SAMPLE_RATE,
+                    min_rate: float = DEFAULT_MIN_RATE, max_rate: float = DEFAULT_MAX_RATE,
+                    pad: bool = True) -> Tuple[np.ndarray, float]:
+    """Stretch a slide towards target_seconds, returns (samples, rate)
+
+    Speech that is still short after the slowest allowed rate is padded with
+    trailing silence; speech still long after the fastest rate is kept whole.
+    """
+    rate = fit_rate(len(samples), target_seconds, sample_rate, min_rate, max_rate)
+    stretched = time_stretch(samples, rate, sample_rate)
+
+    missing = int(target_seconds * sample_rate) - len(stretched) if target_seconds else 0
+    if pad and missing > 0:
+        stretched = np.concatenate([stretched, np.zeros(missing, dtype="<i2")])
+    return (stretched, rate)
+
+
+class StreamConcatenator:
+    """Open WAV writer that slides and silences are appended to chunk by chunk"""
+
+    def __init__(self, path: str, sample_rate: int = SAMPLE_RATE):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.frames = 0
+        self.silence = memoryview(bytes(CHUNK_FRAMES * SAMPLE_WIDTH))
+        self.wav_file = wave.open(path, "wb")
+        self.wav_file.setnchannels(CHANNELS)
+        self.wav_file.setsampwidth(SAMPLE_WIDTH)
+        self.wav_file.setframerate(sample_rate)
+
+    def __enter__(self) -> "StreamConcatenator":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, samples):
+        """Append int16 samples (ndarray or any PCM buffer) without copying them"""
+        view = memoryview(samples).cast("B")
+        step = CHUNK_FRAMES * SAMPLE_WIDTH
+        for start in range(0, len(view), step):
+            self.wav_file.writeframes(view[start:start + step])
+        self.frames += len(view) // SAMPLE_WIDTH
+
+    def append_file(self, path: str):
+        """Append a WAV file, reading it one chunk at a time"""
+        with wave.open(path, "rb") as wav_file:
+            if wav_file.getframerate() != self.sample_rate or wav_file.getsampwidth() != SAMPLE_WIDTH:
+                raise ValueError(f"{path}: format differs from {self.path}")
+            while True:
+                chunk = wav_file.readframes(CHUNK_FRAMES)
+                if not chunk:
+                    break
+                self.wav_file.writeframes(chunk)
+                self.frames += len(chunk) // SAMPLE_WIDTH
+
+    def append_silence(self, seconds: float):
+        remaining = int(seconds * self.sample_rate) * SAMPLE_WIDTH
+        while remaining > 0:
+            step = min(remaining, len(self.silence))
+            self.wav_file.writeframes(self.silence[:step])
+            remaining -= step
+        self.frames += int(seconds * self.sample_rate)
+
+    @property
+    def seconds(self) -> float:
+        return self.frames / self.sample_rate
+
+    def close(self):
+        self.wav_file.close()
+
+
+def process_script(script: Dict[str, Any], fit: bool = False, speed: Optional[float] = None,
+                   gap: float = DEFAULT_GAP, min_rate: float = DEFAULT_MIN_RATE,
+                   max_rate: float = DEFAULT_MAX_RATE, output_name: str = DEFAULT_OUTPUT) -> List[Dict[str, Any]]:
+    """Time-stretch each generated slide and stream them into one presentation WAV
+
+    With neither fit nor speed the slides are concatenated as they are. Stretched
+    slides are also written to <outputDir>/processed/ for per-slide playback.
+    """
+    output_dir = script["outputDir"]
+    processed_dir = os.path.join(output_dir, PROCESSED_DIRNAME)
+    if fit or speed:
+        os.makedirs(processed_dir, exist_ok=True)
+
+    results = []
+    output_path = os.path.join(output_dir, output_name)
+    with StreamConcatenator(output_path) as out:
+        for i, slide in enumerate(script["slides"]):
+            path = os.path.join(output_dir, f"{slide['id']}.wav")
+            if not os.path.exists(path):
+                print(f"  ⚠️  Missing {path}, skipped")
+                continue
+            if i and out.frames:
+                out.append_silence(gap)
+
+            if fit or speed:
+                samples = read_pcm(path)
+                if fit:
+                    stretched, rate = fit_to_duration(samples, slide.get("duration"), min_rate=min_rate,
+                                                      max_rate=max_rate)
+                else:
+                    stretched, rate = time_stretch(samples, speed), speed
+                write_pcm(os.path.join(processed_dir, f"{slide['id']}.wav"), stretched)
+                out.append(stretched)
+                source_seconds, seconds = len(samples) / SAMPLE_RATE, len(stretched) / SAMPLE_RATE
+            else:
+                start = out.frames
+                out.append_file(path)
+                rate, source_seconds = 1.0, (out.frames - start) / SAMPLE_RATE
+                seconds = source_seconds
+
+            results.append({"id": slide["id"], "target": slide.get("duration"), "source_seconds": round(source_seconds, 2),
+                            "rate": round(rate, 3), "seconds": round(seconds, 2)})
+        total = out.seconds
+
+    print(f"\n{'Slide':<26} {'Target':>7} {'Source':>8} {'Rate':>6} {'Output':>8}")
+    print("-" * 59)
+    for r in results:
+        target = f"{r['target']}s" if r["target"] else "-"
+        print(f"{r['id'][:26]:<26} {target:>7} {r['source_seconds']:>7.1f}s {r['rate']:>6.2f} {r['seconds']:>7.1f}s")
+    print(f"\n🎧 {output_path}: {total:.1f}s ({len(results)} slides, {gap}s gaps)")
+    return results
+
+
+def process_from_args(script: Dict[str, Any], argv=None) -> List[Dict[str, Any]]:
+    """process_script honouring --fit, --speed, --gap, --min-rate, --max-rate and --output"""
+    argv = sys.argv if argv is None else argv
+    options: Dict[str, Any] = {"fit": "--fit" in argv}
+    for i, arg in enumerate(argv):
+        if arg == "--speed":
+            options["speed"] = float(argv[i + 1])
+        elif arg == "--gap":
+            options["gap"] = float(argv[i + 1])
+        elif arg == "--min-rate":
+            options["min_rate"] = float(argv[i + 1])
+        elif arg == "--max-rate":
+            options["max_rate"] = float(argv[i + 1])
+        elif arg == "--output":
+            options["output_name"] = argv[i + 1]
+
+    for flag, key in (("--speed", "speed"), ("--min-rate", "min_rate"), ("--max-rate", "max_rate")):
+        if key in options and options[key] <= 0:
+            raise ValueError(f"{flag} must be positive, got {options[key]}")
+    if options.get("min_rate", DEFAULT_MIN_RATE) > options.get("max_rate", DEFAULT_MAX_RATE):
+        raise ValueError("--min-rate must not exceed --max-rate")
+
+    mode = "fit to slide durations" if options["fit"] else \
+        f"{options['speed']}x speed" if options.get("speed") else "concatenate only"
+    print(f"\n⚡ Audio post-processing: {mode}")
+    return process_script(script, **options)
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1].startswith("--"):
+        print(__doc__)
+        sys.exit(1)
+
+    process_from_args(script_for_args(sys.argv[1]))
+
+
+if __name__ == "__main__":
+    main()
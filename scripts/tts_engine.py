@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+"""
+Shared TTS generation engine for the LeDesign presentation scripts
+
+Presentation scripts are data: tts-scripts/*.json holds the model, voice,
+output directory, a style prefix shared by every slide, and the slides
+themselves (id, text, style, target duration in seconds).
+
+Slides are synthesized concurrently up to a limit, each call retried with
+exponential backoff, and every result is cached by the hash of its text,
+style, language, voice and model. Re-running a script only sends the slides
+that changed to Gemini; the rest are copied from <outputDir>/.tts-cache/.
+
+By default responses are streamed: PCM chunks go into an open WAV writer as
+they arrive, so memory stays at one chunk per slide, and each slide reports
+its time to first audio next to the total request latency (--no-stream
+waits for the whole response instead).
+
+MockClient stands in for genai.Client and returns a tone whose length
+follows the text, so the whole flow runs offline (--mock). Mock runs write
+to <outputDir>-mock/ and the client is part of the cache key, so tones never
+replace real narration or answer for it from the cache.
+
+Usage:
+    python3 tts_engine.py tts-scripts/presentation.json [--concurrency 3] [--retries 4]
+                          [--force] [--no-stream] [--mock] [--mock-failure-rate 0.3]
+                          [--mock-latency 0.5] [--mock-chunk-latency 0.1]
+"""
+
+import hashlib
+import json
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+import wave
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Dict, List, Any, Callable, Iterator, Optional, Tuple
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Gemini TTS returns 24 kHz, 16-bit, mono PCM
+SAMPLE_RATE = 24000
+SAMPLE_WIDTH = 2
+CHANNELS = 1
+
+DEFAULT_MODEL = "gemini-2.5-flash-preview-tts"
+DEFAULT_VOICE = "Charon"
+DEFAULT_LANGUAGE = "Spanish (Latin American, Chilean accent)"
+
+DEFAULT_CONCURRENCY = 3
+DEFAULT_RETRIES = 4
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+
+CACHE_DIRNAME = ".tts-cache"
+MOCK_OUTPUT_SUFFIX = "-mock"
+
+# Slides finish on worker threads; keep their progress lines whole
+PRINT_LOCK = threading.Lock()
+
+
+class NoAudioError(Exception):
+    """The model answered without any audio parts"""
+
+
+def log(message: str):
+    with PRINT_LOCK:
+        print(message, flush=True)
+
+
+def load_script(path: str) -> Dict[str, Any]:
+    """Load a presentation script definition, filling in defaults"""
+    with open(path, encoding="utf-8") as f:
+        script = json.load(f)
+
+    script.setdefault("model", DEFAULT_MODEL)
+    script.setdefault("voice", DEFAULT_VOICE)
+    script.setdefault("language", DEFAULT_LANGUAGE)
+    script.setdefault("stylePrefix", "")
+    script.setdefault("title", os.path.splitext(os.path.basename(path))[0])
+
+    ids = [slide["id"] for slide in script["slides"]]
+    duplicates = sorted({i for i in ids if ids.count(i) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate slide ids in {path}: {', '.join(duplicates)}")
+    return script
+
+
+def slide_style(script: Dict[str, Any], slide: Dict[str, Any]) -> str:
+    """Full style prompt of a slide: the script's prefix plus the slide's own style"""
+    return " ".join(part for part in (script["stylePrefix"], slide.get("style", "")) if part)
+
+
+def build_prompt(script: Dict[str, Any], slide: Dict[str, Any]) -> str:
+    """Prompt sent to the TTS model for one slide"""
+    return f"""Style: {slide_style(script, slide)}
+
+Language: {script['language']}
+
+Text: {slide['text']}"""
+
+
+def cache_key(text: str, style: str, language: str, voice: str, model: str, client: str = "gemini") -> str:
+    """Content hash identifying one synthesized slide and the client that made it"""
+    payload = json.dumps([text, style, language, voice, model, client], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def client_tag(client) -> str:
+    """Cache marker of a client: "gemini" for the real API, MockClient.cache_tag otherwise"""
+    return getattr(client, "cache_tag", "gemini")
+
+
+def slide_cache_key(script: Dict[str, Any], slide: Dict[str, Any], client: str = "gemini") -> str:
+    return cache_key(slide["text"], slide_style(script, slide), script["language"],
+                     script["voice"], script["model"], client)
+
+
+def pcm_to_wav(pcm_data: bytes, output_path: str, sample_rate: int = SAMPLE_RATE):
+    """
+    Convert PCM audio data to WAV file format
+
+    Args:
+        pcm_data: Raw PCM audio bytes
+        output_path: Path to save WAV file
+        sample_rate: Sample rate (default 24000 Hz for Gemini TTS)
+    """
+    with wave.open(output_path, 'wb') as wav_file:
+        wav_file.setnchannels(CHANNELS)
+        wav_file.setsampwidth(SAMPLE_WIDTH)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm_data)
+
+
+def speech_config(voice: str):
+    """GenerateContentConfig asking for audio in the given prebuilt voice"""
+    try:
+        from google.genai import types
+    except ImportError:
+        # The SDK accepts the same config as a plain dict; this also keeps MockClient SDK-free
+        return {
+            "response_modalities": ["AUDIO"],
+            "speech_config": {"voice_config": {"prebuilt_voice_config": {"voice_name": voice}}},
+        }
+
+    return types.GenerateContentConfig(
+        response_modalities=["AUDIO"],
+        speech_config=types.SpeechConfig(
+            voice_config=types.VoiceConfig(
+                prebuilt_voice_config=types.PrebuiltVoiceConfig(voice_name=voice)
+            )
+        )
+    )
+
+
+def make_client(api_key: str):
+    """Gemini client for the real API"""
+    from google import genai
+    return genai.Client(api_key=api_key)
+
+
+def audio_parts(response) -> Iterator[bytes]:
+    """PCM of each inline audio part of a response or stream chunk"""
+    for candidate in getattr(response, "candidates", None) or []:
+        content = getattr(candidate, "content", None)
+        for part in getattr(content, "parts", None) or []:
+            if getattr(part, "inline_data", None) and part.inline_data.data:
+                yield part.inline_data.data
+
+
+def synthesize(client, model: str, voice: str, prompt: str) -> bytes:
+    """One TTS request, returns the raw PCM of every audio part"""
+    response = client.models.generate_content(model=model, contents=prompt, config=speech_config(voice))
+
+    chunks = list(audio_parts(response))
+    if not chunks:
+        raise NoAudioError("No audio data in response")
+    return b"".join(chunks)
+
+
+def synthesize_stream(client, model: str, voice: str, prompt: str, output_path: str) -> Dict[str, float]:
+    """One streaming TTS request written to a WAV file chunk by chunk
+
+    Returns frames, first_audio_seconds (request start to first PCM chunk)
+    and latency_seconds (request start to end of stream).
+    """
+    start = time.perf_counter()
+    first_audio = None
+    frames = 0
+
+    with wave.open(output_path, 'wb') as wav_file:
+        wav_file.setnchannels(CHANNELS)
+        wav_file.setsampwidth(SAMPLE_WIDTH)
+        wav_file.setframerate(SAMPLE_RATE)
+
+        stream = client.models.generate_content_stream(model=model, contents=prompt, config=speech_config(voice))
+        for chunk in stream:
+            for data in audio_parts(chunk):
+                if first_audio is None:
+                    first_audio = time.perf_counter() - start
+                wav_file.writeframes(data)
+                frames += len(data) // SAMPLE_WIDTH
+
+    if not frames:
+        raise NoAudioError("No audio data in stream")
+    return {"frames": frames, "first_audio_seconds": first_audio,
+            "latency_seconds": time.perf_counter() - start}
+
+
+def with_retries(fn: Callable[[], Any], retries: int = DEFAULT_RETRIES, base_delay: Optional[float] = None,
+                 max_delay: Optional[float] = None, label: str = "") -> Tuple[Any, int]:
+    """Call fn, retrying failures with jittered exponential backoff
+
+    Returns (result, attempts). The last failure is re-raised once the
+    retries are used up. Delays default to BACKOFF_BASE/BACKOFF_MAX.
+    """
+    base_delay = BACKOFF_BASE if base_delay is None else base_delay
+    max_delay = BACKOFF_MAX if max_delay is None else max_delay
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return (fn(), attempt)
+        except Exception as e:
+            if attempt > retries:
+                raise
+            delay = min(max_delay, base_delay * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+            log(f"   ↻ {label} attempt {attempt} failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+class MockClient:
+    """Offline stand-in for genai.Client
+
+    generate_content returns a plain tone about as long as the text would take
+    to read, split over a few inline_data parts like the real responses;
+    generate_content_stream yields it in 0.5s chunks. Failures, latency
+    before the first chunk and latency between chunks can be injected to
+    exercise retries, concurrency and streaming.
+    """
+
+    STREAM_CHUNK_SECONDS = 0.5
+    cache_tag = "mock"
+
+    def __init__(self, failure_rate: float = 0.0, latency: float = 0.0, chunk_latency: float = 0.0,
+                 chars_per_second: float = 15.0, seed: int = 0):
+        self.models = self
+        self.failure_rate = failure_rate
+        self.latency = latency
+        self.chunk_latency = chunk_latency
+        self.chars_per_second = chars_per_second
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def _start_request(self, contents: str) -> bytes:
+        """Count the call, apply latency and failures, return the full PCM"""
+        with self.lock:
+            self.calls += 1
+            fail = self.rng.random() < self.failure_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise RuntimeError("503 UNAVAILABLE (mock)")
+
+        text = contents.rsplit("Text: ", 1)[-1]
+        frames = int(max(len(text) / self.chars_per_second, 0.5) * SAMPLE_RATE)
+        return mock_tone(frames, period=60 + int(hashlib.md5(contents.encode()).hexdigest(), 16) % 60)
+
+    @staticmethod
+    def _response(chunks: List[bytes]):
+        parts = [SimpleNamespace(inline_data=SimpleNamespace(data=c, mime_type="audio/L16;rate=24000")) for c in chunks]
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=parts))])
+
+    def generate_content(self, model: str, contents: str, config=None):
+        pcm = self._start_request(contents)
+        step = max(len(pcm) // 3 // SAMPLE_WIDTH * SAMPLE_WIDTH, SAMPLE_WIDTH)
+        return self._response([pcm[i:i + step] for i in range(0, len(pcm), step)])
+
+    def generate_content_stream(self, model: str, contents: str, config=None):
+        pcm = self._start_request(contents)
+        step = int(self.STREAM_CHUNK_SECONDS * SAMPLE_RATE) * SAMPLE_WIDTH
+        for i in range(0, len(pcm), step):
+            if i and self.chunk_latency:
+                time.sleep(self.chunk_latency)
+            yield self._response([pcm[i:i + step]])
+
+
+def mock_tone(frames: int, period: int = 100, amplitude: int = 6000) -> bytes:
+    """16-bit triangle wave, built by repeating one period"""
+    quarter = period // 4
+    wave_period = array("h", [
+        int(amplitude * (i / quarter if i < quarter else
+                         (2 * quarter - i) / quarter if i < 3 * quarter else
+                         (i - 4 * quarter) / quarter))
+        for i in range(4 * quarter)
+    ])
+    samples = wave_period * (frames // len(wave_period) + 1)
+    return samples[:frames].tobytes()
+
+
+def generate_slide(client, script: Dict[str, Any], slide: Dict[str, Any], output_dir: str,
+                   retries: int = DEFAULT_RETRIES, force: bool = False, stream: bool = True) -> Dict[str, Any]:
+    """Synthesize one slide or reuse its cached audio
+
+    Returns a result dict with status "cached", "generated" or "failed".
+    Generated slides carry the first-audio and total latency of the
+    successful attempt; seconds also covers failed attempts and backoff.
+    """
+    key = slide_cache_key(script, slide, client_tag(client))
+    cache_dir = os.path.join(output_dir, CACHE_DIRNAME)
+    cached_path = os.path.join(cache_dir, f"{key}.wav")
+    output_path = os.path.join(output_dir, f"{slide['id']}.wav")
+    result = {"id": slide["id"], "key": key[:12], "path": output_path, "attempts": 0}
+
+    start = time.perf_counter()
+    if not force and os.path.exists(cached_path):
+        shutil.copyfile(cached_path, output_path)
+        result.update(status="cached", seconds=round(time.perf_counter() - start, 3),
+                      bytes=os.path.getsize(output_path))
+        return result
+
+    prompt = build_prompt(script, slide)
+    model, voice = script["model"], script["voice"]
+
+    # Audio lands in a partial cache entry, renamed into place once complete
+    os.makedirs(cache_dir, exist_ok=True)
+    partial = f"{cached_path}.{threading.get_ident()}.part"
+
+    def attempt() -> Dict[str, float]:
+        if stream:
+            return synthesize_stream(client, model, voice, prompt, partial)
+        request_start = time.perf_counter()
+        pcm = synthesize(client, model, voice, prompt)
+        latency = time.perf_counter() - request_start
+        pcm_to_wav(pcm, partial)
+        return {"frames": len(pcm) // SAMPLE_WIDTH, "first_audio_seconds": latency, "latency_seconds": latency}
+
+    try:
+        stats, attempts = with_retries(attempt, retries, label=slide["id"])
+    except Exception as e:
+        if os.path.exists(partial):
+            os.remove(partial)
+        result.update(status="failed", error=str(e), attempts=retries + 1,
+                      seconds=round(time.perf_counter() - start, 3))
+        return result
+
+    os.replace(partial, cached_path)
+    shutil.copyfile(cached_path, output_path)
+
+    result.update(status="generated", attempts=attempts, seconds=round(time.perf_counter() - start, 3),
+                  first_audio_seconds=round(stats["first_audio_seconds"], 3),
+                  latency_seconds=round(stats["latency_seconds"], 3),
+                  bytes=os.path.getsize(output_path), audio_seconds=round(stats["frames"] / SAMPLE_RATE, 2))
+    return result
+
+
+def generate_script(script: Dict[str, Any], client, concurrency: int = DEFAULT_CONCURRENCY,
+                    retries: int = DEFAULT_RETRIES, force: bool = False, stream: bool = True) -> List[Dict[str, Any]]:
+    """Generate every slide of a script, at most `concurrency` requests at a time"""
+    output_dir = script["outputDir"]
+    os.makedirs(output_dir, exist_ok=True)
+
+    def run(slide):
+        result = generate_slide(client, script, slide, output_dir, retries, force, stream)
+        if result["status"] == "failed":
+            log(f"❌ {slide['id']}: {result['error']}")
+        elif result["status"] == "cached":
+            log(f"♻️  Cached: {result['path']}")
+        else:
+            log(f"✅ Generated: {result['path']} (first audio {result['first_audio_seconds']:.2f}s,"
+                f" total {result['latency_seconds']:.2f}s)")
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as pool:
+        return list(pool.map(run, script["slides"]))
+
+
+def print_results(script: Dict[str, Any], results: List[Dict[str, Any]]):
+    print(f"\n{'Slide':<26} {'Status':<10} {'Tries':>5} {'TTFA':>7} {'Latency':>8} {'Seconds':>8} {'Target':>7}")
+    print("-" * 76)
+    durations = {slide["id"]: slide.get("duration") for slide in script["slides"]}
+    for r in results:
+        target = durations.get(r["id"])
+        ttfa = f"{r['first_audio_seconds']:.2f}" if "first_audio_seconds" in r else "-"
+        latency = f"{r['latency_seconds']:.2f}" if "latency_seconds" in r else "-"
+        print(f"{r['id'][:26]:<26} {r['status']:<10} {r['attempts']:>5} {ttfa:>7} {latency:>8} "
+              f"{r['seconds']:>8.1f} {f'{target}s' if target else '-':>7}")
+
+    counts = {status: sum(1 for r in results if r["status"] == status)
+              for status in ("generated", "cached", "failed")}
+    print(f"\nGenerated {counts['generated']}, cached {counts['cached']}, failed {counts['failed']}")
+
+    generated = [r for r in results if r["status"] == "generated"]
+    if generated:
+        ttfa = sorted(r["first_audio_seconds"] for r in generated)
+        print(f"Time to first audio: median {ttfa[len(ttfa) // 2]:.2f}s, max {ttfa[-1]:.2f}s")
+
+
+def script_for_args(script_path: str, argv=None) -> Dict[str, Any]:
+    """Load a script, moving its output to <outputDir>-mock/ for --mock runs"""
+    argv = sys.argv if argv is None else argv
+    script = load_script(script_path)
+    if "--mock" in argv:
+        script["outputDir"] = script["outputDir"].rstrip("/") + MOCK_OUTPUT_SUFFIX
+    return script
+
+
+def run_from_args(script_path: str, api_key: Optional[str], argv=None) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Load a script and generate it honouring --concurrency/--retries/--force/--no-stream/--mock"""
+    argv = sys.argv if argv is None else argv
+    concurrency = DEFAULT_CONCURRENCY
+    retries = DEFAULT_RETRIES
+    mock_options = {}
+    for i, arg in enumerate(argv):
+        if arg == "--concurrency":
+            concurrency = int(argv[i + 1])
+        elif arg == "--retries":
+            retries = int(argv[i + 1])
+        elif arg == "--mock-failure-rate":
+            mock_options["failure_rate"] = float(argv[i + 1])
+        elif arg == "--mock-latency":
+            mock_options["latency"] = float(argv[i + 1])
+        elif arg == "--mock-chunk-latency":
+            mock_options["chunk_latency"] = float(argv[i + 1])
+
+    script = script_for_args(script_path, argv)
+    client = MockClient(**mock_options) if "--mock" in argv else make_client(api_key)
+
+    print("=" * 60)
+    print(f"🎬 {script['title']} TTS Generation")
+    if script.get("subtitle"):
+        print(f"   '{script['subtitle']}'")
+    print("=" * 60)
+    print(f"Model: {script['model']}{' (mock)' if '--mock' in argv else ''}")
+    print(f"Voice: {script['voice']}")
+    print(f"Output: {script['outputDir']}/")
+    stream = "--no-stream" not in argv
+    print(f"Concurrency: {concurrency}  Retries: {retries}  Streaming: {'on' if stream else 'off'}")
+    print("=" * 60)
+
+    results = generate_script(script, client, concurrency, retries, force="--force" in argv, stream=stream)
+    print_results(script, results)
+    return script, results
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1].startswith("--"):
+        print(__doc__)
+        sys.exit(1)
+
+    api_key = os.getenv("GOOGLE_GEMINI_API_KEY")
+    if not api_key and "--mock" not in sys.argv:
+        print("❌ Error: GOOGLE_GEMINI_API_KEY not set")
+        sys.exit(1)
+
+    _, results = run_from_args(sys.argv[1], api_key)
+    sys.exit(0 if all(r["status"] != "failed" for r in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
 """
 Upload IDE Chile GeoJSON data to Turso database
+
+Geometries are stored once each in the geometries table as normalized
+GeoJSON text (ide_dedup), with coordinates rounded to 7 decimals (~1 cm);
+features reference them through geometry_id.
 """
 
 import json
@@ -8,11 +12,31 @@ import os
 import sqlite3
 import subprocess
 import sys
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Set, Tuple
+
+from ide_admin import assign_admin_areas
+from ide_aggregates import refresh_aggregates
+from ide_coords import write_coord_stores
+from ide_dedup import dedup_report, print_dedup_report, store_geometry
+from ide_geometry import get_bounds
+from ide_metrics import RunReport, report_from_args
+from ide_parquet import export_geoparquet
+from ide_search import build_fts_index
+from ide_sfc import hilbert_key
+from ide_shards import (DEFAULT_WORKERS, INDEX_NAME, MANIFEST_NAME, build_shards, changed_shards,
+                        print_shards, record_published)
 
 DATA_DIR = "data/ide-chile"
 DB_NAME = "ide-chile-data"
 LOCAL_DB = f"{DATA_DIR}/{DB_NAME}.db"
+# A rebuild is written next to LOCAL_DB and only replaces it once finalized, so
+# an aborted build keeps the last good database (and its aggregates) in place
+BUILD_SUFFIX = ".build"
+# Per-region shards and index DB built with --shard
+SHARD_DIR = f"{DATA_DIR}/shards"
+
+# Stage timings, replaced in main() by one honouring --profile/--no-trace-memory
+REPORT = RunReport("upload", trace_memory=False)
 
 # Schema for storing geospatial features
 SCHEMA = """
@@ -20,6 +44,7 @@ SCHEMA = """
 DROP TABLE IF EXISTS features;
 DROP TABLE IF EXISTS layers;
 DROP TABLE IF EXISTS properties;
+DROP TABLE IF EXISTS geometries;
 
 -- Layers metadata
 CREATE TABLE layers (
@@ -35,34 +60,46 @@ CREATE TABLE layers (
     created_at TEXT DEFAULT CURRENT_TIMESTAMP
 );
 
--- Features table with geometry as GeoJSON text
+-- Distinct geometries as normalized GeoJSON text (7 decimals), shared by all features with the same shape
+CREATE TABLE geometries (
+    id INTEGER PRIMARY KEY,
+    hash BLOB NOT NULL UNIQUE,  -- SHA-1 of the normalized text
+    geometry TEXT NOT NULL
+);
+
+-- Features table referencing their geometry
 CREATE TABLE features (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     layer_id TEXT NOT NULL,
     geometry_type TEXT,
-    geometry TEXT,  -- GeoJSON geometry as text
+    geometry_id INTEGER,  -- geometries.id
     centroid_lon REAL,
     centroid_lat REAL,
+    hilbert_key INTEGER,  -- Hilbert curve index of the centroid
+    region_code TEXT,  -- Admin areas containing the centroid
+    province_code TEXT,
+    comuna_code TEXT,
     properties TEXT,  -- JSON properties
-    FOREIGN KEY (layer_id) REFERENCES layers(id)
+    FOREIGN KEY (layer_id) REFERENCES layers(id),
+    FOREIGN KEY (geometry_id) REFERENCES geometries(id)
 );
 
 -- Create spatial index using centroid
 CREATE INDEX idx_features_layer ON features(layer_id);
 CREATE INDEX idx_features_centroid ON features(centroid_lon, centroid_lat);
 CREATE INDEX idx_features_geometry_type ON features(geometry_type);
-
--- Full text search for properties
-CREATE VIRTUAL TABLE features_fts USING fts5(
-    properties,
-    content='features',
-    content_rowid='id'
+CREATE INDEX idx_features_geometry_id ON features(geometry_id);
+CREATE INDEX idx_features_hilbert ON features(hilbert_key);
+CREATE INDEX idx_features_region_code ON features(region_code);
+CREATE INDEX idx_features_province_code ON features(province_code);
+CREATE INDEX idx_features_comuna_code ON features(comuna_code);
+
+-- R*Tree over feature bounds for bbox queries
+CREATE VIRTUAL TABLE features_rtree USING rtree(
+    id,
+    min_lon, max_lon,
+    min_lat, max_lat
 );
-
--- Trigger to keep FTS in sync
-CREATE TRIGGER features_ai AFTER INSERT ON features BEGIN
-    INSERT INTO features_fts(rowid, properties) VALUES (new.id, new.properties);
-END;
 """
 
 
@@ -134,15 +171,21 @@ def get_bbox(features: List[Dict]) -> tuple:
     return (None, None, None, None)
 
 
+def build_db_path() -> str:
+    """Where create_local_db() builds until commit_local_db() moves it to LOCAL_DB"""
+    return LOCAL_DB + BUILD_SUFFIX
+
+
 def create_local_db():
-    """Create local SQLite database with schema"""
-    print(f"Creating local database: {LOCAL_DB}")
+    """Create a fresh build database with schema, LOCAL_DB is left untouched"""
+    path = build_db_path()
+    print(f"Creating local database: {path}")
 
-    # Remove existing database
-    if os.path.exists(LOCAL_DB):
-        os.remove(LOCAL_DB)
+    # Leftover of an aborted build
+    if os.path.exists(path):
+        os.remove(path)
 
-    conn = sqlite3.connect(LOCAL_DB)
+    conn = sqlite3.connect(path)
     cursor = conn.cursor()
 
     # Execute schema
@@ -152,8 +195,68 @@ def create_local_db():
     return conn
 
 
-def load_geojson_files(conn: sqlite3.Connection):
-    """Load all GeoJSON files into database"""
+def insert_features(conn: sqlite3.Connection, layer_id: str, features: List[Dict],
+                    cluster: bool = True, seen: Optional[Set[Tuple[int, str]]] = None) -> int:
+    """Insert one layer's features, Hilbert-ordered unless cluster is False
+
+    Returns how many features were skipped as repeats of one already in the layer.
+    Pass the same `seen` set to every call for a layer inserted in batches.
+    """
+    seen = set() if seen is None else seen
+    cursor = conn.cursor()
+    duplicates = 0
+
+    # Cluster rows on disk: sort by Hilbert key of the centroid so
+    # spatially close features share pages (keyless features go last)
+    keyed = []
+    for feature in features:
+        centroid = get_centroid(feature.get("geometry"))
+        keyed.append((hilbert_key(*centroid), centroid, feature))
+    if cluster:
+        keyed.sort(key=lambda k: (k[0] is None, k[0] or 0))
+
+    # Insert features in batches
+    batch_size = 500
+    for i in range(0, len(keyed), batch_size):
+        batch = keyed[i:i + batch_size]
+
+        for key, centroid, feature in batch:
+            geometry = feature.get("geometry")
+            properties = feature.get("properties", {})
+
+            props_json = json.dumps(properties)
+            geometry_id, created = store_geometry(cursor, geometry)
+
+            # Offset paging can return the same record twice
+            if geometry_id is not None:
+                if (geometry_id, props_json) in seen:
+                    duplicates += 1
+                    continue
+                seen.add((geometry_id, props_json))
+
+            feat_geom_type = geometry.get("type") if geometry else None
+
+            cursor.execute("""
+                INSERT INTO features (layer_id, geometry_type, geometry_id,
+                                      centroid_lon, centroid_lat, hilbert_key, properties)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (layer_id, feat_geom_type, geometry_id,
+                  centroid[0], centroid[1], key, props_json))
+
+            bounds = get_bounds(geometry)
+            if bounds[0] is not None:
+                cursor.execute("""
+                    INSERT INTO features_rtree (id, min_lon, max_lon, min_lat, max_lat)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (cursor.lastrowid, bounds[0], bounds[2], bounds[1], bounds[3]))
+
+        conn.commit()
+
+    return duplicates
+
+
+def load_geojson_files(conn: sqlite3.Connection, cluster: bool = True):
+    """Load all GeoJSON files into database, Hilbert-ordered unless cluster is False"""
     cursor = conn.cursor()
 
     geojson_files = [f for f in os.listdir(DATA_DIR) if f.endswith(".geojson")]
@@ -170,10 +273,11 @@ def load_geojson_files(conn: sqlite3.Connection):
         print(f"\nLoading: {filename}")
 
         try:
-            with open(filepath, "r") as f:
-                data = json.load(f)
-
-            features = data.get("features", [])
+            with REPORT.stage("parse") as stage:
+                with open(filepath, "r") as f:
+                    data = json.load(f)
+                features = data.get("features", [])
+                stage.add(bytes=os.path.getsize(filepath), features=len(features))
 
             if not features:
                 print(f"  No features, skipping")
@@ -201,32 +305,18 @@ def load_geojson_files(conn: sqlite3.Connection):
                   filename, geom_type, len(features),
                   bbox[0], bbox[1], bbox[2], bbox[3]))
 
-            # Insert features in batches
-            batch_size = 500
-            for i in range(0, len(features), batch_size):
-                batch = features[i:i + batch_size]
-
-                for feature in batch:
-                    geometry = feature.get("geometry")
-                    properties = feature.get("properties", {})
-
-                    geom_json = json.dumps(geometry) if geometry else None
-                    props_json = json.dumps(properties)
-
-                    centroid = get_centroid(geometry)
-                    feat_geom_type = geometry.get("type") if geometry else None
-
-                    cursor.execute("""
-                        INSERT INTO features (layer_id, geometry_type, geometry,
-                                              centroid_lon, centroid_lat, properties)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    """, (layer_id, feat_geom_type, geom_json,
-                          centroid[0], centroid[1], props_json))
+            with REPORT.stage("insert") as stage:
+                duplicates = insert_features(conn, layer_id, features, cluster)
+                stage.add(features=len(features))
 
+            loaded = len(features) - duplicates
+            if duplicates:
+                cursor.execute("UPDATE layers SET feature_count = ? WHERE id = ?", (loaded, layer_id))
                 conn.commit()
+                print(f"  Skipped {duplicates} duplicate features")
 
-            total_features += len(features)
-            print(f"  Loaded {len(features)} features ({geom_type})")
+            total_features += loaded
+            print(f"  Loaded {loaded} features ({geom_type})")
 
         except json.JSONDecodeError as e:
             print(f"  Error parsing JSON: {e}")
@@ -260,10 +350,10 @@ def get_db_stats(conn: sqlite3.Connection):
         print(f"{layer[1][:35]:<35} {layer[2]:>10} {layer[3] or 'N/A':<15}")
 
 
-def upload_to_turso():
-    """Upload local database to Turso"""
+def upload_to_turso(db_name: str = DB_NAME, db_path: str = LOCAL_DB):
+    """Upload a local database to Turso"""
     print("\n" + "=" * 60)
-    print("Uploading to Turso")
+    print(f"Uploading to Turso: {db_name}")
     print("=" * 60)
 
     # Check if database exists on Turso
@@ -274,16 +364,16 @@ def upload_to_turso():
 
     if result.returncode == 0:
         dbs = json.loads(result.stdout)
-        db_exists = any(db.get("Name") == DB_NAME for db in dbs)
+        db_exists = any(db.get("Name") == db_name for db in dbs)
 
         if db_exists:
-            print(f"Database '{DB_NAME}' already exists. Destroying and recreating...")
-            subprocess.run(["turso", "db", "destroy", DB_NAME, "--yes"], check=True)
+            print(f"Database '{db_name}' already exists. Destroying and recreating...")
+            subprocess.run(["turso", "db", "destroy", db_name, "--yes"], check=True)
 
     # Create database from local file
-    print(f"Creating Turso database from {LOCAL_DB}...")
+    print(f"Creating Turso database from {db_path}...")
     result = subprocess.run(
-        ["turso", "db", "create", DB_NAME, "--from-file", LOCAL_DB],
+        ["turso", "db", "create", db_name, "--from-file", db_path],
         capture_output=True, text=True
     )
 
@@ -295,7 +385,7 @@ def upload_to_turso():
 
     # Get database URL
     result = subprocess.run(
-        ["turso", "db", "show", DB_NAME, "--json"],
+        ["turso", "db", "show", db_name, "--json"],
         capture_output=True, text=True
     )
 
@@ -305,7 +395,7 @@ def upload_to_turso():
 
     # Create auth token
     result = subprocess.run(
-        ["turso", "db", "tokens", "create", DB_NAME],
+        ["turso", "db", "tokens", "create", db_name],
         capture_output=True, text=True
     )
 
@@ -315,7 +405,86 @@ def upload_to_turso():
     return True
 
 
+def publish_shards(shards: List[Dict[str, Any]]):
+    """Upload each shard that changed since it was last published, then the index DB
+
+    --regions 08,13 limits publishing to those region shards. The index maps
+    feature ids to shards, so it is only uploaded once every shard matches
+    the published manifest; otherwise the previous index stays live.
+    """
+    manifest = os.path.join(SHARD_DIR, MANIFEST_NAME)
+    pending = changed_shards(shards, manifest)
+    if "--regions" in sys.argv:
+        regions = sys.argv[sys.argv.index("--regions") + 1].split(",")
+        pending = [s for s in pending if s["regionCode"] in regions]
+    print(f"\nPublishing {len(pending)} of {len(shards)} shards (others unchanged)")
+
+    with REPORT.stage("upload") as stage:
+        for shard in pending:
+            path = os.path.join(SHARD_DIR, shard["file"])
+            if upload_to_turso(shard["dbName"], path):
+                record_published([shard], manifest)
+                stage.add(bytes=shard["bytes"], features=shard["features"])
+
+        stale = changed_shards(shards, manifest)
+        if stale:
+            print(f"⚠️  Index not published: {len(stale)} shards are not up to date "
+                  f"({', '.join(s['regionCode'] for s in stale)})")
+            return
+        index_path = os.path.join(SHARD_DIR, f"{INDEX_NAME}.db")
+        if upload_to_turso(INDEX_NAME, index_path):
+            stage.add(bytes=os.path.getsize(index_path))
+
+
+def commit_local_db(conn: sqlite3.Connection):
+    """Close a finalized build and move it over LOCAL_DB"""
+    conn.close()
+    os.replace(build_db_path(), LOCAL_DB)
+
+
+def finalize_db(conn: sqlite3.Connection, total: int):
+    """Build indexes and optional exports once all features are inserted"""
+    with REPORT.stage("index") as stage:
+        # Spatial join against the region/province/comuna boundaries
+        print("\nAssigning administrative areas...")
+        for column, count in assign_admin_areas(conn).items():
+            print(f"  {column}: {count} features")
+
+        # Build full text search index in one bulk pass
+        indexed = build_fts_index(conn)
+        print(f"Full text index built for {indexed} features")
+        stage.add(features=total)
+
+    # Dashboard aggregates, reusing the previous build for unchanged layers
+    with REPORT.stage("aggregate") as stage:
+        status = refresh_aggregates(conn, LOCAL_DB)
+        stage.add(features=total)
+    reused = sum(1 for s in status.values() if s == "copied")
+    print(f"Aggregates computed for {len(status) - reused} layers, reused for {reused}")
+
+    # Flat coordinate arrays for terrain/surface tooling (ide_coords.CoordStore)
+    with REPORT.stage("coords") as stage:
+        written = write_coord_stores(conn, os.path.join(DATA_DIR, "coords"))
+        stage.add(bytes=sum(written.values()), features=total)
+    print(f"Coordinate stores written for {len(written)} layers")
+
+    # Optional columnar export for analytics
+    if "--export-parquet" in sys.argv:
+        with REPORT.stage("export") as stage:
+            written = export_geoparquet(conn, os.path.join(DATA_DIR, "parquet"))
+            stage.add(bytes=sum(written.values()), features=total)
+        print(f"GeoParquet export written for {len(written)} layers")
+
+    # Shared geometries across and within layers
+    dedup = dedup_report(conn)
+    print_dedup_report(dedup)
+    REPORT.extra["dedup"] = dedup
+
+
 def main():
+    global REPORT
+    REPORT = report_from_args("upload")
+
     print("=" * 60)
     print("IDE Chile Data - Turso Upload")
     print("=" * 60)
@@ -324,23 +493,50 @@ def main():
     conn = create_local_db()
 
     # Load GeoJSON files
-    total = load_geojson_files(conn)
+    # --no-cluster keeps file order, e.g. to measure page reads before/after
+    total = load_geojson_files(conn, cluster="--no-cluster" not in sys.argv)
     print(f"\nTotal features loaded: {total}")
 
+    # Indexes and optional exports
+    finalize_db(conn, total)
+
     # Print stats
     get_db_stats(conn)
 
-    conn.close()
+    commit_local_db(conn)
 
     # Get database file size
     db_size = os.path.getsize(LOCAL_DB) / (1024 * 1024)
     print(f"\nLocal database size: {db_size:.2f} MB")
 
+    # Per-region shards plus national index DB for edge replicas
+    shards = None
+    if "--shard" in sys.argv:
+        workers = DEFAULT_WORKERS
+        if "--shard-workers" in sys.argv:
+            workers = int(sys.argv[sys.argv.index("--shard-workers") + 1])
+        with REPORT.stage("shard") as stage:
+            shards = build_shards(LOCAL_DB, SHARD_DIR, SCHEMA, DB_NAME, workers)
+            stage.add(bytes=sum(s["bytes"] for s in shards), features=total)
+        print_shards(shards, os.path.getsize(LOCAL_DB))
+        REPORT.extra["shards"] = shards
+
     # Upload to Turso
-    if "--skip-upload" not in sys.argv:
-        upload_to_turso()
-    else:
+    if "--skip-upload" in sys.argv:
         print("\nSkipping Turso upload (--skip-upload flag)")
+    elif shards is not None:
+        publish_shards(shards)
+    else:
+        with REPORT.stage("upload") as stage:
+            upload_to_turso()
+            stage.add(bytes=os.path.getsize(LOCAL_DB), features=total)
+
+    # Save per-stage timings next to download-summary.json
+    REPORT.extra["totalFeatures"] = total
+    REPORT.extra["dbBytes"] = os.path.getsize(LOCAL_DB)
+    REPORT.print_summary()
+    report_path = REPORT.write(DATA_DIR)
+    print(f"\nRun report saved to: {report_path}")
 
     print(f"\nLocal database saved to: {LOCAL_DB}")
 